@@ -19,11 +19,13 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
     along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
 """
 import atexit
+import csv
 import json
 import multiprocessing
 import os
 import shutil
 import sys
+import time
 import ctypes
 import argparse
 import faulthandler
@@ -31,15 +33,19 @@ import faulthandler
 import locale
 
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from logging import handlers
-from tempfile import TemporaryDirectory
+from tempfile import TemporaryDirectory, mkdtemp
 from zipfile import ZipFile
 
 from mapclient.core.exitcodes import (HEADLESS_MODE_WITH_NO_WORKFLOW, INVALID_WORKFLOW_LOCATION_GIVEN, CONFIGURATION_MODE_WITH_NO_DEFINITIONS, USER_SPECIFIED_DIRECTORY,
-                                      APP_SUCCESS, CONFIGURATION_MODE_NO_FILE, CONFIGURATION_MODE_NOT_IMPLEMENTED)
+                                      APP_SUCCESS, CONFIGURATION_MODE_NO_FILE, CONFIGURATION_MODE_NOT_IMPLEMENTED, BATCH_MODE_NO_SETTINGS, BATCH_MODE_RUN_FAILED,
+                                      HEADLESS_MODE_TIMED_OUT, WORKER_MODE_NO_SPOOL)
 from mapclient.core.provenance import reproducibility_info
-from mapclient.core.utils import is_frozen, find_file
+from mapclient.core.tracing import get_execution_tracer
+from mapclient.core.workflow.workflowerror import WorkflowTimeoutError
+from mapclient.core.utils import is_frozen, find_file, exit_process
 from mapclient.core.workflow.workflowscene import create_from
 from mapclient.exceptions import ClientRuntimeError
 from mapclient.settings.definitions import INTERNAL_WORKFLOWS_ZIP, INTERNAL_WORKFLOWS_AVAILABLE, INTERNAL_WORKFLOW_DIR, UNSET_FLAG, PREVIOUS_WORKFLOW, AUTOLOAD_PREVIOUS_WORKFLOW
@@ -51,10 +57,10 @@ os.environ['ETS_TOOLKIT'] = 'qt'
 # workaround.
 if __package__:
     from .settings import info
-    from .settings.general import get_log_location, get_default_internal_workflow_dir, get_configuration_file
+    from .settings.general import get_log_location, get_default_internal_workflow_dir, get_configuration_file, get_configuration_suffix
 else:
     from mapclient.settings import info
-    from mapclient.settings.general import get_log_location, get_default_internal_workflow_dir
+    from mapclient.settings.general import get_log_location, get_default_internal_workflow_dir, get_configuration_suffix
 
 logger = logging.getLogger('mapclient.application')
 
@@ -116,16 +122,25 @@ def program_header():
     logger.info('-' * len(program_header_string))
 
 
-def _prepare_application():
+def _create_qt_application():
+    from PySide6 import QtWidgets
+
+    app = QtWidgets.QApplication(sys.argv)
+    info.set_applications_settings(app)
+
+    return app
+
+
+def _prepare_application(gui=True):
+    """
+    Prepare the application, a Qt application is only created if gui is True.
+    """
     # import the locale, and set the locale. This is used for
     # locale-aware number to string formatting
     locale.setlocale(locale.LC_ALL, '')
 
-    from PySide6 import QtWidgets
+    app = _create_qt_application() if gui else None
 
-    app = QtWidgets.QApplication(sys.argv)
-
-    info.set_applications_settings(app)
     log_path = get_log_location()
     _initialise_fault_handling(log_path)
     _initialise_logger(log_path)
@@ -293,7 +308,8 @@ class ConsumeOutput:
 
 
 def prepare_sans_gui_app(app):
-    info.set_applications_settings(app)
+    if app is not None:
+        info.set_applications_settings(app)
 
     old_stdout = sys.stdout
     sys.stdout = ConsumeOutput()
@@ -320,83 +336,639 @@ def _restore_backup(config_file):
     os.rename(_backup_file(config_file), config_file)
 
 
-def sans_gui_main(workflow, import_settings=None, relocate=False):
+def _create_step_cache(scheduler_options):
+    from mapclient.core.workflow.workflowcache import StepOutputCache
+    from mapclient.settings.general import get_step_cache_directory
+
+    cache_dir = scheduler_options.get('cache_dir') or get_step_cache_directory()
+    return StepOutputCache(cache_dir, int(scheduler_options.get('cache_size', 1024) * 1024 * 1024))
+
+
+def _create_scheduler(wm, scheduler_options):
+    scheduler = wm.create_scheduler(scheduler_options.get('jobs', 1), scheduler_options.get('process_pool', False))
+    timed_out = False
+    if scheduler_options.get('broker_spool') is not None:
+        from mapclient.core.broker import SpoolBroker
+        scheduler.set_broker(SpoolBroker(scheduler_options['broker_spool'], scheduler_options.get('plugin_directories')))
+    if scheduler_options.get('cache', False):
+        scheduler.set_step_cache(_create_step_cache(scheduler_options))
+    if scheduler_options.get('memory_budget') is not None:
+        from mapclient.core.workflow.workflowspill import PortDataSpill
+        scheduler.set_spill(PortDataSpill(int(scheduler_options['memory_budget'] * 1024 * 1024), scheduler_options.get('scratch_dir')))
+    if scheduler_options.get('checkpoint', False):
+        from mapclient.core.workflow.workflowcheckpoint import WorkflowCheckpoint
+        scheduler.set_checkpoint(WorkflowCheckpoint(wm.location()), scheduler_options.get('resume', False), scheduler_options.get('from_step'))
+    if scheduler_options.get('profile', False):
+        from mapclient.core.workflow.workflowprofiler import WorkflowProfiler
+        scheduler.set_profiler(WorkflowProfiler())
+
+    return scheduler
+
+
+def _report_profile(profiler, wm, write_report):
+    logger.info('Workflow step profile:')
+    for line in profiler.table():
+        logger.info(line)
+
+    if write_report:
+        profile_file = os.path.join(wm.location(), info.DEFAULT_WORKFLOW_PROFILE_FILENAME)
+        profiler.write(profile_file)
+        logger.info(f"Wrote workflow step profile to '{profile_file}'.")
+
+
+def _report_plan(wm, scheduler_options):
+    from mapclient.core.workflow.workflowplan import read_profile
+    profile = read_profile(os.path.join(wm.location(), info.DEFAULT_WORKFLOW_PROFILE_FILENAME))
+    plan = wm.scene().create_plan(profile)
+    logger.info(f"Execution plan for workflow '{wm.location()}':")
+    for line in plan.lines(scheduler_options.get('jobs', 1)):
+        logger.info(line)
+
+
+def _step_cache_main(scheduler_options, show_info, purge):
+    _prepare_application(gui=False)
+    step_cache = _create_step_cache(scheduler_options)
+    if purge:
+        step_cache.purge()
+        logger.info(f"Purged step cache '{step_cache.info()['directory']}'.")
+
+    if show_info:
+        cache_info = step_cache.info()
+        logger.info(f"Step cache '{cache_info['directory']}': {cache_info['entries']} entries, "
+                    f"{cache_info['size'] / (1024 * 1024):.1f} MB of {cache_info['max_size'] / (1024 * 1024):.1f} MB used.")
+        for step_name, count in sorted(cache_info['steps'].items()):
+            logger.info(f"  {step_name}: {count}")
 
-    if workflow is None:
-        return HEADLESS_MODE_WITH_NO_WORKFLOW
+    return APP_SUCCESS
 
-    app = _prepare_application()
+
+class _FacadeMainWindow:
+
+    def __init__(self, _model):
+        self._model = _model
+
+    def model(self):
+        return self._model
+
+
+def _prepare_headless_model(fork_server=False, plugin_directories=None):
+    """
+    Load the packages and plugins for running workflows without the user
+    interface.  Qt is not imported unless a plugin imports it, in that case
+    a Qt application is created for the steps to use.  If plugin_directories
+    is given the plugins are loaded from those directories instead of the
+    directories of the current plugin profile.
+    """
+    app = _prepare_application(gui=False)
     model = prepare_sans_gui_app(app)
 
-    wm = model.workflowManager()
-    pm = model.pluginManager()
     pam = model.package_manager()
+    pm = model.pluginManager()
     om = model.optionsManager()
 
     pam.load()
+    if plugin_directories is not None:
+        pm.set_directories(plugin_directories)
     pm.load()
+    pm.set_fork_server_enabled(fork_server)
 
     _prepare_internal_workflows(om)
 
-    class FacadeMainWindow:
+    return _create_qt_application_if_imported(app), model
+
+
+def _create_qt_application_if_imported(app):
+    # Plugins loaded lazily may import Qt when the workflow is loaded.
+    if app is None and 'PySide6.QtCore' in sys.modules:
+        logger.debug('Plugins import Qt, creating a Qt application.')
+        app = _create_qt_application()
+
+    return app
+
+
+def _quit(app):
+    if app is not None:
+        app.quit()
+
+
+def _set_broker_profile(model, scheduler_options):
+    # Workers serving a broker load the plugins this process has loaded.
+    if scheduler_options.get('broker_spool') is not None:
+        scheduler_options['plugin_directories'] = model.pluginManager().directories()
+
+
+def _import_settings(wm, workflow, import_settings, relocate):
+    """
+    Import the step configurations from the import_settings archive into the
+    workflow, backing up the configurations they replace.  Returns the list of
+    backed up configuration files, or None if the archive has configurations
+    for steps that are not in the workflow.
+    """
+    backed_up_config_files = []
+    with ZipFile(import_settings) as archive:
+        with TemporaryDirectory() as temp_dir:
+            archive.extractall(temp_dir)
+            source_steps_list = wm.list_steps(temp_dir)
+
+            target_steps_list = wm.list_steps(workflow)
+
+            all_present = all(item in target_steps_list for item in source_steps_list)
+            if not all_present:
+                return None
 
-        def __init__(self, _model):
-            self._model = _model
+            # Relocate step configurations if required.
+            if relocate:
+                source_steps = wm.load_steps(temp_dir)
+                for step in source_steps:
+                    step.setLocation(os.path.dirname(import_settings))
+                    step.relocateConfiguration(workflow)
+                    config_file = get_configuration_file(temp_dir, step.getIdentifier())
+                    with open(config_file, "w") as fh:
+                        fh.write(step.serialize())
 
-        def model(self):
-            return self._model
+            # Make backups of target steps configurations and import new configuration.
+            for step_name, identifier in source_steps_list:
+                config_file = get_configuration_file(workflow, identifier)
+                new_config_file = get_configuration_file(temp_dir, identifier)
+                if os.path.isfile(config_file):
+                    shutil.copy2(config_file, _backup_file(config_file))
+                    shutil.copy2(new_config_file, config_file)
+                    backed_up_config_files.append(config_file)
+
+    return backed_up_config_files
+
+
+def _restore_backups(backed_up_config_files):
+    for backed_up_file in backed_up_config_files:
+        _restore_backup(backed_up_file)
+
+
+def sans_gui_main(workflow, import_settings=None, relocate=False, scheduler_options=None):
+
+    if scheduler_options is None:
+        scheduler_options = {}
+
+    if workflow is None:
+        return HEADLESS_MODE_WITH_NO_WORKFLOW
+
+    app, model = _prepare_headless_model(scheduler_options.get('fork_server', False))
+    wm = model.workflowManager()
+    _set_broker_profile(model, scheduler_options)
+
+    trace_file = scheduler_options.get('trace')
+    if trace_file is not None:
+        get_execution_tracer().enable()
 
     backed_up_config_files = []
     try:
-        wm.scene().setMainWindow(FacadeMainWindow(model))
+        wm.scene().setMainWindow(_FacadeMainWindow(model))
         if import_settings is not None:
-            with ZipFile(import_settings) as archive:
-                with TemporaryDirectory() as temp_dir:
-                    archive.extractall(temp_dir)
-                    source_steps_list = wm.list_steps(temp_dir)
-
-                    target_steps_list = wm.list_steps(workflow)
-
-                    all_present = all(item in target_steps_list for item in source_steps_list)
-                    if all_present:
-
-                        # Relocate step configurations if required.
-                        if relocate:
-                            source_steps = wm.load_steps(temp_dir)
-                            for step in source_steps:
-                                step.setLocation(os.path.dirname(import_settings))
-                                step.relocateConfiguration(workflow)
-                                config_file = get_configuration_file(temp_dir, step.getIdentifier())
-                                with open(config_file, "w") as fh:
-                                    fh.write(step.serialize())
-
-                        # Make backups of target steps configurations and import new configuration.
-                        for step_name, identifier in source_steps_list:
-                            config_file = get_configuration_file(workflow, identifier)
-                            new_config_file = get_configuration_file(temp_dir, identifier)
-                            if os.path.isfile(config_file):
-                                shutil.copy2(config_file, _backup_file(config_file))
-                                shutil.copy2(new_config_file, config_file)
-                                backed_up_config_files.append(config_file)
+            backed_up_config_files = _import_settings(wm, workflow, import_settings, relocate) or []
 
         wm.load(workflow)
     except:
         logger.error('Not a valid workflow location: "{0}"'.format(workflow))
         sys.exit(INVALID_WORKFLOW_LOCATION_GIVEN)
 
-    wm.registerDoneExecutionForAll(wm.execute)
-
+    app = _create_qt_application_if_imported(app)
     if wm.canExecute() == 0:
+        if scheduler_options.get('plan', False):
+            _report_plan(wm, scheduler_options)
+            _restore_backups(backed_up_config_files)
+            return _quit(app)
+
+        profiler = None
+        timed_out = False
         try:
-            wm.execute()
+            scheduler = _create_scheduler(wm, scheduler_options)
+            profiler = scheduler.profiler()
+            wm.execute_scheduled(scheduler)
+        except WorkflowTimeoutError as e:
+            logger.error(str(e))
+            timed_out = True
         finally:
-            for backed_up_file in backed_up_config_files:
-                _restore_backup(backed_up_file)
+            _restore_backups(backed_up_config_files)
+            if profiler is not None:
+                _report_profile(profiler, wm, scheduler_options.get('profile_report', False))
+            if trace_file is not None:
+                get_execution_tracer().write(trace_file)
+
+        if timed_out:
+            # A step that ignores being cancelled would keep the process
+            # running until it finished, so exit without waiting for it.
+            _quit(app)
+            exit_process(HEADLESS_MODE_TIMED_OUT)
     else:
         logger.error(f'Could not execute workflow, reason: "{wm.execute_status_message()}"')
 
     # Possibly don't need to run app.exec_()
-    return app.quit()
+    return _quit(app)
+
+
+def _settings_archives(settings):
+    """
+    Return the settings archives to run, either every zip file in the given
+    directory or every archive listed, one per line, in the given manifest
+    file.  Relative paths in a manifest are relative to the manifest.
+    """
+    if os.path.isdir(settings):
+        return sorted(os.path.join(settings, f) for f in os.listdir(settings) if f.endswith('.zip'))
+
+    archives = []
+    with open(settings) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                archives.append(os.path.join(os.path.dirname(os.path.abspath(settings)), line))
+
+    return archives
+
+
+def _run_settings(wm, workflow, archive, relocate, scheduler_options):
+    """
+    Execute the loaded workflow with the configurations from the given
+    settings archive, or its own configurations if archive is None,
+    returning the status of the run and a message.  A WorkflowTimeoutError
+    is raised if the run times out.
+    """
+    backed_up_config_files = []
+    try:
+        if archive is not None:
+            backed_up_config_files = _import_settings(wm, workflow, archive, relocate)
+            if backed_up_config_files is None:
+                return 'skipped', 'Settings are for steps that are not in the workflow.'
+
+            wm.scene().reload_configuration()
+        if wm.canExecute() != 0:
+            return 'failed', wm.execute_status_message()
+
+        wm.execute_scheduled(_create_scheduler(wm, scheduler_options))
+    except WorkflowTimeoutError:
+        # A timed out step may still be running on a thread, using the steps
+        # of the workflow, so no other run can be made with them.
+        raise
+    except Exception as e:
+        logger.error(f"Run of workflow '{workflow}' with settings '{archive}' failed: {e}")
+        return 'failed', str(e)
+    finally:
+        if backed_up_config_files:
+            _restore_backups(backed_up_config_files)
+            wm.scene().reload_configuration()
+
+    return 'success', ''
+
+
+_BATCH_RESULT_FIELDS = ['run', 'settings', 'workflow', 'output', 'status', 'duration', 'message']
+
+
+def _batch_result(index, archive, workflow, location, status, message, start):
+    # The output of a run is the copy of the workflow it was made on.
+    return {
+        'run': index + 1,
+        'settings': archive,
+        'workflow': workflow,
+        'output': location,
+        'status': status,
+        'duration': f'{time.perf_counter() - start:.3f}',
+        'message': message,
+    }
+
+
+def _copy_workflow(workflow, target, link=False):
+    """
+    Copy the workflow directory to target.  If link is True files are hard
+    linked instead of copied, except for the workflow and step configuration
+    files which are rewritten when settings are imported.  Steps that modify
+    existing files in the workflow directory in place must not be run on
+    linked copies.
+    """
+    protected_suffixes = (get_configuration_suffix(), DEFAULT_WORKFLOW_PROJECT_FILENAME)
+    excluded = os.path.abspath(os.path.dirname(target))
+
+    def _ignore(directory, names):
+        ignored = {name for name in names if os.path.abspath(os.path.join(directory, name)) == excluded}
+        ignored.update(name for name in names if name == info.DEFAULT_WORKFLOW_CHECKPOINT_DIRECTORY)
+        return ignored
+
+    def _copy(source, destination):
+        if link and not source.endswith(protected_suffixes):
+            try:
+                os.link(source, destination)
+                return destination
+            except OSError:
+                pass
+
+        return shutil.copy2(source, destination)
+
+    shutil.copytree(workflow, target, copy_function=_copy, ignore=_ignore)
+
+
+# The model of the parent process, inherited by forked worker processes.
+_forked_model = None
+
+
+def _load_and_run_here(location, archive, relocate, scheduler_options):
+    wm = _forked_model.workflowManager()
+    try:
+        wm.load(location)
+    except Exception as e:
+        return 'failed', f'Could not load workflow: {e}'
+
+    try:
+        return _run_settings(wm, location, archive, relocate, scheduler_options)
+    except WorkflowTimeoutError as e:
+        logger.error(f"Run of workflow '{location}' with settings '{archive}' timed out: {e}")
+        return 'timed out', str(e)
+    finally:
+        wm.close()
+
+
+def _send_run_result(sender, location, archive, relocate, scheduler_options):
+    sender.send(_load_and_run_here(location, archive, relocate, scheduler_options))
+    sender.close()
+    # Do not wait for a timed out step still running on a thread.
+    exit_process(APP_SUCCESS)
+
+
+def _load_and_run(location, archive, relocate, scheduler_options):
+    """
+    Load the workflow at location into the model of a worker process, which
+    is inherited by forked workers, and execute it, see _run_settings.  Where
+    processes can be forked each run is made in a process of its own, so a
+    step that keeps running after the run has timed out ends with it.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return _load_and_run_here(location, archive, relocate, scheduler_options)
+
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_send_run_result, args=(sender, location, archive, relocate, scheduler_options))
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        process.join()
+        return 'failed', f'The run ended unexpectedly with exit code {process.exitcode}.'
+    finally:
+        receiver.close()
+        process.join()
+
+
+def _sweep_run(workflow, location, link, index, archive, relocate, scheduler_options):
+    """
+    Execute a run of a sweep in a worker process on a copy of the workflow
+    made at location.
+    """
+    start = time.perf_counter()
+    try:
+        _copy_workflow(workflow, location, link)
+    except Exception as e:
+        return _batch_result(index, archive, workflow, location, 'failed', f'Could not copy workflow: {e}', start)
+
+    status, message = _load_and_run(location, archive, relocate, scheduler_options)
+    return _batch_result(index, archive, workflow, location, status, message, start)
+
+
+def _sweep_directory(sweep_dir, default):
+    sweep_dir = os.path.abspath(default() if sweep_dir is None else sweep_dir)
+    if not os.path.isdir(sweep_dir):
+        os.makedirs(sweep_dir)
+
+    return sweep_dir
+
+
+def _run_location(sweep_dir, index):
+    return os.path.join(sweep_dir, f'run-{index + 1:04d}')
+
+
+def _run_one_at_a_time(wm, workflow, archives, relocate, scheduler_options, sweep_dir, link):
+    """
+    Execute the runs of a batch one after the other with the loaded steps,
+    each run on its own copy of the workflow in sweep_dir, so the outputs
+    of a run are not overwritten by the next.  Returns the results of the
+    runs and whether the batch was abandoned because a run timed out.
+    """
+    sweep_dir = _sweep_directory(sweep_dir, lambda: mkdtemp(prefix='mapclient-sweep-'))
+    logger.info(f"Writing workflow copies for {len(archives)} runs to '{sweep_dir}'.")
+    results = []
+    for index, archive in enumerate(archives):
+        logger.info(f"Run {index + 1} of {len(archives)}: '{archive}'.")
+        start = time.perf_counter()
+        location = _run_location(sweep_dir, index)
+        try:
+            _copy_workflow(workflow, location, link)
+        except Exception as e:
+            results.append(_batch_result(index, archive, workflow, location, 'failed', f'Could not copy workflow: {e}', start))
+            continue
+
+        wm.scene().updateWorkflowLocation(location)
+        try:
+            status, message = _run_settings(wm, location, archive, relocate, scheduler_options)
+        except WorkflowTimeoutError as e:
+            # The steps are left as they are, a timed out step may still be using them.
+            logger.error(f"Run of workflow '{workflow}' with settings '{archive}' timed out, abandoning the batch: {e}")
+            results.append(_batch_result(index, archive, workflow, location, 'timed out', str(e), start))
+            results.extend(_batch_result(skipped_index, skipped_archive, workflow, None, 'skipped', 'An earlier run timed out.', time.perf_counter())
+                           for skipped_index, skipped_archive in enumerate(archives) if skipped_index > index)
+            return results, True
+        results.append(_batch_result(index, archive, workflow, location, status, message, start))
+
+    wm.scene().updateWorkflowLocation(workflow)
+
+    return results, False
+
+
+def _sweep(model, workflow, archives, relocate, scheduler_options, processes, sweep_dir, link, broker=None):
+    """
+    Execute the runs of a batch concurrently on up to processes worker
+    processes, each run on its own copy of the workflow in sweep_dir.  The
+    workers are forked from this process, so they start with the plugins
+    already imported.  If a task broker is given the runs are dispatched to
+    its workers instead, the copies are then made in the broker's spool
+    directory unless sweep_dir is given.
+    """
+    global _forked_model
+    _forked_model = model
+
+    if broker is not None:
+        sweep_dir = _sweep_directory(sweep_dir, lambda: os.path.join(broker.spool_dir(), 'sweep'))
+    else:
+        sweep_dir = _sweep_directory(sweep_dir, lambda: mkdtemp(prefix='mapclient-sweep-'))
+    logger.info(f"Writing workflow copies for {len(archives)} runs to '{sweep_dir}'.")
+
+    if broker is not None:
+        # The steps of each run are executed by the worker the run is sent to.
+        scheduler_options = dict(scheduler_options, broker_spool=None)
+        executor = broker
+    else:
+        executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork'))
+
+    with executor:
+        futures = [executor.submit(_sweep_run, workflow, _run_location(sweep_dir, index), link,
+                                   index, archive, relocate, scheduler_options)
+                   for index, archive in enumerate(archives)]
+
+        return [future.result() for future in futures]
+
+
+def batch_main(workflow, settings, results_file=None, relocate=False, scheduler_options=None, processes=1, sweep_dir=None, link=False):
+    """
+    Execute the workflow once for each settings archive given by settings,
+    each run on its own copy of the workflow in sweep_dir.  Plugins and the
+    workflow are loaded once and the loaded steps are reconfigured for every
+    run.  If processes is greater than one the runs are executed concurrently,
+    see _sweep.  The status and the copy of each run are written to the
+    results file.  Runs made one at a time share the loaded steps, so the
+    batch is abandoned if a run times out.
+    """
+    if scheduler_options is None:
+        scheduler_options = {}
+
+    if workflow is None:
+        return HEADLESS_MODE_WITH_NO_WORKFLOW
+
+    if settings is None or not os.path.exists(settings):
+        logger.error(f'No settings archives found at: "{settings}"')
+        return BATCH_MODE_NO_SETTINGS
+
+    app, model = _prepare_headless_model(scheduler_options.get('fork_server', False))
+    wm = model.workflowManager()
+    _set_broker_profile(model, scheduler_options)
+
+    try:
+        wm.scene().setMainWindow(_FacadeMainWindow(model))
+        wm.load(workflow)
+    except:
+        logger.error('Not a valid workflow location: "{0}"'.format(workflow))
+        sys.exit(INVALID_WORKFLOW_LOCATION_GIVEN)
+
+    workflow = wm.location()
+    if results_file is None:
+        results_file = os.path.join(workflow, info.DEFAULT_WORKFLOW_BATCH_RESULTS_FILENAME)
+
+    archives = _settings_archives(settings)
+    if processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning('Concurrent batch runs are not available on this platform, executing the runs one at a time.')
+        processes = 1
+
+    # Runs made concurrently are made in processes of their own, so a run
+    # timing out does not affect the others.
+    timed_out = False
+    if scheduler_options.get('broker_spool') is not None:
+        from mapclient.core.broker import SpoolBroker
+        broker = SpoolBroker(scheduler_options['broker_spool'], scheduler_options['plugin_directories'])
+        results = _sweep(model, workflow, archives, relocate, scheduler_options, processes, sweep_dir, link, broker)
+    elif processes > 1:
+        results = _sweep(model, workflow, archives, relocate, scheduler_options, processes, sweep_dir, link)
+    else:
+        results, timed_out = _run_one_at_a_time(wm, workflow, archives, relocate, scheduler_options, sweep_dir, link)
+
+    with open(results_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=_BATCH_RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    succeeded = sum(1 for result in results if result['status'] == 'success')
+    logger.info(f"{succeeded} of {len(results)} runs succeeded, results written to '{results_file}'.")
+
+    _quit(app)
+    if timed_out:
+        # The timed out step may still be running on a thread of this process.
+        exit_process(HEADLESS_MODE_TIMED_OUT)
+
+    return APP_SUCCESS if succeeded == len(results) else BATCH_MODE_RUN_FAILED
+
+
+def _serve_run(request):
+    """
+    Execute a run requested of the server.  If the request imports settings
+    the run is made on a copy of the workflow, so the configuration of the
+    workflow itself is never replaced, and the reply gives the location of
+    the copy, which is left for the client to remove.
+    """
+    start = time.perf_counter()
+    workflow = os.path.abspath(request['workflow'])
+    scheduler_options = request.get('options', {})
+    archive = request.get('import_settings')
+    if archive is not None:
+        location = os.path.join(mkdtemp(prefix='mapclient-run-'), os.path.basename(workflow))
+        try:
+            _copy_workflow(workflow, location)
+        except Exception as e:
+            return {'status': 'failed', 'message': f'Could not copy workflow: {e}', 'workflow': location,
+                    'duration': round(time.perf_counter() - start, 3)}
+        workflow = location
+
+    status, message = _load_and_run(workflow, archive, request.get('relocate', False), scheduler_options)
+
+    return {'status': status, 'message': message, 'workflow': workflow, 'duration': round(time.perf_counter() - start, 3)}
+
+
+def serve_main(socket_file=None, max_runs=1, fork_server=False):
+    """
+    Keep the packages and plugins loaded and execute the workflow run
+    requests received on a local UNIX socket, see WorkflowServer.  Each run
+    is executed in a worker process forked from this process, at most
+    max_runs at the same time.  A request may give the 'import_settings'
+    and 'relocate' values of headless mode and the scheduler 'options'.
+    """
+    from mapclient.core.server import WorkflowServer
+    from mapclient.settings.general import get_server_socket_file
+
+    global _forked_model
+
+    app, model = _prepare_headless_model(fork_server)
+    model.workflowManager().scene().setMainWindow(_FacadeMainWindow(model))
+    _forked_model = model
+
+    if socket_file is None:
+        socket_file = get_server_socket_file()
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers=max_runs, mp_context=multiprocessing.get_context('fork'))
+    else:
+        logger.warning('Worker processes are not available on this platform, executing one run at a time.')
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    try:
+        WorkflowServer(socket_file, _serve_run, executor).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    _quit(app)
+    return APP_SUCCESS
+
+
+def worker_main(spool_dir, max_tasks=None, idle_timeout=None):
+    """
+    Execute the steps and batch runs dispatched to the given spool directory
+    by a SpoolBroker.  The plugins are loaded from the plugin directories the
+    broker wrote to the spool, if any, otherwise from the current plugin
+    profile.
+    """
+    from mapclient.core.broker import SpoolWorker, read_plugin_directories
+
+    global _forked_model
+
+    if spool_dir is None:
+        logger.error('No spool directory given.')
+        return WORKER_MODE_NO_SPOOL
+
+    app, model = _prepare_headless_model(plugin_directories=read_plugin_directories(spool_dir))
+    model.workflowManager().scene().setMainWindow(_FacadeMainWindow(model))
+    _forked_model = model
+
+    try:
+        executed = SpoolWorker(spool_dir).run(max_tasks, idle_timeout)
+        logger.info(f'Executed {executed} task(s).')
+    except KeyboardInterrupt:
+        pass
+
+    _quit(app)
+    return APP_SUCCESS
 
 
 def _user_specified_environment_main(base_dir, directories):
@@ -525,6 +1097,44 @@ def _common_workflow_args(parser):
     parser.add_argument("-r", "--relocate", action="store_true", help="Relocate the workflow directory to be relative to the import settings location.")
 
 
+def _scheduler_args(parser):
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Maximum number of independent steps to execute at the same time.")
+    parser.add_argument("--process-pool", action="store_true", help="Execute steps in a pool of processes instead of a pool of threads.")
+    parser.add_argument("--fork-server", action="store_true", help="Fork the process pool workers from a server process that has imported the loaded plugins.")
+    parser.add_argument("--cache", action="store_true", help="Re-use the cached outputs of steps whose configuration and inputs are unchanged.")
+    parser.add_argument("--cache-dir", help="Location of the step output cache.")
+    parser.add_argument("--cache-size", type=float, default=1024, help="Maximum size of the step output cache in megabytes.")
+    parser.add_argument("--memory-budget", type=float, help="Write port data larger than this many megabytes to disk before handing it to the next step.")
+    parser.add_argument("--scratch-dir", help="Directory to write port data exceeding the memory budget to, defaults to a temporary directory.")
+    parser.add_argument("--broker-spool", metavar="DIR", help="Dispatch the steps, or the runs of a batch, to the workers serving this shared spool directory.")
+
+
+def _scheduler_options(args):
+    options = {
+        'jobs': args.jobs,
+        'process_pool': args.process_pool,
+        'fork_server': args.fork_server,
+        'cache': args.cache,
+        'cache_dir': args.cache_dir,
+        'cache_size': args.cache_size,
+        'memory_budget': args.memory_budget,
+        'scratch_dir': args.scratch_dir,
+        'broker_spool': args.broker_spool,
+    }
+    if args.command == "headless":
+        options.update({
+            'checkpoint': args.checkpoint or args.resume or args.from_step is not None,
+            'resume': args.resume,
+            'from_step': args.from_step,
+            'profile': args.profile or args.profile_report,
+            'profile_report': args.profile_report,
+            'trace': args.trace,
+            'plan': args.plan,
+        })
+
+    return options
+
+
 def _parse_args():
     parser = argparse.ArgumentParser(prog=info.APPLICATION_NAME)
 
@@ -545,6 +1155,39 @@ def _parse_args():
     # Subcommand: headless
     headless_parser = subparsers.add_parser("headless", help="Run MAP Client in headless mode.")
     _common_workflow_args(headless_parser)
+    _scheduler_args(headless_parser)
+    headless_parser.add_argument("--cache-info", action="store_true", help="Report the contents of the step output cache.")
+    headless_parser.add_argument("--cache-purge", action="store_true", help="Remove all entries from the step output cache.")
+    headless_parser.add_argument("--checkpoint", action="store_true", help="Record the outputs of completed steps in the workflow directory.")
+    headless_parser.add_argument("--resume", action="store_true", help="Resume execution at the first step that was not completed by the previous run.")
+    headless_parser.add_argument("--from-step", metavar="IDENTIFIER", help="Re-execute the workflow from the step with the given identifier.")
+    headless_parser.add_argument("--profile", action="store_true", help="Report the time and memory used by each step at the end of the run.")
+    headless_parser.add_argument("--profile-report", action="store_true", help="As for --profile, and also write the report as JSON to the workflow directory.")
+    headless_parser.add_argument("--plan", action="store_true", help="Report the order the steps would be executed in, with estimates from the last profile report, without executing them.")
+    headless_parser.add_argument("--trace", metavar="FILE", help="Write a timeline of the workflow execution to the given file in the Chrome trace event format.")
+
+    # Subcommand: batch
+    batch_parser = subparsers.add_parser("batch", help="Execute a workflow once for each of a set of settings archives.")
+    batch_parser.add_argument("-w", "--workflow", help="Location of workflow.")
+    batch_parser.add_argument("-s", "--settings", help="Directory of settings archives, or a file listing one settings archive per line.")
+    batch_parser.add_argument("-o", "--results", help="File to write the results table to, defaults to a CSV file in the workflow directory.")
+    batch_parser.add_argument("-r", "--relocate", action="store_true", help="Relocate the workflow directory to be relative to each settings archive location.")
+    batch_parser.add_argument("-p", "--processes", type=int, default=1, help="Number of runs to execute at the same time, each on its own copy of the workflow.")
+    batch_parser.add_argument("--sweep-dir", help="Directory to make the workflow copy for each run in, defaults to a temporary directory.")
+    batch_parser.add_argument("--link", action="store_true", help="Hard link the files of the workflow copies instead of copying them, the steps must not modify existing files in place.")
+    _scheduler_args(batch_parser)
+
+    # Subcommand: serve
+    serve_parser = subparsers.add_parser("serve", help="Execute workflow run requests received on a local socket.")
+    serve_parser.add_argument("-s", "--socket", help="Location of the UNIX socket to listen on.")
+    serve_parser.add_argument("-n", "--max-runs", type=int, default=1, help="Maximum number of workflow runs to execute at the same time.")
+    serve_parser.add_argument("--fork-server", action="store_true", help="Fork the process pool workers of runs from a server process that has imported the loaded plugins.")
+
+    # Subcommand: worker
+    worker_parser = subparsers.add_parser("worker", help="Execute the steps and batch runs dispatched to a shared spool directory.")
+    worker_parser.add_argument("-s", "--spool", help="Location of the spool directory.")
+    worker_parser.add_argument("-n", "--max-tasks", type=int, help="Exit after executing this many tasks.")
+    worker_parser.add_argument("--idle-timeout", type=float, help="Exit after waiting this many seconds for a task.")
 
     _common_workflow_args(parser)
 
@@ -558,8 +1201,17 @@ def main():
         result = _config_maker_main(args.configuration, args.definition, False)
     elif args.command == "use":
         result = _user_specified_environment_main(args.base_dir, args.directory)
+    elif args.command == "headless" and (args.cache_info or args.cache_purge):
+        result = _step_cache_main(_scheduler_options(args), args.cache_info, args.cache_purge)
     elif args.command == "headless":
-        result = sans_gui_main(args.workflow, args.import_settings, args.relocate)
+        result = sans_gui_main(args.workflow, args.import_settings, args.relocate, _scheduler_options(args))
+    elif args.command == "batch":
+        result = batch_main(args.workflow, args.settings, args.results, args.relocate, _scheduler_options(args),
+                            args.processes, args.sweep_dir, args.link)
+    elif args.command == "serve":
+        result = serve_main(args.socket, args.max_runs, args.fork_server)
+    elif args.command == "worker":
+        result = worker_main(args.spool, args.max_tasks, args.idle_timeout)
     else:
         result = windows_main(args.workflow, args.execute)
 
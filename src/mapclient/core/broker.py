@@ -0,0 +1,280 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+    
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future
+
+from mapclient.core.workflow.workflowerror import WorkflowError
+
+logger = logging.getLogger(__name__)
+
+_TASKS_DIR = 'tasks'
+_CLAIMED_DIR = 'claimed'
+_RESULTS_DIR = 'results'
+_PROFILE_FILE = 'profile.json'
+
+
+class TaskBroker(Executor):
+    """
+    Dispatches tasks to workers that may run on other machines.  A broker is
+    an Executor, so it can be used by the workflow scheduler and batch sweeps
+    in place of a local process pool.  The functions submitted, with their
+    arguments and results, must be picklable and the functions must be
+    importable by the workers.  Cancelling a task only prevents it from
+    starting, a task a worker has started runs to completion and its result
+    is discarded.
+    """
+
+
+def _write_atomically(file_name, data):
+    temp_file_name = f'{file_name}.{uuid.uuid4().hex}.tmp'
+    with open(temp_file_name, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file_name, file_name)
+
+
+def _remove_if_exists(file_name):
+    try:
+        os.remove(file_name)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _result_file(results_dir, task_id):
+    return os.path.join(results_dir, f'{task_id}.result')
+
+
+def _cancelled_file(results_dir, task_id):
+    return os.path.join(results_dir, f'{task_id}.cancelled')
+
+
+def _spool_directories(spool_dir):
+    directories = [os.path.join(spool_dir, name) for name in (_TASKS_DIR, _CLAIMED_DIR, _RESULTS_DIR)]
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    return directories
+
+
+def read_plugin_directories(spool_dir):
+    """
+    Return the plugin directories written to the spool by the broker, or
+    None if the broker did not give any.
+    """
+    profile_file = os.path.join(spool_dir, _PROFILE_FILE)
+    if not os.path.isfile(profile_file):
+        return None
+
+    with open(profile_file) as f:
+        return json.load(f)['plugin_directories']
+
+
+class SpoolBroker(TaskBroker):
+    """
+    A broker that exchanges tasks and results with workers through files in
+    a spool directory, which must be shared with the machines the workers run
+    on.  It can stand in for a cluster queue, any number of SpoolWorkers can
+    serve the same spool.
+
+    If plugin_directories is given it is written to the spool, so that the
+    workers load the same plugins as the process submitting the tasks.
+    """
+
+    def __init__(self, spool_dir, plugin_directories=None, poll_interval=0.1):
+        self._spool_dir = os.path.abspath(spool_dir)
+        self._tasks_dir, self._claimed_dir, self._results_dir = _spool_directories(self._spool_dir)
+        self._poll_interval = poll_interval
+        self._futures = {}
+        self._lock = threading.RLock()
+        self._poller = None
+        self._shutdown = False
+        if plugin_directories is not None:
+            _write_atomically(os.path.join(self._spool_dir, _PROFILE_FILE),
+                              json.dumps({'plugin_directories': plugin_directories}).encode())
+
+    def spool_dir(self):
+        return self._spool_dir
+
+    def _task_file(self, task_id):
+        return os.path.join(self._tasks_dir, f'{task_id}.task')
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit a task after the broker has been shut down.')
+
+            task_id = uuid.uuid4().hex
+            future = Future()
+            _write_atomically(self._task_file(task_id), pickle.dumps((fn, args, kwargs)))
+            self._futures[task_id] = future
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='spool-broker', daemon=True)
+                self._poller.start()
+
+        return future
+
+    def _withdraw(self, task_id):
+        """
+        Withdraw a cancelled task.  If a worker has already claimed it, the
+        worker is told to discard the result, which is removed here if the
+        worker wrote it before being told.
+        """
+        if _remove_if_exists(self._task_file(task_id)):
+            return
+
+        cancelled_file = _cancelled_file(self._results_dir, task_id)
+        _write_atomically(cancelled_file, b'')
+        if _remove_if_exists(_result_file(self._results_dir, task_id)):
+            _remove_if_exists(cancelled_file)
+
+    def _collect(self):
+        """
+        Complete the futures of the tasks whose results have been written,
+        and withdraw the tasks that have been cancelled.
+        """
+        with self._lock:
+            for task_id, future in list(self._futures.items()):
+                if future.cancelled():
+                    self._withdraw(task_id)
+                    del self._futures[task_id]
+                    continue
+
+                result_file = _result_file(self._results_dir, task_id)
+                if not os.path.isfile(result_file):
+                    continue
+
+                with open(result_file, 'rb') as f:
+                    succeeded, value = pickle.load(f)
+                os.remove(result_file)
+                del self._futures[task_id]
+                if future.set_running_or_notify_cancel():
+                    if succeeded:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                self._collect()
+                if not self._futures:
+                    self._poller = None
+                    return
+            time.sleep(self._poll_interval)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._futures.values())
+
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+            self._collect()
+        if wait:
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+
+
+class SpoolWorker(object):
+    """
+    Executes the tasks submitted to a SpoolBroker.  A task is claimed by
+    moving its file into the claimed directory, so each task is executed by
+    exactly one of the workers serving the spool.
+    """
+
+    def __init__(self, spool_dir, poll_interval=0.1):
+        self._spool_dir = os.path.abspath(spool_dir)
+        self._tasks_dir, self._claimed_dir, self._results_dir = _spool_directories(self._spool_dir)
+        self._poll_interval = poll_interval
+        self._name = f'{socket.gethostname()}-{os.getpid()}'
+
+    def _claim(self):
+        for task_file in sorted(os.listdir(self._tasks_dir)):
+            if not task_file.endswith('.task'):
+                continue
+
+            task_id = task_file[:-len('.task')]
+            claimed_file = os.path.join(self._claimed_dir, f'{task_id}.{self._name}')
+            try:
+                os.rename(os.path.join(self._tasks_dir, task_file), claimed_file)
+            except FileNotFoundError:
+                # Claimed by another worker, or withdrawn by the broker.
+                continue
+
+            return task_id, claimed_file
+
+        return None
+
+    def _execute(self, task_id, claimed_file):
+        try:
+            with open(claimed_file, 'rb') as f:
+                fn, args, kwargs = pickle.load(f)
+            result = True, fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Task '{task_id}' failed: {e}")
+            result = False, e
+
+        try:
+            data = pickle.dumps(result)
+        except Exception as e:
+            data = pickle.dumps((False, WorkflowError(f'Could not return the result of the task: {e}')))
+
+        # The broker writes the cancelled file before looking for the result,
+        # so one of the two sees the other and removes the unwanted files.
+        cancelled_file = _cancelled_file(self._results_dir, task_id)
+        if not os.path.isfile(cancelled_file):
+            result_file = _result_file(self._results_dir, task_id)
+            _write_atomically(result_file, data)
+            if os.path.isfile(cancelled_file):
+                _remove_if_exists(result_file)
+        _remove_if_exists(cancelled_file)
+        os.remove(claimed_file)
+
+    def run(self, max_tasks=None, idle_timeout=None):
+        """
+        Execute tasks until max_tasks have been executed, or no task has been
+        submitted for idle_timeout seconds.  Either may be None for no limit.
+        Returns the number of tasks executed.
+        """
+        logger.info(f"Serving tasks from spool '{self._spool_dir}'.")
+        executed = 0
+        idle_since = time.monotonic()
+        while max_tasks is None or executed < max_tasks:
+            claimed = self._claim()
+            if claimed is None:
+                if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                    break
+                time.sleep(self._poll_interval)
+                continue
+
+            self._execute(*claimed)
+            executed += 1
+            idle_since = time.monotonic()
+
+        return executed
@@ -8,3 +8,7 @@ LOG_FILE_LOCK_FAILED = 8
 USER_SPECIFIED_DIRECTORY = 9
 PID_FILE_LOCK_FAILED = 10
 CONFIGURATION_MODE_NOT_IMPLEMENTED = 11
+BATCH_MODE_NO_SETTINGS = 12
+BATCH_MODE_RUN_FAILED = 13
+HEADLESS_MODE_TIMED_OUT = 14
+WORKER_MODE_NO_SPOOL = 15
@@ -0,0 +1,111 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+    
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import multiprocessing
+import multiprocessing.forkserver
+import os
+import sys
+from importlib import import_module
+
+from mapclient.core.workflow.workflowerror import WorkflowError
+from mapclient.settings.definitions import PLUGINS_PACKAGE_NAME
+
+logger = logging.getLogger(__name__)
+
+# Describes the plugins to the fork server process, which only has the
+# environment of the process that starts it to go on.
+_PLUGINS_VARIABLE = 'MAP_CLIENT_FORK_SERVER_PLUGINS'
+
+
+def fork_server_context(plugin_modules):
+    """
+    Return a multiprocessing context whose worker processes are forked from
+    a server process that has imported the given plugin modules, or None if
+    fork servers are not available on this platform.  The server is started
+    here, with the plugin directories and the plugins package path of this
+    process, so plugins imported after the server has started are not
+    available to the workers.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        logger.warning('Fork server mode is not available on this platform.')
+        return None
+
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['mapclient.core.workflow.workflowscheduler', __name__])
+    package = sys.modules.get(PLUGINS_PACKAGE_NAME)
+    description = {
+        'sys_path': sys.path,
+        'package_path': list(package.__path__) if package is not None else [],
+        'modules': plugin_modules,
+    }
+    os.environ[_PLUGINS_VARIABLE] = json.dumps(description)
+    try:
+        multiprocessing.forkserver.ensure_running()
+    finally:
+        del os.environ[_PLUGINS_VARIABLE]
+
+    # The server exits if it could not import the plugins, which otherwise
+    # only shows when the first worker cannot be forked.
+    process = context.Process(target=_check_fork_server)
+    try:
+        process.start()
+    except (EOFError, OSError):
+        raise WorkflowError('The fork server could not import the plugins, see the error it reported.')
+    process.join()
+
+    return context
+
+
+def _check_fork_server():
+    pass
+
+
+def _bootstrap_plugins():
+    """
+    Import the plugins described by the process starting the fork server,
+    the server does not apply the path of that process, and ignores the
+    modules it cannot import, itself.
+    """
+    description = json.loads(os.environ.pop(_PLUGINS_VARIABLE))
+    for directory in description['sys_path']:
+        if directory not in sys.path:
+            sys.path.append(directory)
+
+    if not description['modules']:
+        return
+
+    try:
+        package = import_module(PLUGINS_PACKAGE_NAME)
+        for directory in description['package_path']:
+            if directory not in package.__path__:
+                package.__path__.append(directory)
+        for module_name in description['modules']:
+            import_module(module_name)
+    except ImportError as e:
+        raise WorkflowError(f'Could not import the plugins into the fork server: {e}')
+
+    from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+    if not WorkflowStepMountPoint.plugins:
+        raise WorkflowError('No steps were registered by the plugins imported into the fork server.')
+
+
+if _PLUGINS_VARIABLE in os.environ:
+    _bootstrap_plugins()
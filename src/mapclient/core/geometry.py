@@ -0,0 +1,113 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+from mapclient.settings.general import qt_application_exists
+
+# Points, sizes and rectangles for the core model.  When a Qt application is
+# running the Qt classes are used, otherwise minimal pure Python classes with
+# the same accessors are used so that workflows can be loaded and executed
+# without importing Qt.
+
+
+class Point(object):
+
+    def __init__(self, x=0.0, y=0.0):
+        self._x = x
+        self._y = y
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def setX(self, x):
+        self._x = x
+
+    def setY(self, y):
+        self._y = y
+
+    def __eq__(self, other):
+        return self.x() == other.x() and self.y() == other.y()
+
+    def __repr__(self):
+        return f'Point({self._x}, {self._y})'
+
+
+class Size(object):
+
+    def __init__(self, width=0.0, height=0.0):
+        self._width = width
+        self._height = height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def setWidth(self, width):
+        self._width = width
+
+    def setHeight(self, height):
+        self._height = height
+
+    def __repr__(self):
+        return f'Size({self._width}, {self._height})'
+
+
+class Rect(Size):
+
+    def __init__(self, x=0.0, y=0.0, width=0.0, height=0.0):
+        super(Rect, self).__init__(width, height)
+        self._x = x
+        self._y = y
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def __repr__(self):
+        return f'Rect({self._x}, {self._y}, {self._width}, {self._height})'
+
+
+def point(x, y, integer=False):
+    if qt_application_exists():
+        from PySide6 import QtCore
+        return QtCore.QPoint(x, y) if integer else QtCore.QPointF(x, y)
+
+    return Point(x, y)
+
+
+def size(width, height, integer=False):
+    if qt_application_exists():
+        from PySide6 import QtCore
+        return QtCore.QSize(width, height) if integer else QtCore.QSizeF(width, height)
+
+    return Size(width, height)
+
+
+def rect(x, y, width, height, integer=False):
+    if qt_application_exists():
+        from PySide6 import QtCore
+        return QtCore.QRect(x, y, width, height) if integer else QtCore.QRectF(x, y, width, height)
+
+    return Rect(x, y, width, height)
@@ -19,14 +19,13 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
 """
 import logging
 
-from PySide6 import QtCore
-
 from mapclient.core.managers.workflowmanager import WorkflowManager
 from mapclient.core.managers.undomanager import UndoManager
 from mapclient.core.managers.packagemanager import PackageManager
 from mapclient.core.managers.pluginmanager import PluginManager
 from mapclient.core.managers.optionsmanager import OptionsManager
 from mapclient.core.checks import runChecks
+from mapclient.core.geometry import point, size
 from mapclient.settings.definitions import CHECK_TOOLS_ON_STARTUP, RECENTS_LENGTH
 from mapclient.settings.general import get_settings
 from mapclient.settings.version import __version__ as version
@@ -40,8 +39,8 @@ class MainApplication(object):
     """
 
     def __init__(self):
-        self._size = QtCore.QSize(600, 400)
-        self._pos = QtCore.QPoint(100, 150)
+        self._size = size(600, 400, integer=True)
+        self._pos = point(100, 150, integer=True)
         self._is_maximized = False
         self._recent_workflows = []
         self._pluginManager = PluginManager()
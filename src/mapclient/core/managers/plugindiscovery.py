@@ -0,0 +1,326 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+    
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import ast
+import json
+import logging
+import os
+import uuid
+
+from mapclient.settings.definitions import PLUGINS_PACKAGE_NAME
+
+logger = logging.getLogger(__name__)
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return [stat.st_ino, stat.st_mtime_ns]
+
+
+_IGNORED_DIRECTORIES = ('.git', '.hg', '.svn', '__pycache__')
+
+
+def directory_signature(plugin_dir):
+    """
+    Return a signature of the given directory that changes when the result
+    of scanning it can change: when a plugin package is added to, removed
+    from, or replaced in it, or when any of the Python files in its plugins
+    package directory is added, removed or modified.  It is made of the
+    inode and modification time of the directory and of each directory and
+    Python file in its plugins package directory, the directories the scan
+    skips excepted.
+    """
+    signature = [_stat_signature(plugin_dir)]
+    package_dir = os.path.join(plugin_dir, PLUGINS_PACKAGE_NAME)
+    package_signature = _stat_signature(package_dir)
+    if package_signature is not None:
+        signature.append(package_signature)
+        for root, dirs, file_names in os.walk(package_dir):
+            dirs[:] = sorted(name for name in dirs if name not in _IGNORED_DIRECTORIES)
+            relative_root = os.path.relpath(root, package_dir)
+            signature.extend([os.path.join(relative_root, name)] + (_stat_signature(os.path.join(root, name)) or [])
+                             for name in dirs + sorted(name for name in file_names if name.endswith('.py')))
+
+    return signature
+
+
+class _Manifest(object):
+    """
+    A JSON file of entries keyed on a path, each with the signature of the
+    files it was made from.  An entry is only valid while its signature is
+    unchanged.
+    """
+
+    def __init__(self, file_name):
+        self._file_name = file_name
+        self._entries = None
+        self._modified = False
+
+    def _load(self):
+        self._entries = {}
+        if self._file_name is None or not os.path.isfile(self._file_name):
+            return
+
+        try:
+            with open(self._file_name) as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Ignoring unreadable manifest '{self._file_name}': {e}")
+
+    def _entry(self, path, signature):
+        if self._entries is None:
+            self._load()
+
+        entry = self._entries.get(path)
+        if entry is not None and entry['signature'] == signature:
+            return entry
+
+        return None
+
+    def _set_entry(self, path, signature, **values):
+        self._entries[path] = dict(values, signature=signature)
+        self._modified = True
+
+    def write(self):
+        """
+        Write the manifest if it has changed, dropping the entries of paths
+        that no longer exist.
+        """
+        if not self._modified or self._file_name is None:
+            return
+
+        entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+        temp_file_name = f'{self._file_name}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._file_name), exist_ok=True)
+            with open(temp_file_name, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_file_name, self._file_name)
+        except OSError as e:
+            logger.warning(f"Could not write the manifest '{self._file_name}': {e}")
+            return
+
+        self._modified = False
+
+
+class PluginDiscoveryManifest(_Manifest):
+    """
+    Records on disk whether a directory is a MAP Client plugins directory,
+    keyed on the directory and its signature.  A directory whose signature
+    is unchanged is not scanned again, only new or changed directories are
+    passed to the scan function.
+    """
+
+    def is_plugins_dir(self, plugin_dir, scan):
+        plugin_dir = os.path.abspath(plugin_dir)
+        signature = directory_signature(plugin_dir)
+        entry = self._entry(plugin_dir, signature)
+        if entry is not None:
+            return entry['plugins_dir']
+
+        result = scan(plugin_dir)
+        self._set_entry(plugin_dir, signature, plugins_dir=result)
+
+        return result
+
+
+_PLUGIN_ATTRIBUTES = {'__version__': 'version', '__author__': 'author', '__stepname__': 'stepname', '__location__': 'location'}
+
+
+def _parse(file_name):
+    with open(file_name, encoding='utf-8') as f:
+        return ast.parse(f.read(), file_name)
+
+
+def _string(node):
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _is_self_attribute(node, name):
+    return isinstance(node, ast.Attribute) and node.attr == name and isinstance(node.value, ast.Name) and node.value.id == 'self'
+
+
+def _is_step_class(node):
+    return isinstance(node, ast.ClassDef) and any(
+        (isinstance(base, ast.Name) and base.id == 'WorkflowStepMountPoint') or
+        (isinstance(base, ast.Attribute) and base.attr == 'WorkflowStepMountPoint') for base in node.bases)
+
+
+def _extract_package_information(init_file):
+    """
+    Return the plugin attributes set in the given package __init__ file, or
+    None if any of them is not set to a string literal.
+    """
+    information = {}
+    for node in _parse(init_file).body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in _PLUGIN_ATTRIBUTES:
+                    value = _string(node.value)
+                    if value is None:
+                        return None
+                    information[_PLUGIN_ATTRIBUTES[target.id]] = value
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any((alias.asname or alias.name) in _PLUGIN_ATTRIBUTES for alias in node.names):
+                return None
+
+    return information
+
+
+def _extract_ports(node):
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+
+    ports = value if isinstance(value, list) else [value]
+    if not all(isinstance(port, tuple) and len(port) == 3 for port in ports):
+        return None
+
+    return [list(port) for port in ports]
+
+
+def _extract_step_information(step_file):
+    """
+    Return the name, category, icon resource and ports of the step class
+    defined in the given file, read from the literal values its __init__
+    method passes to the mount point.  Returns None if the step name or
+    category is not a literal, the ports are None if any port is not a
+    literal.
+    """
+    for class_node in filter(_is_step_class, _parse(step_file).body):
+        for function_node in class_node.body:
+            if not isinstance(function_node, ast.FunctionDef) or function_node.name != '__init__':
+                continue
+
+            information = {'name': None, 'category': 'General', 'icon': None, 'ports': []}
+            nodes = sorted((node for node in ast.walk(function_node) if isinstance(node, (ast.Call, ast.Assign))),
+                           key=lambda n: (n.lineno, n.col_offset))
+            for node in nodes:
+                if isinstance(node, ast.Assign):
+                    if any(_is_self_attribute(target, '_category') for target in node.targets):
+                        information['category'] = _string(node.value)
+                        if information['category'] is None:
+                            logger.warning(f"The category of the step in '{step_file}' is not a string literal, "
+                                           f"its plugin will be imported to read it.")
+                            return None
+                    elif any(_is_self_attribute(target, '_icon') for target in node.targets):
+                        if isinstance(node.value, ast.Call) and node.value.args:
+                            information['icon'] = _string(node.value.args[0])
+                elif isinstance(node.func, ast.Attribute) and node.func.attr == '__init__' and node.args and \
+                        isinstance(node.func.value, ast.Call) and isinstance(node.func.value.func, ast.Name) and node.func.value.func.id == 'super':
+                    information['name'] = _string(node.args[0])
+                elif _is_self_attribute(node.func, 'addPort') and node.args and information['ports'] is not None:
+                    ports = _extract_ports(node.args[0])
+                    information['ports'] = None if ports is None else information['ports'] + ports
+
+            return information if information['name'] else None
+
+    return None
+
+
+def _find_icon_file(package_dir, icon):
+    # A resource path ':/<prefix>/images/icon.png' names a file the plugin
+    # compiles into its resources, look for it in the package directory.
+    if icon is None or not icon.startswith(':/'):
+        return None
+
+    relative_path = os.path.join(*icon[2:].split('/')[1:])
+    for root, dirs, file_names in os.walk(package_dir):
+        candidate = os.path.join(root, relative_path)
+        if os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+class PluginStepManifest(_Manifest):
+    """
+    Records on disk the information about the step of each plugin package
+    that can be read from its source without importing it: the step name,
+    category, icon and ports, and the plugin version information.  Entries
+    are keyed on the package directory and the signature of its __init__.py
+    and step.py files.
+    """
+
+    def step_information(self, package_dir):
+        """
+        Return the information about the step of the plugin package in the
+        given directory, or None if it cannot be read without importing the
+        package.
+        """
+        package_dir = os.path.abspath(package_dir)
+        init_file = os.path.join(package_dir, '__init__.py')
+        step_file = os.path.join(package_dir, 'step.py')
+        signature = [_stat_signature(init_file), _stat_signature(step_file)]
+        entry = self._entry(package_dir, signature)
+        if entry is not None:
+            return entry['information']
+
+        information = None
+        if None not in signature:
+            try:
+                package_information = _extract_package_information(init_file)
+                step_information = _extract_step_information(step_file)
+            except (OSError, SyntaxError, ValueError) as e:
+                logger.debug(f"Could not read the step of the plugin in '{package_dir}': {e}")
+            else:
+                if package_information is not None and step_information is not None:
+                    information = dict(package_information, **step_information)
+                    information['icon_file'] = _find_icon_file(package_dir, information['icon'])
+
+        self._set_entry(package_dir, signature, information=information)
+
+        return information
+
+
+class UnloadedStep(object):
+    """
+    Stands in for a step, in the list of available steps, whose plugin has
+    not been imported yet.  Creating the step with workflowStepFactory
+    imports the plugin.
+    """
+
+    def __init__(self, information):
+        self._information = information
+        self._image = None
+
+    def getName(self):
+        return self._information['name']
+
+    def getCategory(self):
+        return self._information['category']
+
+    def getIcon(self):
+        if self._image is None and self._information.get('icon_file'):
+            from PySide6 import QtGui
+            self._image = QtGui.QImage(self._information['icon_file'])
+
+        return self._image
+
+    @property
+    def _icon(self):
+        return self.getIcon()
+
+    def ports(self):
+        return self._information['ports']
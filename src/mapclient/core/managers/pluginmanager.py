@@ -8,11 +8,14 @@ import json
 import logging
 import os
 import pkgutil
+import re
 import shutil
 import subprocess
 import sys
+import threading
 import traceback
 import types
+from concurrent.futures import ThreadPoolExecutor
 
 from mapclient.application import get_app_path
 from mapclient.core.utils import which, FileTypeObject, grep, is_frozen, determine_step_name, determine_step_class_name, \
@@ -20,10 +23,13 @@ from mapclient.core.utils import which, FileTypeObject, grep, is_frozen, determi
 from mapclient.settings.definitions import VIRTUAL_ENV_PATH, \
     PLUGINS_PACKAGE_NAME, PLUGINS_PTH
 from mapclient.core.checks import getPipExecutable
+from mapclient.core.forkserver import fork_server_context
+from mapclient.core.managers.plugindiscovery import PluginDiscoveryManifest, PluginStepManifest, UnloadedStep
 
 from importlib import import_module
 
-from mapclient.settings.general import get_virtualenv_site_packages_directory, get_settings
+from mapclient.settings.general import get_virtualenv_site_packages_directory, get_settings, get_plugin_discovery_manifest_file, \
+    get_plugin_step_manifest_file
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +68,13 @@ class PluginManager:
         self._tab_errors = []
         self._plugin_error_directories = {}
         self._plugin_error_names = []
+        self._loaded_plugin_modules = []
+        self._fork_server_enabled = False
+        self._discovery_manifest = None
+        self._step_manifest = None
+        self._lazy_loading_enabled = False
+        self._parallel_loading_enabled = False
+        self._unloaded_steps = {}
 
     def setVirtualEnvEnabled(self, state=True):
         self._virtualenv_enabled = state
@@ -171,9 +184,21 @@ class PluginManager:
     def getPluginDatabase(self):
         return self._plugin_database
 
+    def _discoveryManifest(self):
+        if self._discovery_manifest is None:
+            self._discovery_manifest = PluginDiscoveryManifest(get_plugin_discovery_manifest_file())
+
+        return self._discovery_manifest
+
+    def _stepManifest(self):
+        if self._step_manifest is None:
+            self._step_manifest = PluginStepManifest(get_plugin_step_manifest_file())
+
+        return self._step_manifest
+
     def _addPluginDir(self, directory):
         added = False
-        if isMapClientPluginsDir(directory):
+        if self._discoveryManifest().is_plugins_dir(directory, isMapClientPluginsDir):
             if directory not in sys.path:
                 sys.path.append(directory)
                 added = True
@@ -191,28 +216,26 @@ class PluginManager:
             python_executable = sys.executable
 
         if not is_frozen():
-            subprocess.Popen([python_executable, "-m", "pip", "install", str(uri)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=my_env)
+            process = subprocess.Popen([python_executable, "-m", "pip", "install", str(uri)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=my_env)
             # importlib.reload(pkg_resources)
+            threading.Thread(target=_invalidate_distribution_index_when_finished, args=(process,), daemon=True).start()
 
     def extractPluginDependencies(self, path):
         setup_dir, step_dir = os.path.split(path)
         setup_py_file = os.path.join(setup_dir, 'setup.py')
         if os.path.exists(setup_py_file):
-            current_dir = os.getcwd()
-            os.chdir(setup_dir)
-            try:
-                # Skip this for now and move to using packagemeta package instead.
-                dependencies_str = '[]'
-                # f = io.StringIO()
-                # with redirect_stdout(f):
-                #     sandbox.run_setup('setup.py', ['--install-requires'])
-                # dependencies_str = f.getvalue().rstrip()
-                # if "'" in dependencies_str:
-                #     dependencies_str = dependencies_str.replace("'", '"')
-
-                dependencies = json.loads(dependencies_str)
-            finally:
-                os.chdir(current_dir)
+            # Skip this for now and move to using packagemeta package instead.
+            # The working directory is not changed to the setup directory, as
+            # running setup.py would need, as this may run on a worker thread.
+            dependencies_str = '[]'
+            # f = io.StringIO()
+            # with redirect_stdout(f):
+            #     sandbox.run_setup('setup.py', ['--install-requires'])
+            # dependencies_str = f.getvalue().rstrip()
+            # if "'" in dependencies_str:
+            #     dependencies_str = dependencies_str.replace("'", '"')
+
+            dependencies = json.loads(dependencies_str)
 
             return dependencies
 
@@ -236,6 +259,8 @@ class PluginManager:
                     if self._addPluginDir(os.path.join(directory, name)):
                         new_plugin_directories.append(os.path.join(directory, name))
 
+        self._discoveryManifest().write()
+
         if len_package_modules_prior == 0:
             try:
                 package = import_module(PLUGINS_PACKAGE_NAME)
@@ -253,70 +278,181 @@ class PluginManager:
         self._tab_errors = []
         self._plugin_error_directories = {}
         self._plugin_error_names = []
+        self._loaded_plugin_modules = []
 
         # a(pkg_resources.working_set)
         # installed = [pkg.key for pkg in pkg_resources.working_set]
         # print(installed)
 
+        self._unloaded_steps = {}
+        plugin_packages = []
+        lazy_loading = self._lazy_loading_enabled and not is_frozen()
         for module_finder, modname, ispkg in pkgutil.iter_modules(package.__path__):
             if ispkg:
-                try:
-                    if is_frozen() and not isinstance(module_finder, importlib.machinery.FileFinder):
-                        plugin_dependencies = []
-                    else:
-                        plugin_dependencies = self.extractPluginDependencies(module_finder.path)
-                    missing_dependencies = self._plugin_database.check_for_missing_dependencies(plugin_dependencies)
-                    for dependency in missing_dependencies:
-                        self.installPackage(dependency)
-
-                    module = import_module(PLUGINS_PACKAGE_NAME + '.' + modname)
-                    if hasattr(module, '__version__') and hasattr(module, '__author__'):
-                        logger.info('Loaded plugin \'' + modname + '\' version [' + module.__version__ + '] by ' + module.__author__)
-                    if hasattr(module, '__location__') and module.__location__:
-                        logger.info('Plugin \'' + modname + '\' available from: ' + module.__location__)
-                    else:
-                        logger.info('Plugin \'' + modname + '\' has no location set.')
-
+                information = None
+                if lazy_loading and isinstance(module_finder, importlib.machinery.FileFinder) and \
+                        PLUGINS_PACKAGE_NAME + '.' + modname not in sys.modules:
+                    information = self._stepManifest().step_information(os.path.join(module_finder.path, modname))
+
+                if information is None or information['name'] in self._unloaded_steps:
+                    plugin_packages.append((module_finder, modname))
+                else:
+                    self._unloaded_steps[information['name']] = (module_finder, modname, information)
                     self._plugin_database.addLoadedPluginInformation(modname,
-                                                                     module.__stepname__ if hasattr(module, '__stepname__') else 'None',
-                                                                     module.__author__ if hasattr(module, '__author__') else 'Anon.',
-                                                                     module.__version__ if hasattr(module, '__version__') else '0.0.0',
-                                                                     module.__location__ if hasattr(module, '__location__') else '',
-                                                                     plugin_dependencies)
-                except Exception as e:
-                    from mapclient.mountpoints.workflowstep import removeWorkflowStep
-                    # Call remove partially loaded plugin manually method
-                    removeWorkflowStep(modname)
-
-                    if type(e) == ImportError:
-                        self._import_errors += [modname]
-                    elif type(e) == TypeError:
-                        self._type_errors += [modname]
-                    elif type(e) == SyntaxError:
-                        self._syntax_errors += [modname]
-                    elif type(e) == TabError:
-                        self._tab_errors += [modname]
-
-                    if is_frozen():
-                        self._plugin_error_directories[modname] = '<frozen-directory>'
-                        step_name = '<frozen-name>'
-                    else:
-                        self._plugin_error_directories[modname] = module_finder.path
-                        step_file_dir = os.path.join(module_finder.path, modname, 'step.py')
-                        class_name = determine_step_class_name(step_file_dir)
-                        step_name = determine_step_name(step_file_dir, class_name)
-                    self._plugin_error_names.append(step_name)
-
-                    logger.warning('Plugin \'' + modname + '\' not loaded')
-                    logger.warning('Reason: {0}'.format(e))
-                    exc_type, exc_value, exc_traceback = sys.exc_info()
-                    redirect_output = FileTypeObject()
-                    traceback.print_exception(exc_type, exc_value, exc_traceback, file=redirect_output)
-                    logger.warning(''.join(redirect_output.messages))
+                                                                     information.get('stepname', 'None'),
+                                                                     information.get('author', 'Anon.'),
+                                                                     information.get('version', '0.0.0'),
+                                                                     information.get('location', ''),
+                                                                     [])
+
+        if self._parallel_loading_enabled and len(plugin_packages) > 1:
+            with ThreadPoolExecutor() as executor:
+                prepared = [executor.submit(self._prepare_plugin_package, module_finder, modname) for module_finder, modname in plugin_packages]
+                for (module_finder, modname), preparation in zip(plugin_packages, prepared):
+                    self._load_plugin_package(module_finder, modname, preparation)
+        else:
+            for module_finder, modname in plugin_packages:
+                self._load_plugin_package(module_finder, modname)
+
+        if lazy_loading:
+            self._stepManifest().write()
+            logger.info(f'Deferred importing the plugins of {len(self._unloaded_steps)} steps until they are used.')
+        from mapclient.mountpoints.workflowstep import setWorkflowStepLoader
+        setWorkflowStepLoader(self.load_step if self._unloaded_steps else None)
 
         # installed = [pkg.key for pkg in pkg_resources.working_set]
         # print(installed)
 
+    def _plugin_dependencies(self, module_finder):
+        if is_frozen() and not isinstance(module_finder, importlib.machinery.FileFinder):
+            return []
+
+        return self.extractPluginDependencies(module_finder.path)
+
+    def _prepare_plugin_package(self, module_finder, modname):
+        """
+        Do the file system work of loading the given plugin package ahead of
+        importing it, on a worker thread: check its dependencies and read, or
+        compile, the bytecode of its modules.  Errors in the modules are left
+        for the import to report.
+        """
+        plugin_dependencies = self._plugin_dependencies(module_finder)
+        missing_dependencies = self._plugin_database.check_for_missing_dependencies(plugin_dependencies)
+        if isinstance(module_finder, importlib.machinery.FileFinder):
+            _read_package_code(os.path.join(module_finder.path, modname), PLUGINS_PACKAGE_NAME + '.' + modname)
+
+        return plugin_dependencies, missing_dependencies
+
+    def _load_plugin_package(self, module_finder, modname, preparation=None):
+        try:
+            if preparation is None:
+                plugin_dependencies = self._plugin_dependencies(module_finder)
+                missing_dependencies = self._plugin_database.check_for_missing_dependencies(plugin_dependencies)
+            else:
+                plugin_dependencies, missing_dependencies = preparation.result()
+            for dependency in missing_dependencies:
+                self.installPackage(dependency)
+
+            module = import_module(PLUGINS_PACKAGE_NAME + '.' + modname)
+            self._loaded_plugin_modules.append(module.__name__)
+            if hasattr(module, '__version__') and hasattr(module, '__author__'):
+                logger.info('Loaded plugin \'' + modname + '\' version [' + module.__version__ + '] by ' + module.__author__)
+            if hasattr(module, '__location__') and module.__location__:
+                logger.info('Plugin \'' + modname + '\' available from: ' + module.__location__)
+            else:
+                logger.info('Plugin \'' + modname + '\' has no location set.')
+
+            self._plugin_database.addLoadedPluginInformation(modname,
+                                                             module.__stepname__ if hasattr(module, '__stepname__') else 'None',
+                                                             module.__author__ if hasattr(module, '__author__') else 'Anon.',
+                                                             module.__version__ if hasattr(module, '__version__') else '0.0.0',
+                                                             module.__location__ if hasattr(module, '__location__') else '',
+                                                             plugin_dependencies)
+            return True
+        except Exception as e:
+            from mapclient.mountpoints.workflowstep import removeWorkflowStep
+            # Call remove partially loaded plugin manually method
+            removeWorkflowStep(modname)
+
+            if type(e) == ImportError:
+                self._import_errors += [modname]
+            elif type(e) == TypeError:
+                self._type_errors += [modname]
+            elif type(e) == SyntaxError:
+                self._syntax_errors += [modname]
+            elif type(e) == TabError:
+                self._tab_errors += [modname]
+
+            if is_frozen():
+                self._plugin_error_directories[modname] = '<frozen-directory>'
+                step_name = '<frozen-name>'
+            else:
+                self._plugin_error_directories[modname] = module_finder.path
+                step_file_dir = os.path.join(module_finder.path, modname, 'step.py')
+                class_name = determine_step_class_name(step_file_dir)
+                step_name = determine_step_name(step_file_dir, class_name)
+            self._plugin_error_names.append(step_name)
+
+            logger.warning('Plugin \'' + modname + '\' not loaded')
+            logger.warning('Reason: {0}'.format(e))
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            redirect_output = FileTypeObject()
+            traceback.print_exception(exc_type, exc_value, exc_traceback, file=redirect_output)
+            logger.warning(''.join(redirect_output.messages))
+
+        return False
+
+    def load_step(self, step_name):
+        """
+        Import the plugin providing the step with the given name, if its
+        import was deferred by loading the plugins lazily.  Returns True if
+        the plugin was imported.
+        """
+        if step_name not in self._unloaded_steps:
+            return False
+
+        module_finder, modname, _ = self._unloaded_steps.pop(step_name)
+        return self._load_plugin_package(module_finder, modname)
+
+    def unloaded_steps(self):
+        """
+        Return stand-ins for the steps whose plugins have not been imported.
+        """
+        return [UnloadedStep(information) for _, _, information in self._unloaded_steps.values()]
+
+    def set_parallel_loading_enabled(self, state=True):
+        self._parallel_loading_enabled = state
+
+    def parallel_loading_enabled(self):
+        return self._parallel_loading_enabled
+
+    def set_lazy_loading_enabled(self, state=True):
+        self._lazy_loading_enabled = state
+
+    def lazy_loading_enabled(self):
+        return self._lazy_loading_enabled
+
+    def loaded_plugin_modules(self):
+        return self._loaded_plugin_modules
+
+    def set_fork_server_enabled(self, state=True):
+        self._fork_server_enabled = state
+
+    def process_context(self):
+        """
+        Return the multiprocessing context to create step execution worker
+        processes with, or None to use the default.  In fork server mode the
+        workers are forked from a server process that has imported all the
+        loaded plugins, so each worker starts with the step registry already
+        populated without re-importing Qt or the plugins.  The server is
+        started on first use, plugins loaded after that are not available to
+        the workers.
+        """
+        if not self._fork_server_enabled:
+            return None
+
+        return fork_server_context(self._loaded_plugin_modules)
+
     def get_plugin_error_names(self):
         return self._plugin_error_names
 
@@ -345,6 +481,8 @@ class PluginManager:
         settings.beginGroup('Plugins')
         self._doNotShowPluginErrors = settings.value('donot_show_plugin_errors', 'true') == 'true'
         self._virtualenv_setup_attempted = settings.value('virtualenv_setup_attempted', 'false') == 'true'
+        self._lazy_loading_enabled = settings.value('lazy_loading', 'false') == 'true'
+        self._parallel_loading_enabled = settings.value('parallel_loading', 'false') == 'true'
         self._current_profile = settings.value(_get_app_profile_key(), CONST_DEFAULT_PROFILE)
         if settings_version == '0.0.0':
             directory_count = settings.beginReadArray('directories')
@@ -401,6 +539,8 @@ class PluginManager:
         settings.beginGroup('Plugins')
         settings.setValue('donot_show_plugin_errors', self._doNotShowPluginErrors)
         settings.setValue('virtualenv_setup_attempted', self._virtualenv_setup_attempted)
+        settings.setValue('lazy_loading', self._lazy_loading_enabled)
+        settings.setValue('parallel_loading', self._parallel_loading_enabled)
         settings.setValue(_get_app_profile_key(), self._current_profile)
         settings.beginWriteArray('profiles')
         profile_index = 0
@@ -444,6 +584,24 @@ class PluginManager:
         settings.endGroup()
 
 
+def _read_package_code(package_dir, package_name):
+    # Reading the code through the source loader writes the bytecode of
+    # modules that are not compiled yet, so the import only reads it.
+    for root, dirs, file_names in os.walk(package_dir):
+        if '__pycache__' in dirs:
+            dirs.remove('__pycache__')
+        for file_name in file_names:
+            if not file_name.endswith('.py'):
+                continue
+
+            relative_name = os.path.relpath(os.path.join(root, file_name[:-3]), package_dir).replace(os.sep, '.')
+            module_name = package_name if relative_name == '__init__' else package_name + '.' + relative_name.replace('.__init__', '')
+            try:
+                importlib.machinery.SourceFileLoader(module_name, os.path.join(root, file_name)).get_code(module_name)
+            except Exception as e:
+                logger.debug(f"Could not read the code of '{module_name}': {e}")
+
+
 def isMapClientPluginsDir(plugin_dir):
     result = False
     try:
@@ -600,13 +758,15 @@ class PluginDatabase:
 
         return missing_plugins
 
-    # Would it be worth using a dictionary instead of a list?
     def check_for_missing_dependencies(self, dependencies):
         """
         Takes a list of dependencies as input. Returns a list of all the dependencies that aren't already installed.
         If a dependency has a url supplied AND it isn't installed, add just the url to the missing_dependencies list.
         """
-        installed = [dist.name for dist in importlib.metadata.distributions()]
+        if not dependencies:
+            return []
+
+        installed = get_distribution_index().names()
         missing_dependencies = []
         for dependency in dependencies:
             if '@' in dependency:
@@ -616,10 +776,68 @@ class PluginDatabase:
             else:
                 dependency_name = dependency
 
-            if dependency_name.lower() not in installed:
+            if normalize_distribution_name(dependency_name) not in installed:
                 missing_dependencies.append(dependency)
 
         return missing_dependencies
 
     def getDatabase(self):
         return self._database
+
+
+def normalize_distribution_name(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+class DistributionIndex(object):
+    """
+    The normalised names of the installed distributions.  The index is built
+    on first use and rebuilt when it is invalidated, or when the modification
+    time of a directory on the module search path changes, as it does when a
+    distribution is installed into it.
+    """
+
+    def __init__(self):
+        self._names = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _search_path_signature():
+        signature = []
+        for path in sys.path:
+            try:
+                signature.append((path, os.stat(path or '.').st_mtime_ns))
+            except OSError:
+                signature.append((path, None))
+
+        return signature
+
+    def names(self):
+        with self._lock:
+            signature = self._search_path_signature()
+            if self._names is None or signature != self._signature:
+                self._names = {normalize_distribution_name(dist.name) for dist in importlib.metadata.distributions() if dist.name}
+                self._signature = signature
+
+            return self._names
+
+    def invalidate(self):
+        with self._lock:
+            # The import system keeps its own listing of each directory.
+            importlib.invalidate_caches()
+            self._names = None
+
+
+_distribution_index = DistributionIndex()
+
+
+def get_distribution_index():
+    return _distribution_index
+
+
+def _invalidate_distribution_index_when_finished(process):
+    # Read the output, so the process cannot block on a full pipe, and list
+    # the distributions again once it has installed the package.
+    process.communicate()
+    get_distribution_index().invalidate()
@@ -22,17 +22,14 @@ import logging
 
 from packaging import version
 
-from PySide6 import QtCore
-
 from mapclient.core.metrics import metrics_logger
 from mapclient.settings import info
 from mapclient.core.workflow.workflowscene import WorkflowScene, read_steps, load_from
-from mapclient.core.workflow.workflowsteps import WorkflowSteps, \
-    WorkflowStepsFilter
 from mapclient.core.workflow.workflowerror import WorkflowError
 from mapclient.core.workflow.workflowrdf import serializeWorkflowAnnotation
+from mapclient.core.geometry import rect
 from mapclient.settings.general import get_configuration_file, \
-    DISPLAY_FULL_PATH, get_configuration, is_workflow_in_use, mark_workflow_in_use, mark_workflow_ready_for_use
+    DISPLAY_FULL_PATH, get_configuration, is_workflow_in_use, mark_workflow_in_use, mark_workflow_ready_for_use, qt_application_exists
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +37,11 @@ _PREVIOUS_LOCATION_STRING = 'previousLocation'
 
 
 def _get_workflow_configuration(location):
+    if not qt_application_exists():
+        from mapclient.settings.inisettings import IniSettings
+        return IniSettings(_get_workflow_configuration_absolute_filename(location))
+
+    from PySide6 import QtCore
     return QtCore.QSettings(_get_workflow_configuration_absolute_filename(location), QtCore.QSettings.Format.IniFormat)
 
 
@@ -76,9 +78,10 @@ class WorkflowManager(object):
         self._title = None
 
         self._scene = WorkflowScene(self)
-        self._steps = WorkflowSteps(self)
-        self._filtered_steps = WorkflowStepsFilter()
-        self._filtered_steps.setSourceModel(self._steps)
+        # The step models are Qt item models, they are only created when the
+        # user interface asks for them.
+        self._steps = None
+        self._filtered_steps = None
 
     def title(self):
         self._title = info.APPLICATION_NAME
@@ -109,13 +112,28 @@ class WorkflowManager(object):
     def scene(self):
         return self._scene
 
+    def _create_step_models(self):
+        if self._steps is None:
+            from mapclient.core.workflow.workflowsteps import WorkflowSteps, WorkflowStepsFilter
+            self._steps = WorkflowSteps(self)
+            self._filtered_steps = WorkflowStepsFilter()
+            self._filtered_steps.setSourceModel(self._steps)
+
     def getStepModel(self):
+        self._create_step_models()
         return self._steps
 
     def getFilteredStepModel(self):
+        self._create_step_models()
         return self._filtered_steps
 
+    def unloadedSteps(self):
+        return self._parent.pluginManager().unloaded_steps()
+
     def updateAvailableSteps(self):
+        from PySide6 import QtCore
+
+        self._create_step_models()
         self._steps.reload()
         self._filtered_steps.sort(1, QtCore.Qt.SortOrder.AscendingOrder)
 
@@ -132,6 +150,20 @@ class WorkflowManager(object):
         metrics_logger.workflow_executed(self.title())
         self._scene.execute()
 
+    def create_scheduler(self, max_workers=1, use_processes=False):
+        """
+        Create a scheduler that can execute the steps of this workflow concurrently.
+        """
+        scheduler = self._scene.create_scheduler(max_workers, use_processes)
+        if use_processes:
+            scheduler.set_process_context(self._parent.pluginManager().process_context())
+
+        return scheduler
+
+    def execute_scheduled(self, scheduler):
+        metrics_logger.workflow_executed(self.title())
+        scheduler.execute()
+
     def abort_execution(self):
         self._scene.abort_execution()
 
@@ -238,12 +270,16 @@ class WorkflowManager(object):
 
         return is_workflow_in_use(location)
 
-    def load(self, location, scene_rect=QtCore.QRectF(0, 0, 640, 480)):
+    def load(self, location, scene_rect=None):
         """
         Open a workflow from the given location.
         :param location:
-        :param scene_rect: Rectangle of the scene rect to load the workflow into.
+        :param scene_rect: Rectangle of the scene rect to load the workflow into,
+        defaults to 640 by 480.
         """
+        if scene_rect is None:
+            scene_rect = rect(0, 0, 640, 480)
+
         if os.path.isfile(location):
             location = os.path.dirname(location)
 
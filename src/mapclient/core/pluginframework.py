@@ -21,8 +21,6 @@ import importlib
 import logging
 import os
 
-from PySide6.QtCore import QObject
-
 from mapclient.settings.definitions import MAIN_MODULE
 
 logger = logging.getLogger(__name__)
@@ -80,32 +78,84 @@ class MetaPluginMountPoint(type):
             # This branch only executes when processing the mount point itself.
             # So, since this is a new plugin type, not an implementation, this
             # class shouldn't be registered as a plugin. Instead, it sets up a
-            # list where plugins can be registered later.
+            # list where plugins can be registered later.  The names of the
+            # plugins are indexed as the plugins are instantiated.
             cls.plugins = []
+            cls.plugin_index = {}
+            cls.plugin_names = {}
         else:
             # This must be a plugin implementation, which should be registered.
             # Simply appending it to the list is all that's needed to keep
             # track of it later.
             cls.plugins.append(cls)
 
+    def _indexPlugin(self, plugin):
+        if type(plugin) not in self.plugin_names and hasattr(plugin, 'getName'):
+            name = plugin.getName()
+            self.plugin_names[type(plugin)] = name
+            self.plugin_index.setdefault(name, type(plugin))
+
+        return plugin
+
     def getPlugins(self, *args, **kwargs):
-        return [p(*args, **kwargs) for p in self.plugins]
+        return [self._indexPlugin(p(*args, **kwargs)) for p in self.plugins]
+
+    def getPlugin(self, name, *args, **kwargs):
+        """
+        Return an instance of the plugin with the given name, or None.  Only
+        the plugins that have not been instantiated before are instantiated
+        to find their names.
+        """
+        if name in self.plugin_index:
+            return self.plugin_index[name](*args, **kwargs)
+
+        for p in self.plugins:
+            if p not in self.plugin_names:
+                plugin = self._indexPlugin(p(*args, **kwargs))
+                if self.plugin_names.get(p) == name:
+                    return plugin
+
+        return None
+
+    def removePlugin(self, plugin_class):
+        self.plugins.remove(plugin_class)
+        name = self.plugin_names.pop(plugin_class, None)
+        if self.plugin_index.get(name) is plugin_class:
+            del self.plugin_index[name]
+            for p in self.plugins:
+                if self.plugin_names.get(p) == name:
+                    self.plugin_index[name] = p
+                    break
 
 
 # Plugin mount points are defined below.
 # For running in both python 2.x and python 3.x we must follow the example found
 # at http://mikewatkins.ca/2008/11/29/python-2-and-3-metaclasses/
-MetaQObject = type(QObject)
+def _create_meta_qobject_classes():
+    from PySide6.QtCore import QObject
+
+    MetaQObject = type(QObject)
+
+    # For multiple inheritance in classes we also need to create a metaclass that also
+    # inherits from the metaclasses of the inherited classes
+
+    class MetaQObjectPluginMountPoint(MetaQObject, MetaPluginMountPoint):
+
+        def __init__(self, name, bases, attrs):
+            MetaPluginMountPoint.__init__(self, name, bases, attrs)
+            MetaQObject.__init__(self, name, bases, attrs)
 
-# For multiple inheritance in classes we also need to create a metaclass that also
-# inherits from the metaclasses of the inherited classes
+    return {'MetaQObject': MetaQObject, 'MetaQObjectPluginMountPoint': MetaQObjectPluginMountPoint}
 
 
-class MetaQObjectPluginMountPoint(MetaQObject, MetaPluginMountPoint):
+def __getattr__(name):
+    # The Qt metaclasses are created on first use so that the plugin
+    # framework can be imported without importing Qt.
+    if name in ('MetaQObject', 'MetaQObjectPluginMountPoint'):
+        globals().update(_create_meta_qobject_classes())
+        return globals()[name]
 
-    def __init__(self, name, bases, attrs):
-        MetaPluginMountPoint.__init__(self, name, bases, attrs)
-        MetaQObject.__init__(self, name, bases, attrs)
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 #
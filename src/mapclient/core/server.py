@@ -0,0 +1,131 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                request = json.loads(line)
+            except json.decoder.JSONDecodeError as e:
+                response = {'status': 'error', 'message': f'Invalid request: {e}'}
+            else:
+                response = self.server.workflow_server.handle(request)
+
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _UnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class WorkflowServer(object):
+    """
+    Accepts workflow run requests, one JSON object per line, on a local UNIX
+    socket and replies to each with a JSON object on a single line.
+
+    A request of the form {"command": "run", "workflow": ..., ...} is passed
+    to the run callable, which is submitted to the given executor so the
+    executor's number of workers bounds the number of concurrent runs.  A
+    run of a workflow in place is rejected while another run of the same
+    workflow is in progress, runs that import settings are made on a copy
+    of the workflow so they are not.  The "ping" command reports the number
+    of runs executing or waiting to execute and "shutdown" stops the server.
+    """
+
+    def __init__(self, socket_file, run, executor):
+        self._socket_file = socket_file
+        self._run = run
+        self._executor = executor
+        self._pending = 0
+        self._running_workflows = set()
+        self._lock = threading.Lock()
+        self._server = None
+
+    def handle(self, request):
+        command = request.get('command', 'run')
+        if command == 'ping':
+            with self._lock:
+                return {'status': 'ok', 'pending': self._pending}
+        elif command == 'shutdown':
+            threading.Thread(target=self._server.shutdown).start()
+            return {'status': 'ok'}
+        elif command != 'run':
+            return {'status': 'error', 'message': f"Unknown command '{command}'."}
+
+        if request.get('workflow') is None:
+            return {'status': 'error', 'message': 'No workflow given.'}
+
+        workflow = os.path.abspath(request['workflow']) if request.get('import_settings') is None else None
+        with self._lock:
+            if workflow in self._running_workflows:
+                return {'status': 'error', 'message': f"Workflow '{workflow}' is already running."}
+            if workflow is not None:
+                self._running_workflows.add(workflow)
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._run, request)
+            return future.result()
+        except Exception as e:
+            logger.error(f"Run of workflow '{request['workflow']}' failed: {e}")
+            return {'status': 'failed', 'message': str(e)}
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._running_workflows.discard(workflow)
+
+    def serve_forever(self):
+        if os.path.exists(self._socket_file):
+            if _is_listening(self._socket_file):
+                raise RuntimeError(f"A server is already listening on '{self._socket_file}'.")
+            os.remove(self._socket_file)
+
+        self._server = _UnixStreamServer(self._socket_file, _RequestHandler)
+        self._server.workflow_server = self
+        logger.info(f"Listening for workflow runs on '{self._socket_file}'.")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(self._socket_file)
+
+
+def _is_listening(socket_file):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_file)
+        except OSError:
+            return False
+
+    return True
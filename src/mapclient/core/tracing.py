@@ -0,0 +1,127 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionTracer(object):
+    """
+    Records spans of workflow execution as Chrome trace events, these can be
+    viewed in chrome://tracing or the Perfetto UI.  Tracing is disabled until
+    enable is called, while disabled spans are not recorded.
+
+    Events recorded in a worker process are gathered with collect and added
+    to the tracer of the parent process with extend.
+    """
+
+    def __init__(self):
+        self._enabled = False
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self._enabled = True
+        self._events = []
+        self._thread_names = {}
+
+    def disable(self):
+        self._enabled = False
+
+    def is_enabled(self):
+        return self._enabled
+
+    @contextmanager
+    def span(self, name, category, **kwargs):
+        """
+        Record the enclosed block as a complete event with the given name and
+        category, any keyword arguments are added to the event arguments.
+        """
+        if not self._enabled:
+            yield
+            return
+
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            end = time.time_ns()
+            event = {
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': start / 1000,
+                'dur': (end - start) / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': kwargs,
+            }
+            with self._lock:
+                self._events.append(event)
+                self._thread_names[(event['pid'], event['tid'])] = threading.current_thread().name
+
+    def collect(self):
+        """
+        Remove and return the events recorded so far.
+        """
+        with self._lock:
+            events = self._events
+            self._events = []
+
+        return events
+
+    def extend(self, events):
+        if self._enabled and events:
+            with self._lock:
+                self._events.extend(events)
+
+    def _metadata_events(self):
+        events = []
+        pids = sorted({event['pid'] for event in self._events})
+        for pid in pids:
+            name = 'mapclient' if pid == os.getpid() else f'worker {pid}'
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}})
+
+        for (pid, tid), thread_name in sorted(self._thread_names.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+
+        return events
+
+    def write(self, file_name):
+        with self._lock:
+            events = self._metadata_events() + sorted(self._events, key=lambda e: e['ts'])
+
+        with open(file_name, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+        logger.info(f"Wrote execution trace to '{file_name}'.")
+
+
+execution_tracer = ExecutionTracer()
+
+
+def get_execution_tracer():
+    return execution_tracer
@@ -28,8 +28,7 @@ from pathlib import Path, PureWindowsPath, PurePath
 
 from subprocess import Popen, PIPE, DEVNULL, run, CalledProcessError
 
-import PySide6 as RefMod
-
+from mapclient.core.tracing import get_execution_tracer
 from mapclient.mountpoints.workflowstep import workflowStepFactory
 from mapclient.settings.definitions import APPLICATION_NAME, PLUGINS_PACKAGE_NAME
 from mapclient.settings.general import get_configuration_file
@@ -115,6 +114,20 @@ def is_frozen():
     return getattr(sys, 'frozen', False)
 
 
+def exit_process(code):
+    """
+    Exit the process with the given code without waiting for its threads to
+    finish, such as one executing a step that ignores being cancelled.  The
+    log handlers and the standard streams are flushed before exiting.
+    """
+    logging.shutdown()
+    for stream in [sys.stdout, sys.stderr]:
+        if stream is not None:
+            stream.flush()
+
+    os._exit(code)
+
+
 def is_mapping_tools():
     variant = get_map_client_variant()
     return variant == "mapping-tools"
@@ -392,6 +405,8 @@ def find_file(filename, search_path):
 
 
 def qt_tool_wrapper(qt_tool, args, external=False):
+    import PySide6 as RefMod
+
     pyside_dir = Path(RefMod.__file__).resolve().parent
     if external:
         exe = qt_tool
@@ -420,7 +435,8 @@ def create_configured_step(step_identifier, step_name, config, workflow_dir):
         return 1
 
     step._identifierOccursCount = _mock_identifier_occurs_count
-    step.deserialize(config)
+    with get_execution_tracer().span('deserialize', 'configuration', step=step_identifier):
+        step.deserialize(config)
 
     return step
 
@@ -0,0 +1,196 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+
+from filelock import FileLock
+
+from mapclient.core.workflow.workflowspill import port_data_digest
+
+logger = logging.getLogger(__name__)
+
+_INDEX_FILENAME = 'index.json'
+_OUTPUTS_SUFFIX = '.pickle'
+
+
+def plugin_version(step):
+    """
+    Return the version of the plugin package that provides the given step.
+    """
+    package = '.'.join(step.__class__.__module__.split('.')[:2])
+    module = sys.modules.get(package)
+    return getattr(module, '__version__', '0.0.0')
+
+
+def _hash_port_data(hasher, inputs):
+    for index, data in sorted(inputs, key=lambda item: item[0]):
+        hasher.update(str(index).encode())
+        hasher.update(port_data_digest(data).encode())
+
+
+class StepOutputCache(object):
+    """
+    A content addressed, size bounded, cache of the data provided by the ports
+    of executed steps.  Entries are keyed on the step name, the plugin version,
+    the serialized step configuration and the data delivered to the step.
+    When the cache grows beyond max_size bytes the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, directory, max_size):
+        self._directory = directory
+        self._max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _index_file(self):
+        return os.path.join(self._directory, _INDEX_FILENAME)
+
+    def _outputs_file(self, key):
+        return os.path.join(self._directory, key + _OUTPUTS_SUFFIX)
+
+    def _lock(self):
+        return FileLock(self._index_file() + '.lock')
+
+    def _read_index(self):
+        try:
+            with open(self._index_file()) as f:
+                return json.load(f)
+        except (IOError, json.decoder.JSONDecodeError):
+            return {}
+
+    def _write_index(self, index):
+        with open(self._index_file(), 'w') as f:
+            json.dump(index, f)
+
+    def key(self, step, inputs):
+        """
+        Return the cache key for executing the given step with the given
+        (port index, data) inputs.  Returns None if the inputs cannot be
+        hashed, in which case the step cannot be cached.
+        """
+        hasher = hashlib.sha256()
+        hasher.update(step.getName().encode())
+        hasher.update(plugin_version(step).encode())
+        hasher.update(step.serialize().encode())
+        try:
+            _hash_port_data(hasher, inputs)
+        except Exception as e:
+            logger.debug(f"Step '{step.getIdentifier()}' cannot be cached: {e}")
+            return None
+
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached outputs, a dict of port index to data, for the given
+        key or None if the key is not in the cache.
+        """
+        with self._lock():
+            index = self._read_index()
+            if key not in index:
+                return None
+
+            try:
+                with open(self._outputs_file(key), 'rb') as f:
+                    outputs = pickle.load(f)
+            except Exception:
+                del index[key]
+                self._write_index(index)
+                return None
+
+            index[key]['last_used'] = time.time()
+            self._write_index(index)
+
+        return outputs
+
+    def put(self, key, step_name, outputs):
+        """
+        Add the outputs for the given key to the cache, evicting the least
+        recently used entries to stay within the size limit.
+        """
+        try:
+            payload = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.debug(f"Outputs of step '{step_name}' cannot be cached: {e}")
+            return
+
+        if len(payload) > self._max_size:
+            logger.debug(f"Outputs of step '{step_name}' are larger than the cache.")
+            return
+
+        with self._lock():
+            with open(self._outputs_file(key), 'wb') as f:
+                f.write(payload)
+
+            index = self._read_index()
+            index[key] = {'step': step_name, 'size': len(payload), 'last_used': time.time()}
+            self._evict(index)
+            self._write_index(index)
+
+    def _evict(self, index):
+        total_size = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_used']):
+            if total_size <= self._max_size:
+                break
+
+            total_size -= index[key]['size']
+            del index[key]
+            try:
+                os.remove(self._outputs_file(key))
+            except OSError:
+                pass
+
+    def info(self):
+        """
+        Return a description of the current contents of the cache.
+        """
+        with self._lock():
+            index = self._read_index()
+
+        steps = {}
+        for entry in index.values():
+            steps[entry['step']] = steps.get(entry['step'], 0) + 1
+
+        return {
+            'directory': self._directory,
+            'entries': len(index),
+            'size': sum(entry['size'] for entry in index.values()),
+            'max_size': self._max_size,
+            'steps': steps,
+        }
+
+    def purge(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock():
+            for key in self._read_index():
+                try:
+                    os.remove(self._outputs_file(key))
+                except OSError:
+                    pass
+
+            self._write_index({})
@@ -0,0 +1,105 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+
+from mapclient.core.utils import stable_hash
+from mapclient.settings.info import DEFAULT_WORKFLOW_CHECKPOINT_DIRECTORY
+
+logger = logging.getLogger(__name__)
+
+_MANIFEST_FILENAME = 'manifest.json'
+
+
+class WorkflowCheckpoint(object):
+    """
+    Records the outputs of the completed steps of a workflow in the workflow
+    directory so that an interrupted run can be resumed.  A recorded step is
+    only restored if its configuration has not changed since it was recorded.
+    """
+
+    def __init__(self, location):
+        self._directory = os.path.join(location, DEFAULT_WORKFLOW_CHECKPOINT_DIRECTORY)
+
+    def _manifest_file(self):
+        return os.path.join(self._directory, _MANIFEST_FILENAME)
+
+    def _outputs_file(self, identifier):
+        return os.path.join(self._directory, identifier + '.pickle')
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_file()) as f:
+                return json.load(f)
+        except (IOError, json.decoder.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        temporary_file = self._manifest_file() + '.tmp'
+        with open(temporary_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temporary_file, self._manifest_file())
+
+    def clear(self):
+        """
+        Remove all recorded steps.
+        """
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def record(self, step, outputs):
+        """
+        Record the outputs, a dict of port index to data, of the given completed step.
+        """
+        identifier = step.getIdentifier()
+        try:
+            payload = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Could not checkpoint step '{identifier}': {e}")
+            return
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        with open(self._outputs_file(identifier), 'wb') as f:
+            f.write(payload)
+
+        manifest = self._read_manifest()
+        manifest[identifier] = {'name': step.getName(), 'configuration': stable_hash(step.serialize())}
+        self._write_manifest(manifest)
+
+    def outputs(self, step):
+        """
+        Return the recorded outputs for the given step, or None if the step
+        has not been recorded or its configuration has changed.
+        """
+        identifier = step.getIdentifier()
+        entry = self._read_manifest().get(identifier)
+        if entry is None or entry['configuration'] != stable_hash(step.serialize()):
+            return None
+
+        try:
+            with open(self._outputs_file(identifier), 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not restore step '{identifier}' from the checkpoint: {e}")
+            return None
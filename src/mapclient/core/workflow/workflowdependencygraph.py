@@ -22,6 +22,7 @@ import sys
 import traceback
 
 from mapclient.core.utils import convert_exception_to_message, FileTypeObject
+from mapclient.core.workflow.workflowcancellation import CancellationToken
 from mapclient.core.workflow.workflowerror import WorkflowError
 from mapclient.core.workflow.workflowitems import Connection, MetaStep
 from mapclient.core.metrics import get_metrics_logger
@@ -31,57 +32,48 @@ logger = logging.getLogger(__name__)
 metrics_logger = get_metrics_logger()
 
 
-def _node_is_destination(graph, node):
+def _in_degrees(graph, nodes):
     """
-    Determine whether the given node features
-    in a destination of another node.  Return True if
-    the node is a destination, False otherwise.
+    Determine the number of incoming connections for each of the
+    given nodes.
     """
-    for graph_node in graph:
-        if node in graph[graph_node]:
-            return True
+    in_degree = {node: 0 for node in nodes}
+    for destinations in graph.values():
+        for destination in destinations:
+            in_degree[destination] += 1
 
-    return False
+    return in_degree
 
 
-def _find_starting_set(graph, nodes):
+def _find_starting_set(in_degree, nodes):
     """
     Find the set of all nodes that are connected but are
     not destinations for any other node.
     """
-    starting_set = []
-    for node in nodes:
-        # Determine if node is a destination, if it is it is not a starting node
-        if not _node_is_destination(graph, node):
-            starting_set.append(node)
-
-    return starting_set
+    return [node for node in nodes if in_degree[node] == 0]
 
 
-def _determine_topological_order(graph, starting_set):
+def _determine_topological_order(graph, nodes):
     """
-    Determine the topological order of the graph.  Returns
-    an empty list if the graph contains a loop.
+    Determine the topological order of the graph using Kahn's algorithm.
+    Returns a tuple of the ordered nodes and the nodes that could not be
+    ordered.  If the graph contains a loop the nodes that are part of, or
+    downstream of, the loop are returned as the unordered nodes.
     """
-    temp_graph = graph.copy()
-    topologicalOrder = []
-    while len(starting_set) > 0:
+    in_degree = _in_degrees(graph, nodes)
+    starting_set = _find_starting_set(in_degree, nodes)
+    topological_order = []
+    while starting_set:
         node = starting_set.pop()
-        topologicalOrder.append(node)
-        if node in temp_graph:
-            for m in temp_graph[node][:]:
-                temp_graph[node].remove(m)
-                if len(temp_graph[node]) == 0:
-                    del temp_graph[node]
-                if not _node_is_destination(temp_graph, m):
-                    starting_set.append(m)
+        topological_order.append(node)
+        for destination in graph.get(node, []):
+            in_degree[destination] -= 1
+            if in_degree[destination] == 0:
+                starting_set.append(destination)
 
-    # If the graph is not empty we have detected a loop,
-    # or independent graphs.
-    if temp_graph:
-        return []
+    unordered_nodes = [node for node in nodes if in_degree[node] > 0]
 
-    return topologicalOrder
+    return topological_order, unordered_nodes
 
 
 def _reverse_dict_with_lists(in_dict):
@@ -94,43 +86,91 @@ def _reverse_dict_with_lists(in_dict):
     return reverseDictOut
 
 
+def execution_error(step_name, e):
+    """
+    Create a workflow error describing the exception currently being handled
+    that was raised while executing the named step.
+    """
+    log_message = 'Exception caught while executing the workflow: ' + convert_exception_to_message(e)
+    exc_type, exc_value, exc_traceback = sys.exc_info()
+    redirect_output = FileTypeObject()
+    traceback.print_exception(exc_type, exc_value, exc_traceback, file=redirect_output)
+    metrics_logger.error_occurred(step_name, str(exc_type))
+    return WorkflowError(log_message + '\n\n' + ''.join(redirect_output.messages))
+
+
+def _determine_weakly_connected_components(graph, nodes):
+    """
+    Return the nodes of each weakly connected component of the graph, in
+    the order the nodes are given.
+    """
+    parents = {node: node for node in nodes}
+
+    def find(node):
+        while parents[node] is not node:
+            parents[node] = parents[parents[node]]
+            node = parents[node]
+        return node
+
+    for source, destinations in graph.items():
+        for destination in destinations:
+            root_source, root_destination = find(source), find(destination)
+            if root_source is not root_destination:
+                parents[root_destination] = root_source
+
+    components = {}
+    for node in nodes:
+        components.setdefault(find(node), []).append(node)
+
+    return list(components.values())
+
+
+def _describe_nodes(nodes):
+    return ', '.join(f"'{node.getIdentifier()}'" for node in nodes)
+
+
 class WorkflowDependencyGraph(object):
 
     def __init__(self, scene):
         self._scene = scene
         self._reverse_dependency_graph = {}
         self._topological_order = []
+        self._unordered_nodes = []
+        self._unconnected_nodes = []
+        self._subgraphs = []
         self._current = -1
         self._direction = 1
         self._finished_callback = None
         self._execute_status_message = "No status reported."
+        # The nodes that have been executed and whose outputs are still valid.
+        self._clean = set()
+        # The input port data each clean node was executed with.
+        self._retained_inputs = {}
+        # The nodes whose steps waited for the user before finishing.
+        self._interactive = set()
+        # The nodes revisited since they were last executed.
+        self._revisited = set()
+        self._cancellation_token = None
 
-    def _find_all_connected_nodes(self):
+    def _calculate_dependency_graph(self):
         """
-        Return a list of all the nodes that have a connection.
+        Return the adjacency graph of the connected nodes, the port level
+        description of the connections, and the list of all nodes that
+        have a connection in the order they were first encountered.
         """
-        nodes = []
-        for item in list(self._scene.items()):
-            if item.Type == Connection.Type:
-                if item.source() not in nodes:
-                    nodes.append(item.source())
-                if item.destination() not in nodes:
-                    nodes.append(item.destination())
-
-        return nodes
-
-    def _calculate_dependency_graph(self):
         graph = {}
         graph_ports = []
+        nodes = {}
         for item in self._scene.items():
             if item.Type == Connection.Type:
-                graph[item.source()] = graph.get(item.source(), [])
-                graph[item.source()].append(item.destination())
+                graph.setdefault(item.source(), []).append(item.destination())
                 graph_ports.append(
                     {'from': item.source(), 'from_port': item.sourceIndex(),
                      'to': item.destination(), 'to_port': item.destinationIndex()}
                 )
-        return graph, graph_ports
+                nodes[item.source()] = None
+                nodes[item.destination()] = None
+        return graph, graph_ports, list(nodes)
 
     def _solo_node(self):
         scene_items = list(self._scene.items())
@@ -141,15 +181,6 @@ class WorkflowDependencyGraph(object):
 
         return None
 
-    def _connections_for_nodes(self, source, destination):
-        connections = []
-        for item in list(self._scene.items()):
-            if item.Type == Connection.Type:
-                if item.source() == source and item.destination() == destination:
-                    connections.append(item)
-
-        return connections
-
     def set_finished_callback(self, callback):
         self._finished_callback = callback
 
@@ -157,22 +188,25 @@ class WorkflowDependencyGraph(object):
         return self._execute_status_message
 
     def graph(self):
-        dependency_graph, graph_ports = self._calculate_dependency_graph()
+        dependency_graph, graph_ports, _ = self._calculate_dependency_graph()
         return dependency_graph, graph_ports, _reverse_dict_with_lists(dependency_graph)
 
     def _determine_graph(self):
-        dependency_graph, _ = self._calculate_dependency_graph()
+        dependency_graph, _, nodes = self._calculate_dependency_graph()
         self._reverse_dependency_graph = _reverse_dict_with_lists(dependency_graph)
-        # Find all connected nodes in the graph
-        nodes = self._find_all_connected_nodes()
-        # Find starting point set, uses helper graph
-        starting_set = _find_starting_set(dependency_graph, nodes)
+        self._topological_order, self._unordered_nodes = _determine_topological_order(dependency_graph, nodes)
+        if self._unordered_nodes:
+            self._topological_order = []
 
-        self._topological_order = _determine_topological_order(dependency_graph, starting_set)
+        connected_nodes = set(nodes)
+        self._subgraphs = _determine_weakly_connected_components(dependency_graph, nodes)
+        self._unconnected_nodes = [item for item in self._scene.items()
+                                   if item.Type == MetaStep.Type and item not in connected_nodes]
 
         solo_node = self._solo_node()
         if solo_node:
             self._topological_order = [solo_node]
+            self._unconnected_nodes = []
 
     def can_execute(self):
         self._determine_graph()
@@ -186,26 +220,146 @@ class WorkflowDependencyGraph(object):
             self._execute_status_message = "No steps in workflow."
             return 2
         elif items_count > 1 and len(self._topological_order) == 0 and len(self._reverse_dependency_graph.keys()) == 0:
-            self._execute_status_message = "Multiple steps but no connections to create workflow."
+            self._execute_status_message = "Multiple steps but no connections to create workflow, " \
+                                           f"unconnected steps: {_describe_nodes(self._unconnected_nodes)}."
             return 3
         elif self._current != -1:
             self._execute_status_message = "Already executing."
             return 4
-        elif items_count > 1 and len(self._topological_order) == 0:
-            self._execute_status_message = "Multiple steps but no connections to create workflow 2."
+        elif items_count > 1 and len(self._unordered_nodes) > 0:
+            self._execute_status_message = "Workflow contains a loop, " \
+                                           f"steps in or after the loop: {_describe_nodes(self._unordered_nodes)}."
             return 5
 
+        if self._unconnected_nodes:
+            logger.warning(f"Steps not connected to the workflow will not be executed: {_describe_nodes(self._unconnected_nodes)}.")
+        if len(self._subgraphs) > 1:
+            subgraphs = '; '.join(f'[{_describe_nodes(subgraph)}]' for subgraph in self._subgraphs)
+            logger.warning(f"The workflow is made of {len(self._subgraphs)} disconnected subgraphs: {subgraphs}.")
+
         self._execute_status_message = "Can execute."
         return 0
 
+    def topological_order(self):
+        return self._topological_order
+
+    def dependencies(self, node):
+        """
+        Return the nodes that the given node takes input from.
+        """
+        return self._reverse_dependency_graph.get(node, [])
+
+    def input_connections(self, node):
+        """
+        Return the connections that deliver data into the given node.
+        """
+        return self._scene.incoming_connections(node)
+
+    def unordered_nodes(self):
+        """
+        Return the nodes that could not be placed in the topological order
+        because they are part of, or downstream of, a loop.
+        """
+        return self._unordered_nodes
+
+    def unconnected_nodes(self):
+        """
+        Return the steps that are not connected to the rest of the workflow.
+        """
+        return self._unconnected_nodes
+
+    def disconnected_subgraphs(self):
+        """
+        Return the nodes of each of the connected parts of the workflow, if
+        the connected steps do not form a single graph, otherwise an empty
+        list.
+        """
+        return self._subgraphs if len(self._subgraphs) > 1 else []
+
+    def _downstream(self, nodes):
+        """
+        Return the given nodes and every node that depends on them, directly
+        or indirectly.
+        """
+        dependency_graph, _, _ = self._calculate_dependency_graph()
+        downstream = set()
+        pending = list(nodes)
+        while pending:
+            node = pending.pop()
+            if node not in downstream:
+                downstream.add(node)
+                pending.extend(dependency_graph.get(node, []))
+
+        return downstream
+
+    def mark_dirty(self, node):
+        """
+        Mark the given node, and every node downstream of it, as needing to be
+        executed again.  Clean nodes are skipped by execute, the data retained
+        by their steps is passed on instead.
+        """
+        if self._clean:
+            dirty = self._downstream([node])
+            self._clean -= dirty
+            for dirty_node in dirty:
+                self._retained_inputs.pop(dirty_node, None)
+
+    def mark_all_dirty(self):
+        self._clean.clear()
+        self._retained_inputs.clear()
+        self._interactive.clear()
+        self._revisited.clear()
+
+    def is_dirty(self, node):
+        return node not in self._clean
+
+    def dirty_nodes(self):
+        """
+        Return the nodes, in topological order, that will be executed by the
+        next run of the workflow.
+        """
+        return [node for node in self._topological_order if node not in self._clean]
+
     def abort(self):
         self._current = -1
+        if self._cancellation_token is not None:
+            self._cancellation_token.cancel()
 
     def set_direction(self, direction):
         self._direction = 1 if direction else -1
 
+    def _begin_execution(self):
+        # The user may have changed a revisited step, so it is executed again.
+        for node in self._revisited:
+            self.mark_dirty(node)
+        self._revisited.clear()
+        if not self.dirty_nodes():
+            # Nothing has changed since the last run, execute everything again.
+            self.mark_all_dirty()
+
+        reused = len(self._topological_order) - len(self.dirty_nodes())
+        if reused:
+            logger.info(f"Reusing the outputs of {reused} unchanged step(s).")
+
     def execute(self):
+        if self._current == -1:
+            if self._direction == 1:
+                self._begin_execution()
+        else:
+            # The step of the current node has finished executing.
+            self._clean.add(self._topological_order[self._current])
+
         self._current += self._direction
+        if self._direction == 1:
+            while self._current < len(self._topological_order) and self._topological_order[self._current] in self._clean:
+                self._current += 1
+        else:
+            # Step back over the non-interactive steps without executing them.
+            while self._current >= 0 and self._can_restore(self._topological_order[self._current]) \
+                    and self._topological_order[self._current] not in self._interactive:
+                self._restore(self._topological_order[self._current])
+                self._current -= 1
+
         if self._current >= len(self._topological_order):
             self._current = -1
             if callable(self._finished_callback):
@@ -213,43 +367,68 @@ class WorkflowDependencyGraph(object):
         elif self._current == -1:
             if callable(self._finished_callback):
                 self._finished_callback(False)
+        elif self._direction == -1 and self._can_restore(self._topological_order[self._current]):
+            current_node = self._topological_order[self._current]
+            inputs = self._retained_inputs[current_node]
+            self._restore(current_node)
+            # The user may change the outputs of the step when revisiting it.
+            self.mark_dirty(current_node)
+            self._retained_inputs[current_node] = inputs
+            self._revisited.add(current_node)
+            self._run(current_node, current_node.getStep().revisit)
         else:
             # Form input requirements
             current_node = self._topological_order[self._current]
-            if current_node in self._reverse_dependency_graph:
-                connections = []
-                for node in self._reverse_dependency_graph[current_node]:
-                    # Find connection information and extract outputs from steps
-                    new_connections = self._connections_for_nodes(node, current_node)
-                    connections.extend([c for c in new_connections if c not in connections])
-                    if len(new_connections) == 0:
-                        logger.critical('Connection in workflow not found, something has gone horribly wrong')
-                        raise WorkflowError('Connection in workflow not found, something has gone horribly wrong')
-
-                for connection in connections:
-                    # Alternative indexing based on index of port based on type.
-                    # But don't use this as it is not what is documented.
-                    # source_step = connection.source()._step
-                    # destination_step = current_node._step
-                    # source_ports = [port for port in source_step._ports if port.hasProvides()]
-                    # destination_ports = [port for port in destination_step._ports if port.hasUses()]
-                    # source_data_index = source_ports.index(source_step._ports[connection.sourceIndex()])
-                    # destination_data_index = destination_ports.index(destination_step._ports[connection.destinationIndex()])
-
-                    # dataIn = source_step.getPortData(source_data_index)
-                    # destination_step.setPortData(destination_data_index, dataIn)
-
-                    dataIn = connection.source().getStep().getPortData(connection.sourceIndex())
-                    current_node.getStep().setPortData(connection.destinationIndex(), dataIn)
-
-            try:
-                current_node.getStep().execute()
-                metrics_logger.plugin_executed(current_node.getStep().getName())
-            except Exception as e:
-                self._current = -1
-                log_message = 'Exception caught while executing the workflow: ' + convert_exception_to_message(e)
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                redirect_output = FileTypeObject()
-                traceback.print_exception(exc_type, exc_value, exc_traceback, file=redirect_output)
-                metrics_logger.error_occurred(current_node.getStep().getName(), str(exc_type))
-                raise WorkflowError(log_message + '\n\n' + ''.join(redirect_output.messages))
+            inputs = {}
+            for connection in self.input_connections(current_node):
+                # Alternative indexing based on index of port based on type.
+                # But don't use this as it is not what is documented.
+                # source_step = connection.source()._step
+                # destination_step = current_node._step
+                # source_ports = [port for port in source_step._ports if port.hasProvides()]
+                # destination_ports = [port for port in destination_step._ports if port.hasUses()]
+                # source_data_index = source_ports.index(source_step._ports[connection.sourceIndex()])
+                # destination_data_index = destination_ports.index(destination_step._ports[connection.destinationIndex()])
+
+                # dataIn = source_step.getPortData(source_data_index)
+                # destination_step.setPortData(destination_data_index, dataIn)
+
+                dataIn = connection.source().getStep().getPortData(connection.sourceIndex())
+                current_node.getStep().setPortData(connection.destinationIndex(), dataIn)
+                inputs[connection.destinationIndex()] = dataIn
+
+            # The outputs of everything downstream of this node are going to change.
+            self.mark_dirty(current_node)
+            self._retained_inputs[current_node] = inputs
+            self._revisited.discard(current_node)
+            self._run(current_node, current_node.getStep().execute)
+            metrics_logger.plugin_executed(current_node.getStep().getName())
+
+    def _can_restore(self, node):
+        return node in self._clean and node in self._retained_inputs
+
+    def _restore(self, node):
+        """
+        Restore the step of the given clean node to the state it finished
+        executing in, by giving it back the input port data it was executed
+        with.  The step itself still holds its output port data.
+        """
+        step = node.getStep()
+        for index, data in self._retained_inputs[node].items():
+            step.setPortData(index, data)
+
+    def _run(self, node, method):
+        self._cancellation_token = CancellationToken()
+        node.getStep().setCancellationToken(self._cancellation_token)
+        try:
+            method()
+        except Exception as e:
+            self._current = -1
+            raise execution_error(node.getStep().getName(), e)
+
+        # A step that has not reported that it is done by the time it returns
+        # is waiting for the user.
+        if node in self._clean:
+            self._interactive.discard(node)
+        else:
+            self._interactive.add(node)
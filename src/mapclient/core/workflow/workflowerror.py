@@ -22,3 +22,7 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
 class WorkflowError(Exception):
     pass
 
+
+
+class WorkflowTimeoutError(WorkflowError):
+    pass
@@ -19,7 +19,7 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
 """
 import uuid
 
-from PySide6 import QtCore
+from mapclient.core.geometry import point
 
 
 class Item:
@@ -40,9 +40,10 @@ class MetaStep(Item):
     def __init__(self, step):
         Item.__init__(self)
         self._step = step
-        self._pos = QtCore.QPointF(10, 10)
+        self._pos = point(10, 10)
         self._uid = str(uuid.uuid1())
         self._id = step.getIdentifier()
+        self._timeout = None
 
     def getPos(self):
         return self._pos
@@ -53,6 +54,16 @@ class MetaStep(Item):
     def getStep(self):
         return self._step
 
+    def getTimeout(self):
+        """
+        Return the wall clock time, in seconds, the step may execute for, or
+        None to use the timeout of the workflow.
+        """
+        return self._timeout
+
+    def setTimeout(self, timeout):
+        self._timeout = timeout
+
     def getName(self):
         return self._step.getName()
 
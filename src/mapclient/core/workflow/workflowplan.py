@@ -0,0 +1,167 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+    
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import logging
+import os
+
+from mapclient.core.workflow.workflowprofiler import format_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def read_profile(file_name):
+    """
+    Read the step records of a profile written by WorkflowProfiler.write,
+    returns a dict of the records of the executed steps by step identifier.
+    An empty dict is returned if there is no usable profile.
+    """
+    if not os.path.isfile(file_name):
+        return {}
+
+    try:
+        with open(file_name) as f:
+            steps = json.load(f)['steps']
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not read the profile '{file_name}': {e}")
+        return {}
+
+    return {record['identifier']: record for record in steps if record.get('status') == 'executed'}
+
+
+class WorkflowPlan(object):
+    """
+    Describes how a workflow would be executed without executing it: the
+    order of the steps, the stages of steps that can run at the same time,
+    and the critical path.  Where a profile of a previous run has a record
+    for a step its duration and memory use are estimated from it.  The
+    dependency graph must have been determined with a successful call to
+    can_execute beforehand.
+    """
+
+    def __init__(self, dependency_graph, profile=None):
+        self._dependency_graph = dependency_graph
+        self._profile = profile or {}
+        self._order = dependency_graph.topological_order()
+
+    def order(self):
+        return self._order
+
+    def estimate(self, node):
+        """
+        Return the record of the given node from the profile, or None.
+        """
+        return self._profile.get(node.getIdentifier())
+
+    def _duration(self, node):
+        record = self.estimate(node)
+        return record.get('wall_time', 0.0) if record else 0.0
+
+    def stages(self):
+        """
+        Return the nodes grouped into stages, the nodes of a stage only depend
+        on nodes in earlier stages so they can be executed at the same time.
+        """
+        level = {}
+        for node in self._order:
+            level[node] = max((level[source] + 1 for source in self._dependency_graph.dependencies(node)), default=0)
+
+        stages = [[] for _ in range(max(level.values(), default=-1) + 1)]
+        for node in self._order:
+            stages[level[node]].append(node)
+
+        return stages
+
+    def critical_path(self):
+        """
+        Return the chain of dependent nodes with the longest estimated
+        duration, or with the most steps if there are no estimates, and its
+        estimated duration.
+        """
+        has_estimates = any(self.estimate(node) for node in self._order)
+        finish = {}
+        previous = {}
+        for node in self._order:
+            sources = self._dependency_graph.dependencies(node)
+            source = max(sources, key=lambda s: finish[s], default=None)
+            previous[node] = source
+            weight = self._duration(node) if has_estimates else 1
+            finish[node] = (finish[source] if source is not None else 0) + weight
+
+        if not finish:
+            return [], 0.0
+
+        node = max(self._order, key=lambda n: finish[n])
+        path = []
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+
+        return path, sum(self._duration(node) for node in path)
+
+    def estimated_duration(self, jobs=1):
+        """
+        Return the estimated duration of executing the workflow with the given
+        number of jobs, assuming each step takes as long as it did in the
+        profile and is started as soon as its dependencies and a job are free.
+        """
+        finish = {}
+        workers = [0.0] * max(1, jobs)
+        for node in self._order:
+            ready = max((finish[source] for source in self._dependency_graph.dependencies(node)), default=0.0)
+            worker = min(range(len(workers)), key=lambda i: workers[i])
+            start = max(ready, workers[worker])
+            finish[node] = workers[worker] = start + self._duration(node)
+
+        return max(finish.values(), default=0.0)
+
+    def lines(self, jobs=1):
+        """
+        Return the plan as lines of text.
+        """
+        lines = ['Execution order:']
+        header = f"  {'#':>3} {'Step':<30} {'Name':<30} {'Stage':>5} {'Est. (s)':>10} {'Peak RSS (MB)':>14}"
+        lines.extend([header, '  ' + '-' * (len(header) - 2)])
+        stage_of = {node: index for index, stage in enumerate(self.stages()) for node in stage}
+        for index, node in enumerate(self._order):
+            record = self.estimate(node)
+            duration = f"{record.get('wall_time', 0.0):>10.3f}" if record else f"{'-':>10}"
+            peak = format_bytes(record.get('peak_rss_delta')) if record else '-'
+            lines.append(f"  {index + 1:>3} {node.getIdentifier()[:30]:<30} {node.getName()[:30]:<30} "
+                         f"{stage_of[node] + 1:>5} {duration} {peak:>14}")
+
+        lines.append('Stages:')
+        for index, stage in enumerate(self.stages()):
+            lines.append(f"  {index + 1}: {', '.join(node.getIdentifier() for node in stage)}")
+
+        path, path_duration = self.critical_path()
+        lines.append(f"Critical path: {' -> '.join(node.getIdentifier() for node in path)}")
+
+        missing = [node.getIdentifier() for node in self._order if self.estimate(node) is None]
+        if len(missing) == len(self._order):
+            lines.append('No profile of a previous run, durations are not estimated.')
+        else:
+            lines.append(f"Estimated duration: {self.estimated_duration(1):.3f} s serially, "
+                         f"{self.estimated_duration(jobs):.3f} s with {jobs} job(s), "
+                         f"critical path {path_duration:.3f} s.")
+            if missing:
+                lines.append(f"Steps not in the profile, not included in the estimates: {', '.join(missing)}.")
+
+        return lines
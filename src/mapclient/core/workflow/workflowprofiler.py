@@ -0,0 +1,149 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+
+from mapclient.core.workflow.workflowspill import SpilledPortData, payload_size
+
+# Seconds between the samples of the resident set size taken while a step runs.
+_SAMPLE_INTERVAL = 0.005
+
+
+class _PeakRssSampler(object):
+    """
+    Samples the resident set size of the process on a thread to find its
+    peak over a period.  The peak the operating system records is the peak
+    over the lifetime of the process, so it does not show the peak of a step
+    that uses less memory than an earlier one.
+    """
+
+    def __init__(self, process):
+        self._process = process
+        self._peak = process.memory_info().rss
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stopped.wait(_SAMPLE_INTERVAL):
+            self._peak = max(self._peak, self._process.memory_info().rss)
+
+    def stop(self):
+        """
+        Stop sampling and return the peak resident set size sampled.
+        """
+        self._stopped.set()
+        self._thread.join()
+        return max(self._peak, self._process.memory_info().rss)
+
+
+@contextmanager
+def measure(record):
+    """
+    Measure the wall time, CPU time of the current thread, the change in
+    resident set size and the peak resident set size above that at the
+    start of the enclosed block into the given dict.
+    """
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    sampler = _PeakRssSampler(process)
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = time.perf_counter() - wall_start
+        record['cpu_time'] = time.thread_time() - cpu_start
+        record['peak_rss_delta'] = sampler.stop() - rss_start
+        record['rss_delta'] = process.memory_info().rss - rss_start
+
+
+def port_data_size(data):
+    if isinstance(data, SpilledPortData):
+        return data.size()
+
+    return payload_size(data)
+
+
+def format_bytes(value):
+    """
+    Return a number of bytes in MiB for a report, or '-' if it is not known.
+    """
+    if value is None:
+        return '-'
+
+    return f'{value / (1024 * 1024):.1f}'
+
+
+class WorkflowProfiler(object):
+    """
+    Collects the timing and memory profile of each step executed in a workflow.
+    The memory measurements are for the whole process, when steps are run
+    concurrently on threads they include the usage of the other running steps.
+    """
+
+    def __init__(self):
+        self._records = {}
+
+    def started(self, node, inputs):
+        self._records[node.getIdentifier()] = {
+            'identifier': node.getIdentifier(),
+            'name': node.getName(),
+            'status': 'executed',
+            'input_size': sum(port_data_size(data) for _, data in inputs),
+        }
+
+    def skipped(self, node, status):
+        self._records[node.getIdentifier()] = {
+            'identifier': node.getIdentifier(),
+            'name': node.getName(),
+            'status': status,
+        }
+
+    def completed(self, node, measurements, outputs):
+        record = self._records[node.getIdentifier()]
+        record.update(measurements)
+        record['output_size'] = sum(port_data_size(data) for data in outputs)
+
+    def records(self):
+        return list(self._records.values())
+
+    def table(self):
+        """
+        Return the profile as lines of a table sorted by the wall time of the steps.
+        """
+        header = f"{'Step':<30} {'Status':<10} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak RSS (MB)':>14} {'In (MB)':>10} {'Out (MB)':>10}"
+        lines = [header, '-' * len(header)]
+        for record in sorted(self._records.values(), key=lambda r: r.get('wall_time', 0.0), reverse=True):
+            lines.append(f"{record['identifier'][:30]:<30} {record['status']:<10} "
+                         f"{record.get('wall_time', 0.0):>10.3f} {record.get('cpu_time', 0.0):>10.3f} "
+                         f"{format_bytes(record.get('peak_rss_delta')):>14} "
+                         f"{format_bytes(record.get('input_size')):>10} {format_bytes(record.get('output_size')):>10}")
+
+        return lines
+
+    def write(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump({'created': time.time(), 'steps': self.records()}, f, indent=2)
+
@@ -19,15 +19,19 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
 """
 import uuid
 
-from PySide6 import QtCore
-
+from mapclient.core.geometry import point, rect
+from mapclient.core.tracing import get_execution_tracer
 from mapclient.core.workflow.workflowdependencygraph import WorkflowDependencyGraph
 from mapclient.core.workflow.workflowerror import WorkflowError
 from mapclient.core.workflow.workflowitems import MetaStep, Connection
+from mapclient.core.workflow.workflowplan import WorkflowPlan
+from mapclient.core.workflow.workflowscheduler import WorkflowScheduler
 from mapclient.mountpoints.workflowstep import workflowStepFactory
 from mapclient.core.utils import load_configuration
 from mapclient.settings.general import get_configuration_file
 
+execution_tracer = get_execution_tracer()
+
 
 def determine_connections(ws, i):
     connections = []
@@ -44,6 +48,14 @@ def determine_connections(ws, i):
     return connections
 
 
+def _read_timeout(ws, key):
+    value = ws.value(key)
+    if value is None or value == '':
+        return None
+
+    return float(value)
+
+
 def _read_step_names(ws):
     ws.beginGroup('nodes')
     node_count = ws.beginReadArray('nodelist')
@@ -111,7 +123,8 @@ def load_from(wf, location):
             return 1
 
         step._identifierOccursCount = _mock_identifier_occurs_count
-        step.deserialize(configuration)
+        with execution_tracer.span('deserialize', 'configuration', step=identifier):
+            step.deserialize(configuration)
         steps.append(step)
 
     wf.endArray()
@@ -141,7 +154,7 @@ def create_from(wf, name_identifiers, connections, location):
             step = workflowStepFactory(name_identifier[0], location)
             step.setIdentifier(name_identifier[1])
             meta_step = MetaStep(step)
-            meta_step.setPos(QtCore.QPointF(10 + i * 60, 10 + i * 60))
+            meta_step.setPos(point(10 + i * 60, 10 + i * 60))
             wf.setValue('name', step.getName())
             wf.setValue('position', meta_step.getPos())
             wf.setValue('selected', meta_step.is_selected())
@@ -180,10 +193,33 @@ class WorkflowScene(object):
         self._manager = manager
         self._location = ''
         self._items = {}
+        self._incoming_connections = {}
         self._dependency_graph = WorkflowDependencyGraph(self)
         self._main_window = None
-        self._default_view_rect = QtCore.QRectF(0, 0, 1024, 880)
+        self._default_view_rect = rect(0, 0, 1024, 880)
         self._view_parameters = None
+        self._step_timeout = None
+        self._run_timeout = None
+
+    def step_timeout(self):
+        """
+        Return the wall clock time, in seconds, each step may execute for
+        unless the step has its own timeout, or None for no limit.
+        """
+        return self._step_timeout
+
+    def set_step_timeout(self, timeout):
+        self._step_timeout = timeout
+
+    def run_timeout(self):
+        """
+        Return the wall clock time, in seconds, the whole workflow may execute
+        for, or None for no limit.
+        """
+        return self._run_timeout
+
+    def set_run_timeout(self, timeout):
+        self._run_timeout = timeout
 
     def getViewParameters(self):
         return self._view_parameters
@@ -230,6 +266,14 @@ class WorkflowScene(object):
             ws.setValue(key, self._view_parameters[key])
         ws.endGroup()
 
+        ws.remove('execution')
+        ws.beginGroup('execution')
+        if self._step_timeout is not None:
+            ws.setValue('step_timeout', self._step_timeout)
+        if self._run_timeout is not None:
+            ws.setValue('run_timeout', self._run_timeout)
+        ws.endGroup()
+
         ws.remove('nodes')
         ws.beginGroup('nodes')
         ws.beginWriteArray('nodelist')
@@ -254,6 +298,8 @@ class WorkflowScene(object):
             ws.setValue('selected', metastep.is_selected())
             ws.setValue('identifier', identifier)
             ws.setValue('unique_identifier', metastep.getUniqueIdentifier())
+            if metastep.getTimeout() is not None:
+                ws.setValue('timeout', metastep.getTimeout())
             ws.beginWriteArray('connections')
             connectionIndex = 0
             if metastep in connectionMap:
@@ -325,6 +371,11 @@ class WorkflowScene(object):
         }
         ws.endGroup()
 
+        ws.beginGroup('execution')
+        self._step_timeout = _read_timeout(ws, 'step_timeout')
+        self._run_timeout = _read_timeout(ws, 'run_timeout')
+        ws.endGroup()
+
         # Scale the WorkflowScene view-parameters:
         current_rect = scene_rect
         loaded_rect = loaded_view_parameters['rect']
@@ -362,13 +413,15 @@ class WorkflowScene(object):
             metastep.setUniqueIdentifier(uniqueIdentifier)
             metastep.setPos(position)
             metastep.setSelected(selected)
+            metastep.setTimeout(_read_timeout(ws, 'timeout'))
             metaStepList.append(metastep)
             self.addItem(metastep)
 
             # Deserialize after adding the step to the scene, this is so
             # we can validate the step identifier
             configuration = load_configuration(self._location, identifier)
-            step.deserialize(configuration)
+            with execution_tracer.span('deserialize', 'configuration', step=identifier):
+                step.deserialize(configuration)
             connections.extend(determine_connections(ws, i))
         ws.endArray()
         ws.endGroup()
@@ -394,6 +447,25 @@ class WorkflowScene(object):
     def execute(self):
         self._dependency_graph.execute()
 
+    def mark_dirty(self, meta_step):
+        """
+        Mark the given step, and every step downstream of it, as needing to be
+        executed again, for example because its configuration has changed.
+        """
+        self._dependency_graph.mark_dirty(meta_step)
+
+    def is_dirty(self, meta_step):
+        return self._dependency_graph.is_dirty(meta_step)
+
+    def create_scheduler(self, max_workers=1, use_processes=False):
+        scheduler = WorkflowScheduler(self._dependency_graph, max_workers, use_processes)
+        scheduler.set_timeouts(self._step_timeout, self._run_timeout)
+
+        return scheduler
+
+    def create_plan(self, profile=None):
+        return WorkflowPlan(self._dependency_graph, profile)
+
     def abort_execution(self):
         self._dependency_graph.abort()
 
@@ -408,8 +480,23 @@ class WorkflowScene(object):
             if item.Type == MetaStep.Type:
                 item.getStep().registerDoneExecution(callback)
 
+    def reload_configuration(self):
+        """
+        Deserialize the configuration of every step in the scene from the
+        configuration files in the workflow location.
+        """
+        for item in self._items:
+            if item.Type == MetaStep.Type:
+                configuration = load_configuration(self._location, item.getIdentifier())
+                with execution_tracer.span('deserialize', 'configuration', step=item.getIdentifier()):
+                    item.getStep().deserialize(configuration)
+
+        self._dependency_graph.mark_all_dirty()
+
     def clear(self):
         self._items.clear()
+        self._incoming_connections.clear()
+        self._dependency_graph.mark_all_dirty()
 
     def items(self):
         return list(self._items.keys())
@@ -440,12 +527,34 @@ class WorkflowScene(object):
 
         return identifiers
 
+    def incoming_connections(self, meta_step):
+        """
+        Return the connections that have the given step as their destination.
+        """
+        return self._incoming_connections.get(meta_step, [])
+
     def addItem(self, item):
+        if item.Type == Connection.Type and item not in self._items:
+            self._incoming_connections.setdefault(item.destination(), []).append(item)
+            self._dependency_graph.mark_dirty(item.destination())
         self._items[item] = item
 
     def removeItem(self, item):
         if item in self._items:
+            if item.Type == Connection.Type:
+                self._dependency_graph.mark_dirty(item.destination())
+            else:
+                self._dependency_graph.mark_dirty(item)
             del self._items[item]
+            if item.Type == Connection.Type:
+                # The destination step may have been removed before its connections.
+                connections = self._incoming_connections.get(item.destination())
+                if connections is not None and item in connections:
+                    connections.remove(item)
+            elif item.Type == MetaStep.Type:
+                self._incoming_connections.pop(item, None)
+                for connections in self._incoming_connections.values():
+                    connections[:] = [connection for connection in connections if connection.source() is not item]
 
     def setItemPos(self, item, pos):
         if item in self._items:
@@ -0,0 +1,633 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from mapclient.core.metrics import get_metrics_logger
+from mapclient.core.tracing import get_execution_tracer
+from mapclient.core.utils import create_configured_step
+from mapclient.core.workflow.workflowcancellation import CancellationToken
+from mapclient.core.workflow.workflowdependencygraph import execution_error
+from mapclient.core.workflow.workflowerror import WorkflowError, WorkflowTimeoutError
+from mapclient.core.workflow.workflowprofiler import measure
+from mapclient.core.workflow.workflowspill import resolve
+from mapclient.mountpoints.workflowstep import is_async_step
+
+logger = logging.getLogger(__name__)
+metrics_logger = get_metrics_logger()
+execution_tracer = get_execution_tracer()
+
+
+def _provided_port_indices(step):
+    return [index for index, port in enumerate(step.getPorts()) if port.has_provides()]
+
+
+def _is_cacheable(step):
+    # Steps without outputs are run for their side effects, as are steps
+    # that say so, replaying them from the cache would skip the effects.
+    return getattr(step, '_cacheable', True) and bool(_provided_port_indices(step))
+
+
+def _set_inputs(step, inputs):
+    for index, data in inputs:
+        with execution_tracer.span('set port data', 'port', step=step.getIdentifier(), index=index):
+            step.setPortData(index, resolve(data))
+
+
+def _execute_step(step, done):
+    step.execute()
+    # A step that has not reported that it is done by the time it returns
+    # is waiting for the user, which would never happen here.
+    if not done.is_set():
+        raise WorkflowError(f"Step '{step.getIdentifier()}' is interactive, it cannot be executed without a user.")
+
+
+def _run_step(step, profile=False):
+    """
+    Execute the given step, which must report that it is done before its
+    execute method returns.  Returns the measurements of the execution if
+    profile is True.
+    """
+    measurements = {} if profile else None
+    done = threading.Event()
+    step.registerDoneExecution(done.set)
+    with execution_tracer.span(step.getIdentifier(), 'execute', step=step.getName()):
+        if profile:
+            with measure(measurements):
+                _execute_step(step, done)
+        else:
+            _execute_step(step, done)
+
+    return measurements
+
+
+async def _run_step_async(step, profile=False):
+    """
+    Await the asynchronous execution of the given step.  Returns the
+    measurements of the execution if profile is True, the CPU time measured
+    is that of the event loop thread.
+    """
+    measurements = {} if profile else None
+    with execution_tracer.span(step.getIdentifier(), 'execute', step=step.getName()):
+        if profile:
+            with measure(measurements):
+                await step.execute_async()
+        else:
+            await step.execute_async()
+
+    return measurements
+
+
+class _EventLoopThread(object):
+    """
+    Runs an asyncio event loop on its own thread for the asynchronous steps
+    of a workflow, so that they run concurrently with each other and with
+    the synchronous steps.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='workflow-event-loop', daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine):
+        """
+        Schedule the coroutine on the event loop, returns a
+        concurrent.futures.Future for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks(self._loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """
+        Cancel any steps still running on the event loop and stop it.
+        """
+        self.submit(self._cancel_tasks()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _execute_in_process(name, identifier, location, configuration, inputs, output_indices, profile, trace):
+    """
+    Recreate the described step in a worker process, set its inputs, execute it
+    and return the data from its provided ports, with the measurements of the
+    execution if profile is True and the trace events recorded if trace is True.
+    """
+    if trace:
+        execution_tracer.enable()
+    step = create_configured_step(identifier, name, configuration, location)
+    _set_inputs(step, inputs)
+    measurements = _run_step(step, profile)
+    with execution_tracer.span('get port data', 'port', step=identifier):
+        outputs = {index: step.getPortData(index) for index in output_indices}
+
+    return outputs, measurements, execution_tracer.collect()
+
+
+def _kill_workers(executor):
+    # A process pool has no way to stop a task that is running, so the worker
+    # processes are killed, which breaks the pool.
+    for process in list(getattr(executor, '_processes', {}).values()):
+        process.kill()
+
+
+def _process_context():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+
+    return None
+
+
+class WorkflowScheduler(object):
+    """
+    Executes the steps of a workflow as soon as all the steps they depend on
+    have finished, allowing independent branches of the workflow to run at the
+    same time.  The steps are run on a thread pool, or a process pool, of
+    at most max_workers workers.  With a single thread the steps are run, in
+    topological order, on the calling thread.
+
+    Steps that implement the asynchronous execution protocol, execute_async,
+    are awaited on an event loop in this process instead and do not occupy a
+    worker, so any number of them may be waiting at the same time.
+
+    When a step, or the whole run, exceeds its timeout the execution fails
+    with a WorkflowTimeoutError.  The cancellation tokens of the steps still
+    running are cancelled, asynchronous steps are cancelled and worker
+    processes are killed.  A step running on a thread cannot be stopped, it
+    keeps running until it notices it has been cancelled.
+
+    Every step run by the scheduler must be non-interactive, as is required
+    for headless execution, a step that is still waiting for the user when
+    its execute method returns fails the execution.
+    """
+
+    def __init__(self, dependency_graph, max_workers=1, use_processes=False):
+        self._dependency_graph = dependency_graph
+        self._max_workers = max(1, max_workers)
+        self._use_processes = use_processes
+        self._step_cache = None
+        self._cache_keys = {}
+        self._checkpoint = None
+        self._resume = False
+        self._from_step = None
+        self._restored = set()
+        self._outputs = {}
+        self._pending_consumers = {}
+        self._spill = None
+        self._spilled = {}
+        self._profiler = None
+        self._process_context = None
+        self._event_loop = None
+        self._step_timeout = None
+        self._run_timeout = None
+        self._tokens = {}
+        self._broker = None
+
+        if self._use_processes and _process_context() is None:
+            logger.warning('Process pool execution is not available on this platform, using threads instead.')
+            self._use_processes = False
+
+    def set_process_context(self, context):
+        """
+        Set the multiprocessing context the process pool creates its workers
+        with, by default the workers are forked from this process.
+        """
+        self._process_context = context
+
+    def set_broker(self, broker):
+        """
+        Dispatch the steps to the workers of the given task broker instead of
+        running them in a local pool.  The steps are executed as they are in a
+        process pool, so their port data must be picklable.  Data spilled to
+        disk is passed by location, the scratch directory of the spill must
+        be shared with the workers.
+        """
+        self._broker = broker
+        if broker is not None:
+            self._use_processes = True
+
+    def set_timeouts(self, step_timeout=None, run_timeout=None):
+        """
+        Set the wall clock time, in seconds, each step and the whole run may
+        execute for, None for no limit.  A step with a timeout of its own uses
+        that instead of step_timeout.
+        """
+        self._step_timeout = step_timeout
+        self._run_timeout = run_timeout
+
+    def _timeout(self, node):
+        timeout = node.getTimeout()
+        return self._step_timeout if timeout is None else timeout
+
+    def _has_timeouts(self, order):
+        return self._run_timeout is not None or any(self._timeout(node) is not None for node in order)
+
+    def set_step_cache(self, step_cache):
+        """
+        Set the step output cache, steps with cached outputs are not executed
+        and their outputs are replayed from the cache instead.
+        """
+        self._step_cache = step_cache
+
+    def set_checkpoint(self, checkpoint, resume=False, from_step=None):
+        """
+        Set the checkpoint that the outputs of completed steps are recorded in.
+        If resume is True execution restarts at the first step, in topological
+        order, that has not been recorded.  If from_step is given execution
+        restarts at the step with that identifier.  Otherwise, any previously
+        recorded steps are discarded.
+        """
+        self._checkpoint = checkpoint
+        self._resume = resume
+        self._from_step = from_step
+
+    def _restore_from_checkpoint(self, order):
+        if self._from_step is not None:
+            identifiers = [node.getIdentifier() for node in order]
+            if self._from_step not in identifiers:
+                raise WorkflowError(f"Cannot execute from step '{self._from_step}', no step with that identifier in the workflow.")
+            restart_index = identifiers.index(self._from_step)
+        elif self._resume:
+            restart_index = len(order)
+        else:
+            self._checkpoint.clear()
+            return
+
+        for node in order[:restart_index]:
+            outputs = self._checkpoint.outputs(node.getStep())
+            if outputs is None:
+                if self._from_step is not None:
+                    raise WorkflowError(f"Cannot execute from step '{self._from_step}', "
+                                        f"step '{node.getIdentifier()}' has no checkpoint.")
+                break
+
+            self._outputs[node] = outputs
+            self._restored.add(node)
+
+        if self._restored:
+            logger.info(f"Restored {len(self._restored)} step(s) from the checkpoint.")
+
+    def set_spill(self, spill):
+        """
+        Set the spill that port data larger than its memory budget is written
+        to before it is handed to the consuming steps.
+        """
+        self._spill = spill
+
+    def set_profiler(self, profiler):
+        """
+        Set the profiler that records the time and memory used by each step.
+        """
+        self._profiler = profiler
+
+    def profiler(self):
+        return self._profiler
+
+    def _port_data(self, node, index):
+        if (node, index) in self._spilled:
+            return self._spilled[(node, index)].load()
+        if node in self._outputs:
+            return self._outputs[node][index]
+
+        return node.getStep().getPortData(index)
+
+    def _hand_off(self, node, index):
+        port = (node, index)
+        if port in self._spilled:
+            return self._spilled[port]
+
+        with execution_tracer.span('get port data', 'port', step=node.getIdentifier(), index=index):
+            data = self._port_data(node, index)
+        if self._spill is None or not self._spill.exceeds_budget(data):
+            return data
+
+        logger.info(f"Spilling data from port {index} of step '{node.getIdentifier()}' to disk.")
+        with execution_tracer.span('spill port data', 'port', step=node.getIdentifier(), index=index):
+            self._spilled[port] = self._spill.spill(data)
+        # The consumers load the data from disk, the producer need not hold
+        # on to it while they wait to run.
+        del data
+        self._release(node, index)
+
+        return self._spilled[port]
+
+    def _inputs(self, node):
+        return [(connection.destinationIndex(), self._hand_off(connection.source(), connection.sourceIndex()))
+                for connection in self._dependency_graph.input_connections(node)]
+
+    def _count_consumers(self, order):
+        self._pending_consumers = {}
+        for node in order:
+            for connection in self._dependency_graph.input_connections(node):
+                port = (connection.source(), connection.sourceIndex())
+                self._pending_consumers[port] = self._pending_consumers.get(port, 0) + 1
+
+    def _release(self, node, index):
+        if node in self._outputs:
+            self._outputs[node].pop(index, None)
+        else:
+            node.getStep().releasePortData(index)
+
+    def _delivered(self, node):
+        """
+        Release the data of every port that has now been delivered to all of
+        its consumers.
+        """
+        for connection in self._dependency_graph.input_connections(node):
+            source, index = port = (connection.source(), connection.sourceIndex())
+            self._pending_consumers[port] -= 1
+            if self._pending_consumers[port] == 0:
+                if port in self._spilled:
+                    # The data of the producer was released when it was spilled.
+                    self._spilled.pop(port).remove()
+                else:
+                    self._release(source, index)
+
+    def _replay(self, node, inputs):
+        if node in self._restored:
+            return True
+
+        step = node.getStep()
+        if self._step_cache is None or not _is_cacheable(step):
+            return False
+
+        key = self._step_cache.key(step, inputs)
+        self._cache_keys[node] = key
+        outputs = self._step_cache.get(key) if key is not None else None
+        if outputs is None:
+            return False
+
+        logger.info(f"Step '{step.getIdentifier()}' is unchanged, using cached outputs.")
+        self._outputs[node] = outputs
+        return True
+
+    def _replayed(self, node):
+        if node not in self._restored:
+            self._record(node, cached=True)
+        if self._profiler is not None:
+            self._profiler.skipped(node, 'restored' if node in self._restored else 'cached')
+
+    def _started(self, node, inputs):
+        if self._profiler is not None:
+            self._profiler.started(node, inputs)
+
+    def _in_process(self, node):
+        return self._use_processes and not is_async_step(node.getStep())
+
+    def _submit(self, executor, node, inputs):
+        step = node.getStep()
+        self._started(node, inputs)
+        profile = self._profiler is not None
+        if not self._in_process(node):
+            self._tokens[node] = CancellationToken()
+            step.setCancellationToken(self._tokens[node])
+        if is_async_step(step):
+            if self._event_loop is None:
+                self._event_loop = _EventLoopThread()
+            _set_inputs(step, inputs)
+            return self._event_loop.submit(_run_step_async(step, profile))
+
+        if self._use_processes:
+            return executor.submit(_execute_in_process, step.getName(), step.getIdentifier(), step.getLocation(),
+                                   step.serialize(), inputs, _provided_port_indices(step), profile,
+                                   execution_tracer.is_enabled())
+
+        _set_inputs(step, inputs)
+
+        return executor.submit(_run_step, step, profile)
+
+    def _completed(self, node, result):
+        step = node.getStep()
+        if self._in_process(node):
+            self._outputs[node], measurements, events = result
+            execution_tracer.extend(events)
+        else:
+            measurements = result
+        metrics_logger.plugin_executed(step.getName())
+
+        if self._profiler is not None:
+            outputs = [self._port_data(node, index) for index in _provided_port_indices(step)]
+            self._profiler.completed(node, measurements, outputs)
+
+        self._record(node)
+
+    def _record(self, node, cached=False):
+        """
+        Record the outputs of the given node in the step cache, unless they
+        came from the cache, and in the checkpoint.
+        """
+        key = None if cached else self._cache_keys.get(node)
+        if key is None and self._checkpoint is None:
+            return
+
+        step = node.getStep()
+        outputs = {index: self._port_data(node, index) for index in _provided_port_indices(step)}
+        if key is not None:
+            self._step_cache.put(key, step.getName(), outputs)
+        if self._checkpoint is not None:
+            self._checkpoint.record(step, outputs)
+
+    def _create_executor(self):
+        if self._broker is not None:
+            return self._broker
+        if self._use_processes:
+            context = self._process_context if self._process_context is not None else _process_context()
+            return ProcessPoolExecutor(max_workers=self._max_workers, mp_context=context)
+
+        return ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='workflow-step')
+
+    def _execute_serially(self, order):
+        for node in order:
+            step = node.getStep()
+            inputs = self._inputs(node)
+            try:
+                if self._replay(node, inputs):
+                    self._replayed(node)
+                    continue
+
+                self._started(node, inputs)
+                _set_inputs(step, inputs)
+                del inputs
+                try:
+                    measurements = _run_step(step, self._profiler is not None)
+                except Exception as e:
+                    raise execution_error(step.getName(), e)
+                self._completed(node, measurements)
+            finally:
+                # Spilled inputs are only removed once the step is done with
+                # them, the step may still have them memory mapped.
+                self._delivered(node)
+
+    def execute(self):
+        """
+        Execute the workflow, the dependency graph must have been determined
+        with a successful call to can_execute beforehand.
+        """
+        order = self._dependency_graph.topological_order()
+        self._outputs = {}
+        self._cache_keys = {}
+        self._restored = set()
+        self._spilled = {}
+        self._count_consumers(order)
+        if self._checkpoint is not None:
+            self._restore_from_checkpoint(order)
+
+        # Steps run on the calling thread cannot be timed out, or overlap with
+        # asynchronous steps, so these workflows are always run on workers.
+        on_workers = self._has_timeouts(order) or any(is_async_step(node.getStep()) for node in order)
+        self._tokens = {}
+        try:
+            with execution_tracer.span('workflow', 'workflow', jobs=self._max_workers, processes=self._use_processes):
+                if self._max_workers == 1 and not self._use_processes and not on_workers:
+                    self._execute_serially(order)
+                else:
+                    self._execute_concurrently(order)
+        finally:
+            if self._event_loop is not None:
+                self._event_loop.close()
+                self._event_loop = None
+            if self._spill is not None:
+                self._spill.cleanup()
+
+    def _execute_concurrently(self, order):
+        waiting_on = {node: set(self._dependency_graph.dependencies(node)) for node in order}
+        dependants = {node: [] for node in order}
+        for node in order:
+            for source in waiting_on[node]:
+                dependants[source].append(node)
+
+        def _release_dependants(finished_node):
+            for dependant in dependants[finished_node]:
+                waiting_on[dependant].discard(finished_node)
+                if not waiting_on[dependant]:
+                    ready.append(dependant)
+
+        def _next_ready():
+            # Asynchronous steps do not wait for a free worker.
+            workers_free = sum(1 for node in running.values() if not is_async_step(node.getStep())) < self._max_workers
+            for node in ready:
+                if workers_free or is_async_step(node.getStep()):
+                    ready.remove(node)
+                    return node
+
+            return None
+
+        def _wait_time():
+            deadlines = list(step_deadlines.values())
+            if run_deadline is not None:
+                deadlines.append(run_deadline)
+
+            return max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+        ready = [node for node in order if not waiting_on[node]]
+        running = {}
+        step_deadlines = {}
+        run_deadline = None if self._run_timeout is None else time.monotonic() + self._run_timeout
+        timed_out = False
+        executor = self._create_executor()
+        try:
+            while ready or running:
+                node = _next_ready()
+                while node is not None:
+                    inputs = self._inputs(node)
+                    if self._replay(node, inputs):
+                        self._replayed(node)
+                        self._delivered(node)
+                        _release_dependants(node)
+                    else:
+                        future = self._submit(executor, node, inputs)
+                        running[future] = node
+                        if self._timeout(node) is not None:
+                            step_deadlines[future] = time.monotonic() + self._timeout(node)
+                    del inputs
+                    node = _next_ready()
+
+                if not running:
+                    continue
+
+                finished, unfinished = wait(running, timeout=_wait_time(), return_when=FIRST_COMPLETED)
+                unfinished = {future: running[future] for future in unfinished}
+                error = self._timeout_error(unfinished, step_deadlines, run_deadline)
+                if error is not None:
+                    timed_out = True
+                    self._stop(executor, unfinished)
+                    raise error
+
+                for future in finished:
+                    node = running.pop(future)
+                    step_deadlines.pop(future, None)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        raise execution_error(node.getStep().getName(), e)
+
+                    # Inputs given to a worker process are only known to have
+                    # been received once the step has completed.
+                    self._delivered(node)
+                    self._completed(node, result)
+                    _release_dependants(node)
+        finally:
+            if executor is self._broker:
+                # The broker outlives the run, only withdraw the steps not yet started.
+                for future in running:
+                    future.cancel()
+            else:
+                # Do not wait for steps on threads that are still running after a timeout.
+                executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+    def _timeout_error(self, running, step_deadlines, run_deadline):
+        """
+        Return the error for the step, or the run, that has exceeded its
+        timeout, or None if nothing has.
+        """
+        now = time.monotonic()
+        for future, node in running.items():
+            deadline = step_deadlines.get(future)
+            if deadline is not None and deadline <= now:
+                return WorkflowTimeoutError(f"Step '{node.getIdentifier()}' exceeded its timeout of {self._timeout(node)} s.")
+        if run_deadline is not None and run_deadline <= now:
+            return WorkflowTimeoutError(f"Workflow execution exceeded its timeout of {self._run_timeout} s.")
+
+        return None
+
+    def _stop(self, executor, running):
+        """
+        Cancel the steps that are running, killing the worker processes of a
+        process pool.
+        """
+        for future, node in running.items():
+            if node in self._tokens:
+                self._tokens[node].cancel()
+            if is_async_step(node.getStep()):
+                future.cancel()
+            elif not self._in_process(node):
+                logger.warning(f"Step '{node.getIdentifier()}' is running on a thread and cannot be stopped, it has been cancelled.")
+        if self._use_processes:
+            _kill_workers(executor)
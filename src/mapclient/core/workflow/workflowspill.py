@@ -0,0 +1,189 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def payload_size(data):
+    """
+    Estimate the number of bytes held by the given port data.
+    """
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, (bytes, bytearray, str)):
+        return len(data)
+    if isinstance(data, (list, tuple, set)):
+        return sys.getsizeof(data) + sum(payload_size(item) for item in data)
+    if isinstance(data, dict):
+        return sys.getsizeof(data) + sum(payload_size(item) for item in data.values())
+
+    return sys.getsizeof(data)
+
+
+def _is_plain_array(data):
+    return isinstance(data, np.ndarray) and not data.dtype.hasobject
+
+
+def _array_digest(array):
+    hasher = hashlib.sha256()
+    hasher.update(f'{array.dtype.str}{array.shape}'.encode())
+    flat = array.reshape(-1)
+    step = max(1, (1024 * 1024) // max(1, array.itemsize))
+    for start in range(0, flat.size, step):
+        hasher.update(np.ascontiguousarray(flat[start:start + step]).tobytes())
+
+    return hasher.hexdigest()
+
+
+def port_data_digest(data):
+    """
+    Return a digest of the given port data.  The digest is the same whether
+    or not the data has been spilled to disk.
+    """
+    if isinstance(data, SpilledPortData):
+        return data.digest()
+    if _is_plain_array(data):
+        return _array_digest(data)
+
+    return hashlib.sha256(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def resolve(data):
+    """
+    Return the port data to give to a step, loading it if it was spilled to disk.
+    """
+    if isinstance(data, SpilledPortData):
+        return data.load()
+
+    return data
+
+
+class SpilledPortData(object):
+    """
+    A reference to port data that has been written to disk.  Arrays are
+    loaded as read only memory maps, so they are only paged in as the
+    consuming step reads them.  Everything else is unpickled when it is
+    first loaded and the same object is given to every consumer in this
+    process until the data is removed.
+    """
+
+    def __init__(self, path, is_array):
+        self._path = path
+        self._is_array = is_array
+        self._digest = None
+        self._data = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Only the reference is sent to worker processes, not loaded data.
+        state = self.__dict__.copy()
+        state['_data'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._is_array:
+            return np.load(self._path, mmap_mode='r')
+
+        with self._lock:
+            if self._data is None:
+                with open(self._path, 'rb') as f:
+                    self._data = pickle.load(f)
+
+            return self._data
+
+    def size(self):
+        return os.path.getsize(self._path)
+
+    def digest(self):
+        """
+        Return a digest of the spilled data, see port_data_digest.
+        """
+        if self._digest is None and self._is_array:
+            self._digest = _array_digest(self.load())
+        elif self._digest is None:
+            # The file holds the data pickled as port_data_digest pickles it.
+            hasher = hashlib.sha256()
+            with open(self._path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            self._digest = hasher.hexdigest()
+
+        return self._digest
+
+    def remove(self):
+        self._data = None
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+
+class PortDataSpill(object):
+    """
+    Writes port data larger than the memory budget, in bytes, to a scratch
+    directory.  If no scratch directory is given a temporary directory is
+    created and removed again by cleanup.
+    """
+
+    def __init__(self, budget, directory=None):
+        self._budget = budget
+        self._created_directory = directory is None
+        self._directory = tempfile.mkdtemp(prefix='mapclient-spill-') if directory is None else directory
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+    def exceeds_budget(self, data):
+        return payload_size(data) > self._budget
+
+    def spill(self, data):
+        """
+        Write the given data to the scratch directory and return a reference to it.
+        """
+        name = os.path.join(self._directory, uuid.uuid4().hex)
+        if _is_plain_array(data):
+            path = name + '.npy'
+            np.save(path, data, allow_pickle=False)
+            return SpilledPortData(path, True)
+
+        path = name + '.pickle'
+        with open(path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return SpilledPortData(path, False)
+
+    def cleanup(self):
+        if self._created_directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
@@ -72,3 +72,5 @@ class WorkflowSteps(QtGui.QStandardItemModel):
         self.setColumnCount(1)
         for step in WorkflowStepMountPoint.getPlugins(''):
             addStep(self, step)
+        for step in self._manager.unloadedSteps():
+            addStep(self, step)
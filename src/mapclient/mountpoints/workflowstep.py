@@ -17,6 +17,8 @@ This file is part of MAP Client. (http://launchpad.net/mapclient)
     You should have received a copy of the GNU General Public License
     along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
 """
+import asyncio
+import inspect
 import os
 import sys
 
@@ -128,6 +130,15 @@ A plugin that registers this mount point must:
 A plugin that registers this mount point could have:
   - An attribute _icon that is a QImage icon for a visual representation of the step
   - An attribute _category that is a string representation of the step's category
+  - An attribute _cacheable set to False if executing the step has side effects, such as writing files, so its
+    outputs must not be replayed from the step output cache.  Steps that provide no ports are never cached.
+  - A function 'releasePortData(self, index)' to drop the data of a port once it has been consumed
+  - Polling 'self.isCancelled()' while executing for a long time, and returning early when it is True.
+  - A function 'revisit(self)' that shows an interactive step again when the workflow steps back to it, its input
+    port data is restored to the data it last executed with.  By default the step is executed again.
+  - A coroutine function 'async execute_async(self)' that executes the step, the step is done when it returns.
+    The workflow scheduler awaits it on an event loop so that the waiting of I/O bound steps overlaps,
+    such a step need not implement 'execute'.
   
 """
 
@@ -145,6 +156,8 @@ def _workflow_step_init(self, name, location, parent=None):
     self._doneExecution = None
     self._setCurrentWidget = None
     self._identifierOccursCount = None
+    self._cancellation_token = None
+    self._cacheable = True
 
 
 def _workflow_step_setLocation(self, location):
@@ -156,9 +169,16 @@ def _workflow_step_getLocation(self):
 
 
 def _workflow_step_execute(self, dataIn=None):
+    if is_async_step(self):
+        asyncio.run(self.execute_async())
+
     self._doneExecution()
 
 
+def _workflow_step_revisit(self):
+    self.execute()
+
+
 def _workflow_step_getPortData(self, index):
     return None
 
@@ -167,6 +187,16 @@ def _workflow_step_setPortData(self, index, dataIn):
     pass
 
 
+def _workflow_step_releasePortData(self, index):
+    """
+    Called once every step that consumes the data of the port at the given
+    index has received it, or once the data has been spilled to disk.  A
+    step may drop its reference to the data here to reduce the memory held
+    during long workflow executions.
+    """
+    pass
+
+
 def _workflow_step_setMainWindow(self, main_window):
     self._main_window = main_window
 
@@ -189,6 +219,19 @@ def _workflow_step_registerDoneExecution(self, observer):
     self._doneExecution = observer
 
 
+def _workflow_step_setCancellationToken(self, token):
+    self._cancellation_token = token
+
+
+def _workflow_step_isCancelled(self):
+    """
+    Returns True if the execution of this step has been cancelled, because
+    the workflow was aborted or the step has exceeded its timeout.
+    """
+    token = getattr(self, '_cancellation_token', None)
+    return token is not None and token.is_cancelled()
+
+
 def _workflow_step_registerOnExecuteEntry(self, observer, setCurrentUndoRedoStackObserver=None):
     self._setCurrentWidget = observer
     self._setCurrentUndoRedoStack = setCurrentUndoRedoStackObserver
@@ -311,13 +354,17 @@ attr_dict = {
     'getSourceURI': _workflow_step_get_source_uri,
     'getName': _workflow_step_getName,
     'gitInclude': _workflow_step_git_include,
+    'isCancelled': _workflow_step_isCancelled,
     'isConfigured': _workflow_step_isConfigured,
     'registerDoneExecution': _workflow_step_registerDoneExecution,
     'registerConfiguredObserver': _workflow_step_registerConfiguredObserver,
     'registerIdentifierOccursCount': _workflow_step_registerIdentifierOccursCount,
     'registerOnExecuteEntry': _workflow_step_registerOnExecuteEntry,
+    'releasePortData': _workflow_step_releasePortData,
     'relocateConfiguration': _workflow_step_relocate_configuration,
+    'revisit': _workflow_step_revisit,
     'serialize': _workflow_step_serialize,
+    'setCancellationToken': _workflow_step_setCancellationToken,
     'setConfiguration': _workflow_step_set_configuration,
     'setLocation': _workflow_step_setLocation,
     'setMainWindow': _workflow_step_setMainWindow,
@@ -327,10 +374,33 @@ attr_dict = {
 WorkflowStepMountPoint = pluginframework.MetaPluginMountPoint('WorkflowStepMountPoint', (object,), attr_dict)
 
 
+def is_async_step(step):
+    """
+    Tests if the given step implements the asynchronous execution protocol.
+    """
+    return inspect.iscoroutinefunction(getattr(step, 'execute_async', None))
+
+
+_workflow_step_loader = None
+
+
+def setWorkflowStepLoader(loader):
+    """
+    Set the callable that imports the plugin providing the step with the
+    given name, for steps whose plugins are imported on first use.  It
+    returns True if the plugin was imported.
+    """
+    global _workflow_step_loader
+    _workflow_step_loader = loader
+
+
 def workflowStepFactory(step_name, location):
-    for step in WorkflowStepMountPoint.getPlugins(location):
-        if step_name == step.getName():
-            return step
+    step = WorkflowStepMountPoint.getPlugin(step_name, location)
+    if step is not None:
+        return step
+
+    if _workflow_step_loader is not None and _workflow_step_loader(step_name):
+        return workflowStepFactory(step_name, location)
 
     raise ValueError('Failed to find/create a step named: ' + step_name)
 
@@ -347,5 +417,4 @@ def removeWorkflowStep(step_module):
 
     for cls in WorkflowStepMountPoint.plugins[:]:
         if cls and step_module in cls.__module__:
-            index = WorkflowStepMountPoint.plugins.index(cls)
-            WorkflowStepMountPoint.plugins.pop(index)
+            WorkflowStepMountPoint.removePlugin(cls)
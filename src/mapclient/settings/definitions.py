@@ -71,6 +71,8 @@ AUTOLOAD_PREVIOUS_WORKFLOW = 'checkBoxAutoloadPreviousWorkflow'
 FROZEN_PROVENANCE_INFO_FILE = 'provenance_info.json'
 
 PID_DATABASE_FILE_NAME = 'pid_database.json'
+PLUGIN_DISCOVERY_MANIFEST_FILE_NAME = 'plugin_discovery.json'
+PLUGIN_STEP_MANIFEST_FILE_NAME = 'plugin_steps.json'
 
 METRICS_PERMISSION_ATTAINED = 'metrics_permissions_db'
 METRICS_CLIENT_ID = 'metrics_client_id'
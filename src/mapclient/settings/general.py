@@ -25,15 +25,48 @@ import json
 import psutil
 from filelock import FileLock
 
-from PySide6 import QtCore
-
 from mapclient.core.exitcodes import LOG_FILE_LOCK_FAILED, PID_FILE_LOCK_FAILED
-from mapclient.settings.definitions import INTERNAL_WORKFLOWS_DIR, PID_DATABASE_FILE_NAME
+from mapclient.settings.definitions import INTERNAL_WORKFLOWS_DIR, PID_DATABASE_FILE_NAME, PLUGIN_DISCOVERY_MANIFEST_FILE_NAME, \
+    PLUGIN_STEP_MANIFEST_FILE_NAME
+
+from mapclient.settings.info import VERSION_STRING, DEFAULT_WORKFLOW_PROJECT_FILENAME, APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE, \
+    ORGANISATION_NAME, APPLICATION_NAME
+
+
+def qt_application_exists():
+    """
+    Tests if a Qt application has been created, without importing Qt.
+    """
+    qt_core = sys.modules.get('PySide6.QtCore')
+    return qt_core is not None and qt_core.QCoreApplication.instance() is not None
+
+
+def _user_settings_file():
+    """
+    Return the file QSettings uses for the user scope application settings
+    in the INI format.
+    """
+    if APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE in os.environ:
+        config_dir = os.environ[APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE]
+    elif sys.platform == 'win32':
+        config_dir = os.environ.get('APPDATA', os.path.expanduser('~'))
+    else:
+        config_dir = os.environ.get('XDG_CONFIG_HOME', os.path.join(os.path.expanduser('~'), '.config'))
 
-from mapclient.settings.info import VERSION_STRING, DEFAULT_WORKFLOW_PROJECT_FILENAME, APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE
+    return os.path.join(config_dir, ORGANISATION_NAME, f'{APPLICATION_NAME}.ini')
 
 
 def get_settings():
+    """
+    Return the application settings.  Without a Qt application the settings
+    are read, but cannot be written, without Qt.
+    """
+    if not qt_application_exists():
+        from mapclient.settings.inisettings import IniSettings
+        return IniSettings(_user_settings_file())
+
+    from PySide6 import QtCore
+
     settings = QtCore.QSettings()
     if APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE in os.environ:
         settings.setPath(QtCore.QSettings.Format.IniFormat, QtCore.QSettings.Scope.UserScope, os.environ[APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE])
@@ -85,6 +118,22 @@ def get_log_directory():
     return _get_app_directory('logs')
 
 
+def get_step_cache_directory():
+    return _get_app_directory('step_cache')
+
+
+def get_server_socket_file():
+    return os.path.join(_get_app_directory('server'), 'mapclient.sock')
+
+
+def get_plugin_discovery_manifest_file():
+    return os.path.join(get_data_directory(), PLUGIN_DISCOVERY_MANIFEST_FILE_NAME)
+
+
+def get_plugin_step_manifest_file():
+    return os.path.join(get_data_directory(), PLUGIN_STEP_MANIFEST_FILE_NAME)
+
+
 def _get_pid_database_file():
     return os.path.join(get_data_directory(), PID_DATABASE_FILE_NAME)
 
@@ -0,0 +1,285 @@
+"""
+MAP Client, a program to generate detailed musculoskeletal models for OpenSim.
+    Copyright (C) 2012  University of Auckland
+
+This file is part of MAP Client. (http://launchpad.net/mapclient)
+
+    MAP Client is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    MAP Client is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with MAP Client.  If not, see <http://www.gnu.org/licenses/>..
+"""
+import logging
+import re
+import struct
+
+logger = logging.getLogger(__name__)
+
+_ESCAPES = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v',
+            '"': '"', '?': '?', "'": "'", '\\': '\\', ';': ';', ',': ','}
+_HEX_DIGITS = '0123456789abcdefABCDEF'
+_OCTAL_DIGITS = '01234567'
+_GEOMETRY_PATTERN = re.compile(r'^@(Point|Size|Rect)\(([-\d\s]+)\)$')
+
+# Meta type identifiers of the values QSettings stores as @Variant(...).
+_BOOL, _INT, _UINT, _LONG_LONG, _DOUBLE, _STRING, _BYTE_ARRAY = 1, 2, 3, 4, 6, 10, 12
+_RECT, _RECTF, _SIZE, _SIZEF, _POINT, _POINTF = 19, 20, 21, 22, 25, 26
+
+
+def _unescape_key(key):
+    result = []
+    i = 0
+    while i < len(key):
+        ch = key[i]
+        if ch == '%' and key[i + 1:i + 2] == 'U' and i + 6 <= len(key):
+            result.append(chr(int(key[i + 2:i + 6], 16)))
+            i += 6
+        elif ch == '%' and i + 3 <= len(key):
+            result.append(chr(int(key[i + 1:i + 3], 16)))
+            i += 3
+        elif ch == '\\':
+            result.append('/')
+            i += 1
+        else:
+            result.append(ch)
+            i += 1
+
+    return ''.join(result)
+
+
+def _read_digits(text, start, digits):
+    end = start
+    while end < len(text) and text[end] in digits:
+        end += 1
+
+    return text[start:end], end
+
+
+def _unescape_value(text):
+    """
+    Unescape an INI value the way QSettings does, returning a string or, for
+    an unquoted comma separated value, a list of strings.
+    """
+    values = []
+    current = []
+    in_quotes = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch == '"':
+            in_quotes = not in_quotes
+            i += 1
+        elif ch == '\\' and i + 1 < len(text):
+            escaped = text[i + 1]
+            if escaped in _ESCAPES:
+                current.append(_ESCAPES[escaped])
+                i += 2
+            elif escaped == 'x':
+                digits, i = _read_digits(text, i + 2, _HEX_DIGITS)
+                current.append(chr(int(digits, 16)) if digits else 'x')
+            elif escaped in _OCTAL_DIGITS:
+                digits, i = _read_digits(text, i + 1, _OCTAL_DIGITS)
+                current.append(chr(int(digits, 8)))
+            else:
+                current.append(escaped)
+                i += 2
+        elif ch == ',' and not in_quotes:
+            values.append(''.join(current).strip())
+            current = []
+            i += 1
+        else:
+            current.append(ch)
+            i += 1
+
+    if values:
+        values.append(''.join(current).strip())
+        return values
+
+    return ''.join(current).strip() if not text.startswith('"') else ''.join(current)
+
+
+class _DataStream(object):
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def read(self, fmt):
+        values = struct.unpack_from('>' + fmt, self._data, self._offset)
+        self._offset += struct.calcsize('>' + fmt)
+        return values
+
+
+def _decode_variant(data):
+    """
+    Decode the value of a QVariant serialised by QSettings with the
+    Qt 4.0 data stream format.
+    """
+    from mapclient.core.geometry import point, rect, size
+
+    stream = _DataStream(data)
+    type_id, = stream.read('I')
+    if type_id == _BOOL:
+        return stream.read('?')[0]
+    if type_id == _INT:
+        return stream.read('i')[0]
+    if type_id == _UINT:
+        return stream.read('I')[0]
+    if type_id == _LONG_LONG:
+        return stream.read('q')[0]
+    if type_id == _DOUBLE:
+        return stream.read('d')[0]
+    if type_id in (_STRING, _BYTE_ARRAY):
+        length, = stream.read('I')
+        if length == 0xFFFFFFFF:
+            return None
+        raw, = stream.read(f'{length}s')
+        return raw.decode('utf-16-be') if type_id == _STRING else raw
+    if type_id == _POINT:
+        return point(*stream.read('ii'), integer=True)
+    if type_id == _POINTF:
+        return point(*stream.read('dd'))
+    if type_id == _SIZE:
+        return size(*stream.read('ii'), integer=True)
+    if type_id == _SIZEF:
+        return size(*stream.read('dd'))
+    if type_id == _RECT:
+        left, top, right, bottom = stream.read('iiii')
+        return rect(left, top, right - left + 1, bottom - top + 1, integer=True)
+    if type_id == _RECTF:
+        return rect(*stream.read('dddd'))
+
+    logger.debug(f'Unsupported settings value type {type_id}.')
+    return None
+
+
+def _decode_value(value):
+    if not isinstance(value, str) or not value.startswith('@'):
+        return value
+
+    if value.startswith('@@'):
+        return value[1:]
+    if value == '@Invalid()':
+        return None
+    if value.startswith('@ByteArray(') and value.endswith(')'):
+        return value[len('@ByteArray('):-1].encode('latin-1')
+    if value.startswith('@Variant(') and value.endswith(')'):
+        return _decode_variant(value[len('@Variant('):-1].encode('latin-1'))
+
+    match = _GEOMETRY_PATTERN.match(value)
+    if match:
+        from mapclient.core.geometry import point, rect, size
+        factory = {'Point': point, 'Size': size, 'Rect': rect}[match.group(1)]
+        return factory(*[int(v) for v in match.group(2).split()], integer=True)
+
+    return value
+
+
+class IniSettings(object):
+    """
+    A read only, pure Python, reader of the INI files written by QSettings.
+    It implements the subset of the QSettings interface used to read the
+    application settings and workflow project files, so they can be read
+    without Qt.  Values are returned as QSettings returns them from an
+    INI file, mostly as strings.
+    """
+
+    def __init__(self, file_name):
+        self._file_name = file_name
+        self._values = {}
+        self._prefixes = []
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self._file_name, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+
+        section = ''
+        pending = ''
+        for line in lines:
+            if pending:
+                line = pending + line.lstrip()
+                pending = ''
+            stripped = line.strip()
+            if not stripped or stripped[0] in ';#':
+                continue
+            if stripped.startswith('[') and stripped.endswith(']'):
+                section = _unescape_key(stripped[1:-1])
+                if section == 'General':
+                    section = ''
+                continue
+            if stripped.endswith('\\') and not stripped.endswith('\\\\'):
+                pending = stripped[:-1]
+                continue
+
+            key, sep, value = stripped.partition('=')
+            if not sep:
+                continue
+            key = _unescape_key(key.strip())
+            full_key = f'{section}/{key}' if section else key
+            self._values[full_key] = _decode_value(_unescape_value(value.strip()))
+
+    def fileName(self):
+        return self._file_name
+
+    def _prefix(self):
+        return self._prefixes[-1][0] if self._prefixes else ''
+
+    def group(self):
+        return self._prefix().rstrip('/')
+
+    def beginGroup(self, prefix):
+        self._prefixes.append((f'{self._prefix()}{prefix}/', None))
+
+    def endGroup(self):
+        self._prefixes.pop()
+
+    def beginReadArray(self, prefix):
+        size = self.value(f'{prefix}/size', 0)
+        array_prefix = f'{self._prefix()}{prefix}/'
+        self._prefixes.append((array_prefix, array_prefix))
+        try:
+            return int(size)
+        except ValueError:
+            return 0
+
+    def setArrayIndex(self, i):
+        array_prefix = self._prefixes[-1][1]
+        self._prefixes[-1] = (f'{array_prefix}{i + 1}/', array_prefix)
+
+    def endArray(self):
+        self._prefixes.pop()
+
+    def value(self, key, defaultValue=None):
+        return self._values.get(self._prefix() + key, defaultValue)
+
+    def contains(self, key):
+        return self._prefix() + key in self._values
+
+    def allKeys(self):
+        prefix = self._prefix()
+        return [key[len(prefix):] for key in self._values if key.startswith(prefix)]
+
+    def childKeys(self):
+        return [key for key in self.allKeys() if '/' not in key]
+
+    def childGroups(self):
+        groups = []
+        for key in self.allKeys():
+            if '/' in key:
+                group = key.split('/', 1)[0]
+                if group not in groups:
+                    groups.append(group)
+
+        return groups
@@ -145,12 +145,14 @@ class CommandConfigure(QtGui.QUndoCommand):
 
     def redo(self):
         self._node.setConfig(self._new_config)
+        self._scene.workflowScene().mark_dirty(self._node.metaItem())
         self._node.update()
 #        for item in self._scene.items():
 #            item.update()
 
     def undo(self):
         self._node.setConfig(self._old_config)
+        self._scene.workflowScene().mark_dirty(self._node.metaItem())
         self._node.update()
 #        for item in self._scene.items():
 #            item.update()
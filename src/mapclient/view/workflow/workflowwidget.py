@@ -205,11 +205,11 @@ class WorkflowWidget(QtWidgets.QWidget):
         elif status == 2:
             errors.append('The workflow is empty.')
         elif status == 3:
-            errors.append('The workflow has multiple steps but no connections.')
+            errors.append(wfm.execute_status_message())
         elif status == 4:
             errors.append('The workflow is currently running.')
         elif status == 5:
-            errors.append('The workflow has a loop.')
+            errors.append(wfm.execute_status_message())
 
         if errors:
             errors_str = '\n'.join(
@@ -0,0 +1,80 @@
+import json
+
+from mapclient.core.workflow.workflowitems import Connection, MetaStep
+from mapclient.core.workflow.workflowscene import WorkflowScene
+from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+
+_PORT = 'http://physiomeproject.org/workflow/1.0/rdf-schema#port'
+_USES = 'http://physiomeproject.org/workflow/1.0/rdf-schema#uses'
+_PROVIDES = 'http://physiomeproject.org/workflow/1.0/rdf-schema#provides'
+
+
+class RecordingStep(WorkflowStepMountPoint):
+    """
+    A step with one uses port and one provides port.  It provides a list of
+    its identifier followed by the lists it was given, in the order of its
+    incoming connections, and records what happens to it in the shared log.
+    """
+
+    log = []
+
+    def __init__(self, location, identifier='step'):
+        super(RecordingStep, self).__init__('Recording Step', location)
+        self._configured = True
+        self._identifier = identifier
+        self._received = []
+        self._executed_with = []
+        self._output = None
+        self.addPort((_PORT, _USES, 'list'))
+        self.addPort((_PORT, _PROVIDES, 'list'))
+
+    def getIdentifier(self):
+        return self._identifier
+
+    def setIdentifier(self, identifier):
+        self._identifier = identifier
+
+    def serialize(self):
+        return json.dumps({'identifier': self._identifier})
+
+    def deserialize(self, string):
+        pass
+
+    def executed_with(self):
+        """
+        Return the port data given to the step when it was last executed.
+        """
+        return self._executed_with
+
+    def setPortData(self, index, data):
+        self._received.append(data)
+
+    def getPortData(self, index):
+        return self._output
+
+    def releasePortData(self, index):
+        RecordingStep.log.append(('released', self._identifier))
+        self._output = None
+
+    def execute(self):
+        RecordingStep.log.append(('executed', self._identifier))
+        self._executed_with, self._received = self._received, []
+        self._output = [self._identifier] + [item for data in self._executed_with if data for item in data]
+        self._doneExecution()
+
+
+def create_scene(identifiers, arcs, step_class=RecordingStep, location=''):
+    """
+    Return a scene of steps with the given identifiers, connected by the
+    given (source, destination) identifier pairs, and its meta steps by
+    identifier.
+    """
+    scene = WorkflowScene(None)
+    meta_steps = {}
+    for identifier in identifiers:
+        meta_steps[identifier] = MetaStep(step_class(location, identifier))
+        scene.addItem(meta_steps[identifier])
+    for source, destination in arcs:
+        scene.addItem(Connection(meta_steps[source], 1, meta_steps[destination], 0))
+
+    return scene, meta_steps
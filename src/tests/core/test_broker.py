@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from mapclient.core.broker import SpoolBroker, SpoolWorker, read_plugin_directories
+
+
+class SpoolBrokerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._spool = tempfile.TemporaryDirectory()
+        self._broker = SpoolBroker(self._spool.name, poll_interval=0.01)
+        self._worker = SpoolWorker(self._spool.name, poll_interval=0.01)
+
+    def tearDown(self):
+        self._broker.shutdown(wait=False, cancel_futures=True)
+        self._spool.cleanup()
+
+    def _spool_files(self, timeout=5):
+        # The broker removes the files of finished tasks when it next polls.
+        deadline = time.monotonic() + timeout
+        while True:
+            files = sorted(f for name in ['tasks', 'claimed', 'results'] for f in os.listdir(os.path.join(self._spool.name, name)))
+            if not files or time.monotonic() > deadline:
+                return files
+            time.sleep(0.01)
+
+    def test_result(self):
+        future = self._broker.submit(int, '5')
+
+        self.assertEqual(1, self._worker.run(max_tasks=1))
+        self.assertEqual(5, future.result(5))
+        self.assertEqual([], self._spool_files())
+
+    def test_exception(self):
+        future = self._broker.submit(int, 'five')
+        self._worker.run(max_tasks=1)
+
+        self.assertIsInstance(future.exception(5), ValueError)
+        self.assertEqual([], self._spool_files())
+
+    def test_each_task_executed_once(self):
+        futures = [self._broker.submit(pow, 2, power) for power in range(8)]
+        counts = []
+        workers = [threading.Thread(target=lambda: counts.append(SpoolWorker(self._spool.name, 0.01).run(idle_timeout=0.2)))
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(8, sum(counts))
+        self.assertEqual([2 ** power for power in range(8)], [future.result(5) for future in futures])
+
+    def test_cancel_task_before_claimed(self):
+        future = self._broker.submit(int, '5')
+
+        self.assertTrue(future.cancel())
+        self.assertEqual([], self._spool_files())
+        self.assertEqual(0, self._worker.run(idle_timeout=0.05))
+
+    def test_cancel_claimed_task(self):
+        future = self._broker.submit(time.sleep, 0.5)
+        worker = threading.Thread(target=self._worker.run, kwargs={'max_tasks': 1})
+        worker.start()
+        while not os.listdir(os.path.join(self._spool.name, 'claimed')):
+            time.sleep(0.01)
+
+        self.assertTrue(future.cancel())
+        worker.join()
+
+        self.assertEqual([], self._spool_files())
+
+    def test_cancel_claimed_task_after_result(self):
+        broker = SpoolBroker(self._spool.name, poll_interval=60)
+        future = broker.submit(int, '5')
+        # Let the broker look for results once, it then waits for a minute.
+        time.sleep(0.1)
+        self._worker.run(max_tasks=1)
+
+        self.assertTrue(future.cancel())
+        broker.shutdown(cancel_futures=True)
+
+        self.assertEqual([], self._spool_files(timeout=0))
+
+    def test_submit_after_shutdown(self):
+        self._broker.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            self._broker.submit(int, '5')
+
+    def test_plugin_directories(self):
+        self.assertIsNone(read_plugin_directories(self._spool.name))
+
+        SpoolBroker(self._spool.name, plugin_directories=['/plugins'])
+
+        self.assertEqual(['/plugins'], read_plugin_directories(self._spool.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
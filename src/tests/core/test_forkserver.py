@@ -0,0 +1,140 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_PLUGIN_STEP = '''
+import os
+
+from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+
+_PORT = 'http://physiomeproject.org/workflow/1.0/rdf-schema#port'
+
+
+class ForkSourceStep(WorkflowStepMountPoint):
+
+    def __init__(self, location):
+        super(ForkSourceStep, self).__init__('Fork Source Step', location)
+        self._configured = True
+        self._identifier = ''
+        self.addPort((_PORT, 'http://physiomeproject.org/workflow/1.0/rdf-schema#provides', 'text'))
+
+    def getIdentifier(self):
+        return self._identifier
+
+    def setIdentifier(self, identifier):
+        self._identifier = identifier
+
+    def serialize(self):
+        return ''
+
+    def deserialize(self, string):
+        pass
+
+    def getPortData(self, index):
+        return 'made by the source'
+
+    def execute(self):
+        self._doneExecution()
+
+
+class ForkSinkStep(WorkflowStepMountPoint):
+
+    def __init__(self, location):
+        super(ForkSinkStep, self).__init__('Fork Sink Step', location)
+        self._configured = True
+        self._identifier = ''
+        self._text = None
+        self.addPort((_PORT, 'http://physiomeproject.org/workflow/1.0/rdf-schema#uses', 'text'))
+
+    def getIdentifier(self):
+        return self._identifier
+
+    def setIdentifier(self, identifier):
+        self._identifier = identifier
+
+    def serialize(self):
+        return ''
+
+    def deserialize(self, string):
+        pass
+
+    def setPortData(self, index, data):
+        self._text = data
+
+    def execute(self):
+        with open(os.path.join(self.getLocation(), 'sink.txt'), 'w') as f:
+            f.write(self._text)
+        self._doneExecution()
+'''
+
+# Imports the plugin, as the plugin manager does, and executes a workflow of
+# its two steps on workers forked from a fork server.
+_FORK_SERVER_RUN = '''
+import sys
+
+from mapclient.core.forkserver import fork_server_context
+from mapclient.core.workflow.workflowitems import Connection, MetaStep
+from mapclient.core.workflow.workflowscene import WorkflowScene
+
+plugin_dir, workflow_dir, plugin_module = sys.argv[1:]
+sys.path.append(plugin_dir)
+from mapclientplugins.forkstep.step import ForkSinkStep, ForkSourceStep
+
+source = MetaStep(ForkSourceStep(workflow_dir))
+source.getStep().setIdentifier('source')
+sink = MetaStep(ForkSinkStep(workflow_dir))
+sink.getStep().setIdentifier('sink')
+scene = WorkflowScene(None)
+for item in [source, sink, Connection(source, 0, sink, 0)]:
+    scene.addItem(item)
+
+assert scene.canExecute() == 0, scene.execute_status_message()
+scheduler = scene.create_scheduler(2, True)
+scheduler.set_process_context(fork_server_context([plugin_module]))
+scheduler.execute()
+'''
+
+
+class ForkServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._plugin_dir = os.path.join(self._directory.name, 'plugins')
+        package_dir = os.path.join(self._plugin_dir, 'mapclientplugins', 'forkstep')
+        os.makedirs(package_dir)
+        with open(os.path.join(package_dir, '__init__.py'), 'w') as f:
+            f.write('from mapclientplugins.forkstep.step import ForkSinkStep, ForkSourceStep\n')
+        with open(os.path.join(package_dir, 'step.py'), 'w') as f:
+            f.write(_PLUGIN_STEP)
+        self._workflow_dir = os.path.join(self._directory.name, 'workflow')
+        os.makedirs(self._workflow_dir)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _run(self, plugin_module):
+        environment = dict(os.environ, PYTHONPATH=_SOURCE_DIR)
+        return subprocess.run([sys.executable, '-c', _FORK_SERVER_RUN, self._plugin_dir, self._workflow_dir, plugin_module],
+                              env=environment, capture_output=True, timeout=120)
+
+    def test_workers_have_plugin_steps(self):
+        result = self._run('mapclientplugins.forkstep')
+
+        self.assertEqual(0, result.returncode, result.stderr.decode())
+        with open(os.path.join(self._workflow_dir, 'sink.txt')) as f:
+            self.assertEqual('made by the source', f.read())
+
+    def test_plugin_the_server_cannot_import(self):
+        result = self._run('mapclientplugins.missingstep')
+
+        self.assertNotEqual(0, result.returncode)
+        self.assertIn('WorkflowError: The fork server could not import the plugins', result.stderr.decode())
+        self.assertFalse(os.path.exists(os.path.join(self._workflow_dir, 'sink.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+
+from mapclient.core.managers.plugindiscovery import PluginDiscoveryManifest, PluginStepManifest, directory_signature
+from mapclient.settings.definitions import PLUGINS_PACKAGE_NAME
+
+
+def _write(file_name, text):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def _touch_later(file_name, text):
+    # Make the modification time differ on file systems with a coarse one.
+    _write(file_name, text)
+    stat = os.stat(file_name)
+    os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+class PluginDiscoveryManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._plugin_dir = os.path.join(self._directory.name, 'plugins')
+        self._manifest_file = os.path.join(self._directory.name, 'manifest', 'discovery.json')
+        self._step_file = os.path.join(self._plugin_dir, PLUGINS_PACKAGE_NAME, 'teststep', 'step', 'step.py')
+        _write(os.path.join(self._plugin_dir, PLUGINS_PACKAGE_NAME, 'teststep', '__init__.py'), '')
+        _write(self._step_file, 'x = 1\n')
+        self._scanned = []
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _scan(self, plugin_dir):
+        self._scanned.append(plugin_dir)
+        with open(self._step_file) as f:
+            return 'workflowstep' in f.read()
+
+    def _is_plugins_dir(self):
+        # A new manifest each time, as for a new session.
+        manifest = PluginDiscoveryManifest(self._manifest_file)
+        result = manifest.is_plugins_dir(self._plugin_dir, self._scan)
+        manifest.write()
+        return result
+
+    def test_unchanged_directory_not_scanned_again(self):
+        self.assertFalse(self._is_plugins_dir())
+        self.assertFalse(self._is_plugins_dir())
+
+        self.assertEqual(1, len(self._scanned))
+
+    def test_modified_nested_step_file_scanned_again(self):
+        self.assertFalse(self._is_plugins_dir())
+
+        _touch_later(self._step_file, 'from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint\n')
+
+        self.assertTrue(self._is_plugins_dir())
+        self.assertEqual(2, len(self._scanned))
+
+    def test_signature_ignores_modified_files_not_scanned(self):
+        package_dir = os.path.join(self._plugin_dir, PLUGINS_PACKAGE_NAME, 'teststep')
+        readme_file = os.path.join(package_dir, 'README.md')
+        cache_file = os.path.join(package_dir, '__pycache__', 'step.pyc')
+        _write(readme_file, 'text')
+        _write(cache_file, '')
+        signature = directory_signature(self._plugin_dir)
+
+        _touch_later(readme_file, 'more text')
+        _touch_later(cache_file, 'code')
+
+        self.assertEqual(signature, directory_signature(self._plugin_dir))
+
+
+_INIT = """
+__version__ = '1.2.0'
+__author__ = 'Author'
+__stepname__ = 'Test Step'
+__location__ = ''
+"""
+
+_STEP = """
+from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+
+
+class TestStep(WorkflowStepMountPoint):
+
+    def __init__(self, location):
+        super(TestStep, self).__init__('Test Step', location)
+        self._category = {category}
+        self._icon = QtGui.QImage(':/teststep/images/icon.png')
+        self.addPort(('http://physiomeproject.org/workflow/1.0/rdf-schema#port',
+                      'http://physiomeproject.org/workflow/1.0/rdf-schema#uses',
+                      'data'))
+"""
+
+
+class PluginStepManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._package_dir = os.path.join(self._directory.name, 'plugins', PLUGINS_PACKAGE_NAME, 'teststep')
+        self._manifest_file = os.path.join(self._directory.name, 'manifest', 'steps.json')
+        _write(os.path.join(self._package_dir, '__init__.py'), _INIT)
+        _write(os.path.join(self._package_dir, 'step.py'), _STEP.format(category="'Source'"))
+        _write(os.path.join(self._package_dir, 'images', 'icon.png'), '')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _step_information(self):
+        manifest = PluginStepManifest(self._manifest_file)
+        information = manifest.step_information(self._package_dir)
+        manifest.write()
+        return information
+
+    def test_information_read_from_source(self):
+        information = self._step_information()
+
+        self.assertEqual('Test Step', information['name'])
+        self.assertEqual('Source', information['category'])
+        self.assertEqual('1.2.0', information['version'])
+        self.assertEqual(os.path.join(self._package_dir, 'images', 'icon.png'), information['icon_file'])
+        self.assertEqual([['http://physiomeproject.org/workflow/1.0/rdf-schema#port',
+                           'http://physiomeproject.org/workflow/1.0/rdf-schema#uses', 'data']], information['ports'])
+
+    def test_category_not_literal_not_read(self):
+        _write(os.path.join(self._package_dir, 'step.py'), _STEP.format(category="CATEGORY"))
+
+        self.assertIsNone(self._step_information())
+
+    def test_changed_step_read_again(self):
+        self._step_information()
+
+        _touch_later(os.path.join(self._package_dir, 'step.py'), _STEP.format(category="'Model'"))
+
+        self.assertEqual('Model', self._step_information()['category'])
+
+    def test_package_without_step_file(self):
+        os.remove(os.path.join(self._package_dir, 'step.py'))
+
+        self.assertIsNone(self._step_information())
+
+
+if __name__ == '__main__':
+    unittest.main()
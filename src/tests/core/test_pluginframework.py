@@ -0,0 +1,57 @@
+import unittest
+
+from mapclient.core.pluginframework import MetaPluginMountPoint
+
+
+class PluginFrameworkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._created = []
+        created = self._created
+        mount_point = MetaPluginMountPoint('TestMountPoint', (object,), {})
+
+        def plugin_class(class_name, name):
+            def __init__(self, location):
+                created.append(class_name)
+                self.location = location
+
+            return MetaPluginMountPoint(class_name, (mount_point,), {'__init__': __init__, 'getName': lambda self: name})
+
+        self._mount_point = mount_point
+        self._first = plugin_class('First', 'First Step')
+        self._second = plugin_class('Second', 'Second Step')
+        self._duplicate = plugin_class('Duplicate', 'First Step')
+
+    def test_get_plugin_by_name(self):
+        plugin = self._mount_point.getPlugin('Second Step', '/location')
+
+        self.assertIsInstance(plugin, self._second)
+        self.assertEqual('/location', plugin.location)
+
+    def test_named_plugin_instantiated_only(self):
+        self._mount_point.getPlugin('Second Step', '')
+        self._created.clear()
+
+        self._mount_point.getPlugin('Second Step', '')
+        self._mount_point.getPlugin('First Step', '')
+
+        self.assertEqual(['Second', 'First'], self._created)
+
+    def test_unknown_name(self):
+        self.assertIsNone(self._mount_point.getPlugin('Unknown Step', ''))
+        self._created.clear()
+
+        self.assertIsNone(self._mount_point.getPlugin('Unknown Step', ''))
+        self.assertEqual([], self._created)
+
+    def test_first_registered_of_same_name_used(self):
+        self.assertIsInstance(self._mount_point.getPlugin('First Step', ''), self._first)
+        self._mount_point.getPlugins('')
+
+        self._mount_point.removePlugin(self._first)
+
+        self.assertIsInstance(self._mount_point.getPlugin('First Step', ''), self._duplicate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mapclient.settings.definitions import PLUGINS_PACKAGE_NAME
+from mapclient.settings.info import APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE
+
+try:
+    import mapclient.core.managers.pluginmanager
+    _PLUGIN_MANAGER_ERROR = None
+except ImportError as e:
+    _PLUGIN_MANAGER_ERROR = str(e)
+
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_STEP = """
+from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+
+
+class {class_name}(WorkflowStepMountPoint):
+
+    def __init__(self, location):
+        super({class_name}, self).__init__('{class_name}', location)
+"""
+
+# Loads the plugins in the given directory, in parallel or not, and prints
+# the plugins loaded and those that failed to import.
+_LOAD = """
+import json
+import sys
+
+from mapclient.core.managers.pluginmanager import PluginManager
+
+plugin_dir, parallel = sys.argv[1:]
+plugin_manager = PluginManager()
+plugin_manager.set_directories([plugin_dir])
+plugin_manager.set_parallel_loading_enabled(parallel == 'parallel')
+plugin_manager.load()
+print(json.dumps({'loaded': plugin_manager.loaded_plugin_modules(),
+                  'import_errors': plugin_manager.getPluginErrors()['ImportError']}))
+"""
+
+
+def _write(file_name, text):
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, 'w') as f:
+        f.write(text)
+
+
+def _install(directory, name):
+    _write(os.path.join(directory, f'{name}-1.0.dist-info', 'METADATA'), f'Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n')
+    # Make the modification time differ on file systems with a coarse one.
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+@unittest.skipIf(_PLUGIN_MANAGER_ERROR is not None, f'The plugin manager cannot be imported: {_PLUGIN_MANAGER_ERROR}')
+class PluginManagerLoadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._plugin_dir = os.path.join(self._directory.name, 'plugins')
+        for name in ['firststep', 'secondstep', 'brokenstep']:
+            package_dir = os.path.join(self._plugin_dir, PLUGINS_PACKAGE_NAME, name)
+            _write(os.path.join(package_dir, '__init__.py'), 'from . import step\n')
+            _write(os.path.join(package_dir, 'step.py'), _STEP.format(class_name=name.capitalize()))
+        _write(os.path.join(self._plugin_dir, PLUGINS_PACKAGE_NAME, 'brokenstep', '__init__.py'),
+               "raise ImportError('A dependency is missing.')\n")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _load(self, parallel):
+        environment = dict(os.environ, PYTHONPATH=_SOURCE_DIR)
+        environment[APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE] = os.path.join(self._directory.name, 'config')
+        result = subprocess.run([sys.executable, '-c', _LOAD, self._plugin_dir, 'parallel' if parallel else 'serial'],
+                                env=environment, capture_output=True, text=True, timeout=120)
+        self.assertEqual(0, result.returncode, result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def test_parallel_loading_loads_same_plugins(self):
+        serial = self._load(parallel=False)
+        parallel = self._load(parallel=True)
+
+        self.assertEqual([f'{PLUGINS_PACKAGE_NAME}.firststep', f'{PLUGINS_PACKAGE_NAME}.secondstep'], serial['loaded'])
+        self.assertEqual(['brokenstep'], serial['import_errors'])
+        self.assertEqual(serial, parallel)
+
+
+@unittest.skipIf(_PLUGIN_MANAGER_ERROR is not None, f'The plugin manager cannot be imported: {_PLUGIN_MANAGER_ERROR}')
+class DistributionIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        sys.path.append(self._directory.name)
+        self._index = mapclient.core.managers.pluginmanager.DistributionIndex()
+
+    def tearDown(self):
+        sys.path.remove(self._directory.name)
+        self._directory.cleanup()
+
+    def test_names_normalised(self):
+        _install(self._directory.name, 'Mapclient_Test.Distribution')
+
+        self.assertIn('mapclient-test-distribution', self._index.names())
+
+    def test_installed_distribution_found(self):
+        self.assertNotIn('mapclient-test-distribution', self._index.names())
+
+        _install(self._directory.name, 'mapclient_test_distribution')
+
+        self.assertIn('mapclient-test-distribution', self._index.names())
+
+    def test_unchanged_index_not_rebuilt(self):
+        names = self._index.names()
+
+        self.assertIs(names, self._index.names())
+        self._index.invalidate()
+        self.assertIsNot(names, self._index.names())
+        self.assertEqual(names, self._index.names())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mapclient.core.tracing import get_execution_tracer
+
+from tests.core.steps import create_scene
+
+
+class ExecutionTracerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._tracer = get_execution_tracer()
+
+    def tearDown(self):
+        self._tracer.disable()
+        self._tracer.collect()
+
+    def _trace(self, max_workers):
+        scene, _ = create_scene(['a', 'b', 'c'], [('a', 'b'), ('a', 'c')])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        self._tracer.enable()
+        scene.create_scheduler(max_workers).execute()
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace_file = os.path.join(directory, 'trace.json')
+            self._tracer.write(trace_file)
+            with open(trace_file) as f:
+                return json.load(f)['traceEvents']
+
+    def test_disabled_tracer_records_nothing(self):
+        scene, _ = create_scene(['a', 'b'], [('a', 'b')])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        scene.create_scheduler().execute()
+
+        self.assertEqual([], self._tracer.collect())
+
+    def test_trace_of_run(self):
+        events = self._trace(max_workers=2)
+
+        executed = {event['name']: event for event in events if event.get('cat') == 'execute'}
+        self.assertEqual({'a', 'b', 'c'}, set(executed))
+        self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in executed.values()))
+        self.assertLessEqual(executed['a']['ts'] + executed['a']['dur'], executed['b']['ts'])
+        self.assertEqual(1, len([event for event in events if event.get('cat') == 'workflow']))
+        self.assertIn('process_name', [event['name'] for event in events if event['ph'] == 'M'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import tempfile
+import unittest
+
+from mapclient.core.workflow.workflowcache import StepOutputCache
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class ConfiguredStep(RecordingStep):
+    """
+    Provides its setting after the data a recording step provides.
+    """
+
+    settings = {}
+
+    def _setting(self):
+        return ConfiguredStep.settings.get(self.getIdentifier())
+
+    def serialize(self):
+        return json.dumps({'identifier': self.getIdentifier(), 'setting': self._setting()})
+
+    def execute(self):
+        super(ConfiguredStep, self).execute()
+        self._output.append(self._setting())
+
+
+class SideEffectStep(RecordingStep):
+
+    def __init__(self, location, identifier='step'):
+        super(SideEffectStep, self).__init__(location, identifier)
+        self._cacheable = False
+
+
+class StepOutputCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._cache = StepOutputCache(self._directory.name, 1000)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_key(self):
+        step = RecordingStep('', 'a')
+
+        self.assertEqual(self._cache.key(step, [(0, [1, 2])]), self._cache.key(step, [(0, [1, 2])]))
+        self.assertNotEqual(self._cache.key(step, [(0, [1, 2])]), self._cache.key(step, [(0, [1, 3])]))
+        self.assertNotEqual(self._cache.key(step, []), self._cache.key(RecordingStep('', 'b'), []))
+
+    def test_put_and_get(self):
+        self.assertIsNone(self._cache.get('key'))
+
+        self._cache.put('key', 'Step', {1: ['data']})
+
+        self.assertEqual({1: ['data']}, self._cache.get('key'))
+        self.assertEqual({'Step': 1}, self._cache.info()['steps'])
+
+    def test_least_recently_used_evicted(self):
+        self._cache.put('first', 'Step', {1: b'1' * 400})
+        self._cache.put('second', 'Step', {1: b'2' * 400})
+        self._cache.get('first')
+        self._cache.put('third', 'Step', {1: b'3' * 400})
+
+        self.assertIsNotNone(self._cache.get('first'))
+        self.assertIsNone(self._cache.get('second'))
+        self.assertIsNotNone(self._cache.get('third'))
+
+    def test_outputs_larger_than_cache_not_cached(self):
+        self._cache.put('key', 'Step', {1: b'1' * 2000})
+
+        self.assertIsNone(self._cache.get('key'))
+
+    def test_purge(self):
+        self._cache.put('key', 'Step', {1: ['data']})
+        self._cache.purge()
+
+        self.assertIsNone(self._cache.get('key'))
+        self.assertEqual(0, self._cache.info()['entries'])
+
+
+class SchedulerCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        ConfiguredStep.settings = {}
+        self._directory = tempfile.TemporaryDirectory()
+        self._cache = StepOutputCache(self._directory.name, 1024 * 1024)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _execute(self, scene, max_workers=1):
+        RecordingStep.log = []
+        scheduler = scene.create_scheduler(max_workers)
+        scheduler.set_step_cache(self._cache)
+        scheduler.execute()
+        return sorted(identifier for event, identifier in RecordingStep.log if event == 'executed')
+
+    def _scene(self, step_class=ConfiguredStep):
+        scene, steps = create_scene(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')], step_class)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        return scene, steps
+
+    def test_unchanged_steps_replayed(self):
+        scene, steps = self._scene()
+        self.assertEqual(['a', 'b', 'c'], self._execute(scene))
+
+        for max_workers in [1, 2]:
+            self.assertEqual([], self._execute(scene, max_workers))
+            self.assertEqual([['b', 'a', None, None]], steps['c'].getStep().executed_with())
+
+    def test_changed_step_and_steps_after_it_executed(self):
+        scene, _ = self._scene()
+        self._execute(scene)
+
+        ConfiguredStep.settings['b'] = 'changed'
+
+        self.assertEqual(['b', 'c'], self._execute(scene))
+
+    def test_earlier_setting_replayed(self):
+        scene, _ = self._scene()
+        self._execute(scene)
+        ConfiguredStep.settings['a'] = 'changed'
+        self.assertEqual(['a', 'b', 'c'], self._execute(scene))
+
+        ConfiguredStep.settings['a'] = None
+
+        self.assertEqual([], self._execute(scene))
+
+    def test_step_run_for_side_effects_always_executed(self):
+        scene, _ = self._scene(SideEffectStep)
+        self._execute(scene)
+
+        self.assertEqual(['a', 'b', 'c'], self._execute(scene))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import tempfile
+import unittest
+
+from mapclient.core.workflow.workflowcheckpoint import WorkflowCheckpoint
+from mapclient.core.workflow.workflowerror import WorkflowError
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class InterruptedStep(RecordingStep):
+    """
+    The steps in interrupted fail, as if the run had been interrupted.
+    """
+
+    interrupted = set()
+    settings = {}
+
+    def serialize(self):
+        return json.dumps({'identifier': self.getIdentifier(), 'setting': InterruptedStep.settings.get(self.getIdentifier())})
+
+    def execute(self):
+        if self.getIdentifier() in InterruptedStep.interrupted:
+            raise KeyboardInterrupt
+        super(InterruptedStep, self).execute()
+
+
+class WorkflowCheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._checkpoint = WorkflowCheckpoint(self._directory.name)
+        InterruptedStep.settings = {}
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_record(self):
+        step = InterruptedStep('', 'a')
+        self.assertIsNone(self._checkpoint.outputs(step))
+
+        self._checkpoint.record(step, {1: ['a']})
+
+        self.assertEqual({1: ['a']}, self._checkpoint.outputs(step))
+        self.assertEqual({1: ['a']}, WorkflowCheckpoint(self._directory.name).outputs(step))
+
+    def test_changed_step_not_restored(self):
+        step = InterruptedStep('', 'a')
+        self._checkpoint.record(step, {1: ['a']})
+
+        InterruptedStep.settings['a'] = 'changed'
+
+        self.assertIsNone(self._checkpoint.outputs(step))
+
+    def test_clear(self):
+        step = InterruptedStep('', 'a')
+        self._checkpoint.record(step, {1: ['a']})
+        self._checkpoint.clear()
+
+        self.assertIsNone(self._checkpoint.outputs(step))
+
+
+class SchedulerCheckpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        InterruptedStep.interrupted = set()
+        InterruptedStep.settings = {}
+        self._directory = tempfile.TemporaryDirectory()
+        self._steps = None
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _execute(self, resume=False, from_step=None):
+        # Each run loads the workflow again, as a new headless run does.
+        scene, self._steps = create_scene(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')], InterruptedStep)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        RecordingStep.log = []
+        scheduler = scene.create_scheduler()
+        scheduler.set_checkpoint(WorkflowCheckpoint(self._directory.name), resume, from_step)
+        scheduler.execute()
+        return [identifier for event, identifier in RecordingStep.log if event == 'executed']
+
+    def _interrupt_at(self, identifier):
+        InterruptedStep.interrupted = {identifier}
+        with self.assertRaises(KeyboardInterrupt):
+            self._execute()
+        InterruptedStep.interrupted = set()
+
+    def test_resume_after_last_completed_step(self):
+        self._interrupt_at('c')
+
+        self.assertEqual(['c'], self._execute(resume=True))
+        self.assertEqual([['b', 'a']], self._steps['c'].getStep().executed_with())
+
+    def test_resume_from_changed_step(self):
+        self._interrupt_at('c')
+        InterruptedStep.settings['b'] = 'changed'
+
+        self.assertEqual(['b', 'c'], self._execute(resume=True))
+
+    def test_resume_completed_run(self):
+        self._execute()
+
+        self.assertEqual([], self._execute(resume=True))
+
+    def test_execute_from_step(self):
+        self._execute()
+
+        self.assertEqual(['b', 'c'], self._execute(from_step='b'))
+
+    def test_execute_from_step_without_checkpoint(self):
+        self._interrupt_at('b')
+
+        with self.assertRaises(WorkflowError):
+            self._execute(from_step='c')
+        with self.assertRaises(WorkflowError):
+            self._execute(from_step='unknown')
+
+    def test_run_without_resume_starts_again(self):
+        self._execute()
+
+        self.assertEqual(['a', 'b', 'c'], self._execute())
+
+
+if __name__ == '__main__':
+    unittest.main()
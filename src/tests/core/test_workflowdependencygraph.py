@@ -0,0 +1,145 @@
+import unittest
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class InteractiveStep(RecordingStep):
+    """
+    Steps with an identifier in interactive wait for the user, finish is
+    called for the user finishing with them.
+    """
+
+    interactive = set()
+
+    def execute(self):
+        if self.getIdentifier() not in InteractiveStep.interactive:
+            super(InteractiveStep, self).execute()
+            return
+
+        RecordingStep.log.append(('shown', self.getIdentifier()))
+        self._executed_with, self._received = self._received, []
+        self._output = [self.getIdentifier()] + [item for data in self._executed_with if data for item in data]
+
+    def finish(self):
+        self._doneExecution()
+
+
+class DependencyGraphExecutionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        InteractiveStep.interactive = set()
+        self._finished = []
+
+    def _scene(self, identifiers, arcs):
+        scene, steps = create_scene(identifiers, arcs, InteractiveStep)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        scene.registerDoneExecutionForAll(scene.execute)
+        scene.register_finished_workflow_callback(self._finished.append)
+        return scene, steps
+
+    def _execute(self, scene):
+        RecordingStep.log = []
+        scene.execute()
+        return RecordingStep.log
+
+    def test_execute(self):
+        scene, steps = self._scene(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')])
+
+        self.assertEqual([('executed', 'a'), ('executed', 'b'), ('executed', 'c')], self._execute(scene))
+        self.assertEqual([True], self._finished)
+        self.assertEqual([['b', 'a']], steps['c'].getStep().executed_with())
+
+    def test_only_downstream_of_change_executed_again(self):
+        scene, steps = self._scene(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'c'), ('a', 'd')])
+        self._execute(scene)
+
+        scene.mark_dirty(steps['b'])
+
+        self.assertFalse(scene.is_dirty(steps['a']))
+        self.assertTrue(scene.is_dirty(steps['c']))
+        self.assertEqual([('executed', 'b'), ('executed', 'c')], self._execute(scene))
+        self.assertEqual([['a']], steps['b'].getStep().executed_with())
+
+    def test_unchanged_workflow_executed_again(self):
+        scene, _ = self._scene(['a', 'b'], [('a', 'b')])
+        self._execute(scene)
+
+        self.assertEqual([('executed', 'a'), ('executed', 'b')], self._execute(scene))
+
+    def test_revisited_step_executed_again(self):
+        InteractiveStep.interactive = {'b', 'c'}
+        scene, steps = self._scene(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')])
+        self._execute(scene)
+        steps['b'].getStep().finish()
+
+        # Step back from c to b, and back to the start from b.
+        scene.set_workflow_direction(False)
+        steps['c'].getStep().finish()
+        self.assertEqual(('shown', 'b'), RecordingStep.log[-1])
+        steps['b'].getStep().finish()
+        self.assertEqual([False], self._finished)
+
+        scene.set_workflow_direction(True)
+        self.assertEqual([('shown', 'b')], self._execute(scene))
+        steps['b'].getStep().finish()
+        self.assertEqual(('shown', 'c'), RecordingStep.log[-1])
+
+    def test_step_back_without_executing(self):
+        InteractiveStep.interactive = {'b', 'd'}
+        scene, steps = self._scene(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'c'), ('c', 'd')])
+        self._execute(scene)
+        steps['b'].getStep().finish()
+        self.assertEqual(('shown', 'd'), RecordingStep.log[-1])
+
+        # Step back from d over c, which is not interactive, to b.
+        RecordingStep.log = []
+        scene.set_workflow_direction(False)
+        steps['d'].getStep().finish()
+
+        self.assertEqual([('shown', 'b')], RecordingStep.log)
+        self.assertEqual([['a']], steps['b'].getStep().executed_with())
+        steps['b'].getStep().finish()
+        self.assertEqual([('shown', 'b')], RecordingStep.log)
+        self.assertEqual([False], self._finished)
+
+
+class DependencyGraphTestCase(unittest.TestCase):
+
+    def _scene(self, identifiers, arcs):
+        scene, _ = create_scene(identifiers, arcs)
+        return scene
+
+    def test_order_of_long_workflow(self):
+        identifiers = [f'step{index}' for index in range(300)]
+        arcs = list(zip(identifiers[:-1], identifiers[1:])) + [(identifiers[0], identifier) for identifier in identifiers[2::7]]
+        scene = self._scene(list(reversed(identifiers)), arcs)
+
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        order = [node.getIdentifier() for node in scene.create_plan().order()]
+        self.assertEqual(identifiers, order)
+
+    def test_loop_reported(self):
+        scene = self._scene(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'c'), ('c', 'b'), ('c', 'd')])
+
+        self.assertEqual(5, scene.canExecute())
+        self.assertEqual("Workflow contains a loop, steps in or after the loop: 'b', 'c', 'd'.", scene.execute_status_message())
+
+    def test_unconnected_steps_reported(self):
+        scene = self._scene(['a', 'b'], [])
+
+        self.assertEqual(3, scene.canExecute())
+        self.assertIn("unconnected steps: 'a', 'b'.", scene.execute_status_message())
+
+    def test_disconnected_subgraphs_executed(self):
+        scene = self._scene(['a', 'b', 'c', 'd'], [('a', 'b'), ('c', 'd')])
+
+        with self.assertLogs('mapclient.core.workflow.workflowdependencygraph', 'WARNING') as logs:
+            self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+
+        self.assertIn("2 disconnected subgraphs", logs.output[0])
+        self.assertEqual(4, len(scene.create_plan().order()))
+
+
+if __name__ == '__main__':
+    unittest.main()
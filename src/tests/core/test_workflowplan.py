@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mapclient.core.workflow.workflowplan import read_profile
+from mapclient.core.workflow.workflowprofiler import WorkflowProfiler
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+def _identifiers(nodes):
+    return [node.getIdentifier() for node in nodes]
+
+
+class WorkflowPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        self._scene, _ = create_scene(['source', 'slow', 'fast', 'sink'],
+                                      [('source', 'slow'), ('source', 'fast'), ('slow', 'sink'), ('fast', 'sink')])
+        self.assertEqual(0, self._scene.canExecute(), self._scene.execute_status_message())
+        self._profile = {
+            'source': {'identifier': 'source', 'wall_time': 1.0, 'peak_rss_delta': 1024 * 1024},
+            'slow': {'identifier': 'slow', 'wall_time': 4.0},
+            'fast': {'identifier': 'fast', 'wall_time': 2.0},
+            'sink': {'identifier': 'sink', 'wall_time': 1.0},
+        }
+
+    def test_plan_does_not_execute(self):
+        plan = self._scene.create_plan()
+
+        order = _identifiers(plan.order())
+        self.assertEqual(['source', 'sink'], [order[0], order[-1]])
+        self.assertEqual([['source'], ['fast', 'slow'], ['sink']], [sorted(_identifiers(stage)) for stage in plan.stages()])
+        self.assertEqual([], RecordingStep.log)
+
+    def test_estimates(self):
+        plan = self._scene.create_plan(self._profile)
+
+        path, duration = plan.critical_path()
+        self.assertEqual(['source', 'slow', 'sink'], _identifiers(path))
+        self.assertEqual(6.0, duration)
+        self.assertEqual(8.0, plan.estimated_duration(1))
+        self.assertEqual(6.0, plan.estimated_duration(2))
+        self.assertIn('Estimated duration: 8.000 s serially, 6.000 s with 2 job(s), critical path 6.000 s.', plan.lines(2))
+
+    def test_steps_missing_from_profile(self):
+        del self._profile['fast']
+        lines = self._scene.create_plan(self._profile).lines()
+
+        self.assertIn('Steps not in the profile, not included in the estimates: fast.', lines)
+
+    def test_without_profile(self):
+        lines = self._scene.create_plan().lines()
+
+        self.assertIn('No profile of a previous run, durations are not estimated.', lines)
+
+    def test_read_profile_of_run(self):
+        scheduler = self._scene.create_scheduler()
+        scheduler.set_profiler(WorkflowProfiler())
+        scheduler.execute()
+
+        with tempfile.TemporaryDirectory() as directory:
+            profile_file = os.path.join(directory, 'profile.json')
+            self.assertEqual({}, read_profile(profile_file))
+            scheduler.profiler().write(profile_file)
+            profile = read_profile(profile_file)
+            with open(profile_file, 'w') as f:
+                json.dump({}, f)
+            self.assertEqual({}, read_profile(profile_file))
+
+        self.assertEqual({'source', 'slow', 'fast', 'sink'}, set(profile))
+        plan = self._scene.create_plan(profile)
+        self.assertTrue(all(plan.estimate(node) for node in plan.order()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from mapclient.core.workflow.workflowprofiler import WorkflowProfiler, format_bytes, measure
+
+from tests.core.steps import create_scene
+
+_MIB = 1024 * 1024
+
+
+def _allocate_briefly(size):
+    data = b'\x01' * size
+    time.sleep(0.1)
+    del data
+
+
+class MeasureTestCase(unittest.TestCase):
+
+    def test_peak_of_block(self):
+        record = {}
+        with measure(record):
+            _allocate_briefly(64 * _MIB)
+
+        self.assertGreater(record['peak_rss_delta'], 48 * _MIB)
+        self.assertLess(record['rss_delta'], 16 * _MIB)
+        self.assertGreaterEqual(record['wall_time'], 0.1)
+
+    def test_peak_below_an_earlier_peak(self):
+        with measure({}):
+            _allocate_briefly(128 * _MIB)
+
+        record = {}
+        with measure(record):
+            _allocate_briefly(32 * _MIB)
+
+        self.assertGreater(record['peak_rss_delta'], 24 * _MIB)
+
+    def test_format_bytes(self):
+        self.assertEqual('-', format_bytes(None))
+        self.assertEqual('1.5', format_bytes(int(1.5 * _MIB)))
+
+
+class WorkflowProfilerTestCase(unittest.TestCase):
+
+    def test_profile_of_run(self):
+        scene, _ = create_scene(['a', 'b', 'c'], [('a', 'b'), ('b', 'c')])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        scheduler = scene.create_scheduler()
+        profiler = WorkflowProfiler()
+        scheduler.set_profiler(profiler)
+        scheduler.execute()
+
+        records = {record['identifier']: record for record in profiler.records()}
+        self.assertEqual({'a', 'b', 'c'}, set(records))
+        for record in records.values():
+            self.assertEqual('executed', record['status'])
+            self.assertIn('peak_rss_delta', record)
+        self.assertEqual(0, records['a']['input_size'])
+        self.assertGreater(records['b']['input_size'], 0)
+        self.assertEqual(5, len(profiler.table()))
+
+        with tempfile.TemporaryDirectory() as directory:
+            profile_file = os.path.join(directory, 'profile.json')
+            profiler.write(profile_file)
+            with open(profile_file) as f:
+                self.assertEqual(3, len(json.load(f)['steps']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+from mapclient.core.workflow.workflowitems import Connection, MetaStep
+from mapclient.core.workflow.workflowscene import WorkflowScene
+from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
+
+from tests.core.steps import RecordingStep, create_scene
+
+_PORT = 'http://physiomeproject.org/workflow/1.0/rdf-schema#port'
+_USES = 'http://physiomeproject.org/workflow/1.0/rdf-schema#uses'
+_PROVIDES = 'http://physiomeproject.org/workflow/1.0/rdf-schema#provides'
+
+
+class SceneTestStep(WorkflowStepMountPoint):
+
+    def __init__(self, location, identifier='step'):
+        super(SceneTestStep, self).__init__('Scene Test Step', location)
+        self._identifier = identifier
+        self.addPort((_PORT, _USES, 'data'))
+        self.addPort((_PORT, _PROVIDES, 'data'))
+
+    def getIdentifier(self):
+        return self._identifier
+
+    def setIdentifier(self, identifier):
+        self._identifier = identifier
+
+    def serialize(self):
+        return ''
+
+    def deserialize(self, string):
+        pass
+
+
+class WorkflowSceneTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._scene = WorkflowScene(None)
+        self._source = MetaStep(SceneTestStep('', 'source'))
+        self._filter = MetaStep(SceneTestStep('', 'filter'))
+        self._sink = MetaStep(SceneTestStep('', 'sink'))
+        self._first = Connection(self._source, 1, self._filter, 0)
+        self._second = Connection(self._filter, 1, self._sink, 0)
+        for item in [self._source, self._filter, self._sink, self._first, self._second]:
+            self._scene.addItem(item)
+
+    def test_incoming_connections(self):
+        self.assertEqual([self._first], self._scene.incoming_connections(self._filter))
+        self.assertEqual([self._second], self._scene.incoming_connections(self._sink))
+        self.assertEqual([], self._scene.incoming_connections(self._source))
+
+    def test_remove_step_before_its_connections(self):
+        # The order the remove command removes a selected step and its arcs in.
+        for item in [self._sink, self._second]:
+            self._scene.removeItem(item)
+
+        self.assertEqual([], self._scene.incoming_connections(self._sink))
+        self.assertEqual([self._first], self._scene.incoming_connections(self._filter))
+        self.assertNotIn(self._second, self._scene.items())
+
+    def test_remove_step_drops_its_outgoing_connections(self):
+        self._scene.removeItem(self._filter)
+
+        self.assertEqual([], self._scene.incoming_connections(self._sink))
+        self.assertEqual([], self._scene.incoming_connections(self._filter))
+        self._scene.removeItem(self._second)
+        self._scene.removeItem(self._first)
+        self.assertEqual([self._source, self._sink], self._scene.items())
+
+
+class PortDataRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+
+    def test_data_routed_along_connections(self):
+        scene, steps = create_scene(['left', 'right', 'join', 'other'],
+                                    [('left', 'join'), ('right', 'join'), ('right', 'other')])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        scene.create_scheduler().execute()
+
+        self.assertEqual([['left'], ['right']], steps['join'].getStep().executed_with())
+        self.assertEqual([['right']], steps['other'].getStep().executed_with())
+        self.assertEqual([], steps['left'].getStep().executed_with())
+
+    def test_removed_connection_not_routed(self):
+        scene, steps = create_scene(['left', 'right', 'join'], [('left', 'join'), ('right', 'join')])
+        scene.removeItem(scene.incoming_connections(steps['join'])[0])
+        scene.removeItem(steps['left'])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        scene.create_scheduler().execute()
+
+        self.assertEqual([['right']], steps['join'].getStep().executed_with())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from mapclient.core.workflow.workflowerror import WorkflowError, WorkflowTimeoutError
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class BranchStep(RecordingStep):
+    """
+    The branch steps wait for each other, so they only finish if they are
+    executed at the same time.
+    """
+
+    barrier = None
+
+    def execute(self):
+        if self.getIdentifier().startswith('branch'):
+            BranchStep.barrier.wait()
+        super(BranchStep, self).execute()
+
+
+class FailingStep(RecordingStep):
+
+    def execute(self):
+        if self.getIdentifier() == 'fails':
+            raise ValueError('Bad input.')
+        super(FailingStep, self).execute()
+
+
+class WorkflowSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        BranchStep.barrier = threading.Barrier(2, timeout=5)
+
+    def _scene(self, identifiers, arcs, step_class=RecordingStep):
+        scene, steps = create_scene(identifiers, arcs, step_class)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        return scene, steps
+
+    def _diamond(self, step_class=RecordingStep):
+        return self._scene(['source', 'branch_a', 'branch_b', 'sink'],
+                           [('source', 'branch_a'), ('source', 'branch_b'), ('branch_a', 'sink'), ('branch_b', 'sink')],
+                           step_class)
+
+    def _executed(self):
+        return [identifier for event, identifier in RecordingStep.log if event == 'executed']
+
+    def test_serial_execution_in_topological_order(self):
+        scene, steps = self._scene(['c', 'b', 'a'], [('a', 'b'), ('b', 'c')])
+        scene.create_scheduler().execute()
+
+        self.assertEqual(['a', 'b', 'c'], self._executed())
+        self.assertEqual([['b', 'a']], steps['c'].getStep().executed_with())
+
+    def test_independent_branches_run_at_the_same_time(self):
+        scene, steps = self._diamond(BranchStep)
+        scene.create_scheduler(max_workers=2).execute()
+
+        self.assertEqual('source', self._executed()[0])
+        self.assertEqual('sink', self._executed()[-1])
+        self.assertEqual([['branch_a', 'source'], ['branch_b', 'source']], steps['sink'].getStep().executed_with())
+
+    def test_single_worker_runs_one_step_at_a_time(self):
+        scene, _ = self._diamond(BranchStep)
+        BranchStep.barrier = threading.Barrier(2, timeout=0.2)
+
+        with self.assertRaises(WorkflowError):
+            scene.create_scheduler(max_workers=1).execute()
+
+    def test_failing_step_stops_execution(self):
+        scene, _ = self._scene(['source', 'fails', 'sink'], [('source', 'fails'), ('fails', 'sink')], FailingStep)
+
+        for max_workers in [1, 2]:
+            RecordingStep.log = []
+            with self.assertRaises(WorkflowError) as context:
+                scene.create_scheduler(max_workers).execute()
+
+            self.assertIn('Bad input.', str(context.exception))
+            self.assertEqual(['source'], self._executed())
+
+
+class PortDataReleaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+
+    def test_data_released_after_last_consumer(self):
+        scene, steps = create_scene(['source', 'left', 'right', 'sink'],
+                                    [('source', 'left'), ('source', 'right'), ('left', 'sink')])
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+
+        for max_workers in [1, 2]:
+            RecordingStep.log = []
+            scene.create_scheduler(max_workers).execute()
+
+            log = RecordingStep.log
+            self.assertEqual(1, log.count(('released', 'source')))
+            self.assertGreater(log.index(('released', 'source')), log.index(('executed', 'left')))
+            self.assertGreater(log.index(('released', 'source')), log.index(('executed', 'right')))
+            self.assertGreater(log.index(('released', 'left')), log.index(('executed', 'sink')))
+            # The outputs of the last steps are kept.
+            self.assertNotIn(('released', 'right'), log)
+            self.assertNotIn(('released', 'sink'), log)
+            self.assertEqual([['left', 'source']], steps['sink'].getStep().executed_with())
+
+
+class AsyncStep(RecordingStep):
+    """
+    Waits, as if for I/O, for as long as its identifier says.
+    """
+
+    async def execute_async(self):
+        try:
+            await asyncio.sleep(float(self.getIdentifier().split('-')[-1]))
+        except asyncio.CancelledError:
+            RecordingStep.log.append(('cancelled', self.getIdentifier()))
+            raise
+
+        # The step is done when it returns, it does not report it.
+        RecordingStep.log.append(('executed', self.getIdentifier()))
+        self._executed_with, self._received = self._received, []
+        self._output = [self.getIdentifier()] + [item for data in self._executed_with if data for item in data]
+
+
+class AsyncStepTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+
+    def test_waiting_steps_overlap(self):
+        identifiers = ['source-0', 'wait-0.5', 'other-0.5', 'sink-0']
+        scene, steps = create_scene(identifiers, [('source-0', 'wait-0.5'), ('source-0', 'other-0.5'),
+                                                  ('wait-0.5', 'sink-0'), ('other-0.5', 'sink-0')], AsyncStep)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+
+        start = time.monotonic()
+        scene.create_scheduler(max_workers=1).execute()
+
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual([['wait-0.5', 'source-0'], ['other-0.5', 'source-0']], steps['sink-0'].getStep().executed_with())
+
+    def test_timed_out_step_cancelled(self):
+        scene, steps = create_scene(['source-0', 'wait-10'], [('source-0', 'wait-10')], AsyncStep)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        steps['wait-10'].setTimeout(0.2)
+
+        with self.assertRaises(WorkflowTimeoutError):
+            scene.create_scheduler().execute()
+
+        self.assertIn(('cancelled', 'wait-10'), RecordingStep.log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from mapclient.core.workflow.workflowspill import PortDataSpill, port_data_digest
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class PortDataSpillTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._spill = PortDataSpill(16, self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_budget(self):
+        self.assertFalse(self._spill.exceeds_budget(b'small'))
+        self.assertTrue(self._spill.exceeds_budget(np.zeros(10)))
+
+    def test_pickled_data_is_loaded_once(self):
+        data = {'points': list(range(100))}
+        spilled = self._spill.spill(data)
+
+        self.assertEqual(data, spilled.load())
+        self.assertIs(spilled.load(), spilled.load())
+        self.assertEqual(port_data_digest(data), port_data_digest(spilled))
+
+    def test_reference_sent_to_other_processes_holds_no_data(self):
+        spilled = self._spill.spill(list(range(100)))
+        spilled.load()
+
+        copy = pickle.loads(pickle.dumps(spilled))
+
+        self.assertLess(len(pickle.dumps(spilled)), 1000)
+        self.assertEqual(list(range(100)), copy.load())
+
+    def test_array_is_memory_mapped(self):
+        array = np.arange(1000, dtype=np.float64)
+        spilled = self._spill.spill(array)
+
+        loaded = spilled.load()
+        self.assertIsInstance(loaded, np.memmap)
+        np.testing.assert_array_equal(array, loaded)
+        self.assertEqual(port_data_digest(array), port_data_digest(spilled))
+
+    def test_remove(self):
+        self._spill.spill(list(range(100))).remove()
+        self._spill.spill(np.zeros(100)).remove()
+
+        self.assertEqual([], os.listdir(self._directory.name))
+
+
+class SchedulerSpillTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+        self._scene, self._steps = create_scene(['source', 'left', 'right'], [('source', 'left'), ('source', 'right')])
+        self.assertEqual(0, self._scene.canExecute(), self._scene.execute_status_message())
+        self._directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _execute(self, max_workers=1):
+        scheduler = self._scene.create_scheduler(max_workers)
+        scheduler.set_spill(PortDataSpill(0, self._directory.name))
+        scheduler.execute()
+
+    def test_producer_released_once_spilled(self):
+        self._execute()
+
+        log = RecordingStep.log
+        self.assertEqual(1, log.count(('released', 'source')))
+        self.assertLess(log.index(('released', 'source')), log.index(('executed', 'left')))
+        self.assertLess(log.index(('released', 'source')), log.index(('executed', 'right')))
+
+    def test_consumers_share_loaded_data(self):
+        self._execute(max_workers=2)
+
+        left = self._steps['left'].getStep().executed_with()
+        right = self._steps['right'].getStep().executed_with()
+        self.assertEqual([['source']], left)
+        self.assertIs(left[0], right[0])
+        self.assertEqual([], os.listdir(self._directory.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from mapclient.core.exitcodes import HEADLESS_MODE_TIMED_OUT
+from mapclient.core.workflow.workflowerror import WorkflowError, WorkflowTimeoutError
+
+from tests.core.steps import RecordingStep, create_scene
+
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Executes a workflow whose second step ignores being cancelled and outlasts
+# its timeout on a thread, then exits as headless mode does on a timeout.
+_TIMED_OUT_RUN = '''
+import time
+
+from mapclient.core.exitcodes import HEADLESS_MODE_TIMED_OUT
+from mapclient.core.utils import exit_process
+from mapclient.core.workflow.workflowerror import WorkflowTimeoutError
+
+from tests.core.steps import RecordingStep, create_scene
+
+
+class StubbornStep(RecordingStep):
+
+    def execute(self):
+        if self.getIdentifier() == 'sink':
+            time.sleep(30)
+        super(StubbornStep, self).execute()
+
+
+scene, steps = create_scene(['source', 'sink'], [('source', 'sink')], StubbornStep)
+steps['sink'].setTimeout(0.2)
+assert scene.canExecute() == 0, scene.execute_status_message()
+try:
+    scene.create_scheduler(2).execute()
+except WorkflowTimeoutError:
+    exit_process(HEADLESS_MODE_TIMED_OUT)
+'''
+
+
+class PollingStep(RecordingStep):
+    """
+    Executes for a second, or until it is cancelled.
+    """
+
+    def execute(self):
+        start = time.monotonic()
+        while time.monotonic() - start < 1.0:
+            if self.isCancelled():
+                RecordingStep.log.append(('cancelled', self.getIdentifier()))
+                return
+            time.sleep(0.01)
+
+        super(PollingStep, self).execute()
+
+
+class InteractiveStep(RecordingStep):
+    """
+    Waits for the user to finish it, so never reports it is done itself.
+    """
+
+    def execute(self):
+        RecordingStep.log.append(('shown', self.getIdentifier()))
+
+
+class WorkflowTimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RecordingStep.log = []
+
+    def _scene(self, step_class):
+        scene, steps = create_scene(['source', 'sink'], [('source', 'sink')], step_class)
+        self.assertEqual(0, scene.canExecute(), scene.execute_status_message())
+        return scene, steps
+
+    def test_step_timeout_cancels_step(self):
+        scene, steps = self._scene(PollingStep)
+        steps['sink'].setTimeout(0.2)
+
+        start = time.monotonic()
+        with self.assertRaises(WorkflowTimeoutError):
+            scene.create_scheduler().execute()
+
+        # The source executes for a second, the sink is stopped after 0.2 s.
+        self.assertLess(time.monotonic() - start, 1.8)
+        time.sleep(0.1)
+        self.assertIn(('cancelled', 'sink'), RecordingStep.log)
+        self.assertNotIn(('executed', 'sink'), RecordingStep.log)
+
+    def test_run_timeout(self):
+        scene, _ = self._scene(PollingStep)
+        scene.set_run_timeout(0.2)
+
+        with self.assertRaises(WorkflowTimeoutError):
+            scene.create_scheduler(2).execute()
+        time.sleep(0.1)
+        self.assertIn(('cancelled', 'source'), RecordingStep.log)
+
+    def test_within_timeout(self):
+        scene, steps = self._scene(RecordingStep)
+        steps['sink'].setTimeout(5)
+        scene.create_scheduler().execute()
+
+        self.assertEqual([['source']], steps['sink'].getStep().executed_with())
+
+    def test_interactive_step_fails_execution(self):
+        scene, _ = self._scene(InteractiveStep)
+
+        start = time.monotonic()
+        with self.assertRaises(WorkflowError) as context:
+            scene.create_scheduler().execute()
+
+        self.assertIn("Step 'source' is interactive", str(context.exception))
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual([('shown', 'source')], RecordingStep.log)
+
+    def test_timed_out_run_exits_without_waiting_for_step(self):
+        environment = dict(os.environ, PYTHONPATH=_SOURCE_DIR)
+        start = time.monotonic()
+        result = subprocess.run([sys.executable, '-c', _TIMED_OUT_RUN], env=environment, capture_output=True, timeout=60)
+
+        self.assertEqual(HEADLESS_MODE_TIMED_OUT, result.returncode, result.stderr.decode())
+        self.assertLess(time.monotonic() - start, 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
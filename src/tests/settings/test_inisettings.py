@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mapclient.settings.inisettings import IniSettings
+
+try:
+    from PySide6 import QtCore
+except ImportError:
+    QtCore = None
+
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_STRINGS = ['plain', 'with, comma', ' leading space', '"quoted"', 'back\\slash', '@at', 'ünïcödé', 'semi;colon', '']
+
+# Reads a settings file and exits with 1 if reading it imported Qt.
+_READ_WITHOUT_QT = '''
+import sys
+
+from mapclient.settings.inisettings import IniSettings
+
+settings = IniSettings(sys.argv[1])
+settings.beginGroup('nodes')
+settings.beginReadArray('nodelist')
+settings.setArrayIndex(0)
+settings.value('position')
+sys.exit(1 if 'PySide6' in sys.modules else 0)
+'''
+
+
+@unittest.skipIf(QtCore is None, 'Qt is needed to write the settings files read.')
+class IniSettingsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._file_name = os.path.join(self._directory.name, 'settings.ini')
+        settings = QtCore.QSettings(self._file_name, QtCore.QSettings.Format.IniFormat)
+        settings.setValue('version', '0.21.0')
+        for index, string in enumerate(_STRINGS):
+            settings.setValue(f'strings/string{index}', string)
+        settings.beginGroup('nodes')
+        settings.beginWriteArray('nodelist')
+        for index in range(2):
+            settings.setArrayIndex(index)
+            settings.setValue('identifier', f'step {index}')
+            settings.setValue('position', QtCore.QPointF(1.5 + index, -2.25))
+            settings.beginWriteArray('connections')
+            for connection in range(index + 1):
+                settings.setArrayIndex(connection)
+                settings.setValue('connectedTo', connection)
+            settings.endArray()
+        settings.endArray()
+        settings.endGroup()
+        settings.setValue('view/rect', QtCore.QRectF(0, 0, 640, 480))
+        settings.sync()
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_strings(self):
+        settings = IniSettings(self._file_name)
+
+        self.assertEqual('0.21.0', settings.value('version'))
+        self.assertEqual(_STRINGS, [settings.value(f'strings/string{index}') for index in range(len(_STRINGS))])
+        self.assertEqual('default', settings.value('missing', 'default'))
+
+    def test_arrays(self):
+        settings = IniSettings(self._file_name)
+        settings.beginGroup('nodes')
+        nodes = []
+        for index in range(settings.beginReadArray('nodelist')):
+            settings.setArrayIndex(index)
+            position = settings.value('position')
+            connections = []
+            for connection in range(settings.beginReadArray('connections')):
+                settings.setArrayIndex(connection)
+                connections.append(int(settings.value('connectedTo')))
+            settings.endArray()
+            nodes.append((settings.value('identifier'), position.x(), position.y(), connections))
+        settings.endArray()
+        settings.endGroup()
+
+        self.assertEqual([('step 0', 1.5, -2.25, [0]), ('step 1', 2.5, -2.25, [0, 1])], nodes)
+
+    def test_groups(self):
+        settings = IniSettings(self._file_name)
+        settings.beginGroup('view')
+
+        rect = settings.value('rect')
+        self.assertEqual((0, 0, 640, 480), (rect.x(), rect.y(), rect.width(), rect.height()))
+        self.assertEqual(['rect'], settings.childKeys())
+        settings.endGroup()
+        self.assertTrue(settings.contains('version'))
+        self.assertCountEqual(['strings', 'nodes', 'view'], settings.childGroups())
+
+    def test_read_without_qt(self):
+        environment = dict(os.environ, PYTHONPATH=_SOURCE_DIR)
+        result = subprocess.run([sys.executable, '-c', _READ_WITHOUT_QT, self._file_name], env=environment, capture_output=True, timeout=60)
+
+        self.assertEqual(0, result.returncode, result.stderr.decode())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+
+from mapclient.core.exitcodes import APP_SUCCESS, BATCH_MODE_RUN_FAILED, HEADLESS_MODE_TIMED_OUT
+from mapclient.settings.info import APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE, DEFAULT_WORKFLOW_PROJECT_FILENAME, \
+    DEFAULT_WORKFLOW_PROJECT_IDENTIFIER, VERSION_STRING
+
+try:
+    import mapclient.application
+    _APPLICATION_ERROR = None
+except ImportError as e:
+    _APPLICATION_ERROR = str(e)
+
+_SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_NODE = r'''nodelist\{number}\connections\size={connections}
+nodelist\{number}\identifier={identifier}
+nodelist\{number}\name=Setting Step
+nodelist\{number}\position=@Variant(\0\0\0\x1a\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0)
+nodelist\{number}\timeout={timeout}
+'''
+
+_CONNECTION = r'''nodelist\{number}\connections\1\connectedFromIndex=1
+nodelist\{number}\connections\1\connectedTo={to}
+nodelist\{number}\connections\1\connectedToIndex=0
+'''
+
+# Runs a batch of a workflow of setting steps, which write their setting to
+# a file in the workflow directory, and exits with the exit code of the batch.
+_BATCH_RUN = '''
+import json
+import os
+import sys
+import time
+
+from mapclient.application import batch_main
+
+from tests.core.steps import RecordingStep
+
+
+class SettingStep(RecordingStep):
+
+    def __init__(self, location, identifier='step'):
+        super(SettingStep, self).__init__(location, identifier)
+        self._name = 'Setting Step'
+        self._setting = None
+
+    def serialize(self):
+        return json.dumps({'setting': self._setting})
+
+    def deserialize(self, string):
+        self._setting = json.loads(string).get('setting')
+
+    def execute(self):
+        if self._setting == 'slow':
+            time.sleep(30)
+        with open(os.path.join(self._location, self._identifier + '.out'), 'w') as f:
+            f.write(self._setting)
+        super(SettingStep, self).execute()
+
+
+workflow, settings, results_file, sweep_dir, processes = sys.argv[1:]
+sys.exit(batch_main(workflow, settings, results_file, sweep_dir=sweep_dir, processes=int(processes)))
+'''
+
+
+def _write_workflow(directory, settings, timeout=''):
+    """
+    Write a workflow of a chain of setting steps, with the given settings by
+    step identifier.
+    """
+    identifiers = list(settings)
+    lines = ['[General]', f'id={DEFAULT_WORKFLOW_PROJECT_IDENTIFIER}', f'version={VERSION_STRING}', '', '[nodes]']
+    for index, identifier in enumerate(identifiers):
+        last = index == len(identifiers) - 1
+        if not last:
+            lines.append(_CONNECTION.format(number=index + 1, to=index + 1).strip())
+        lines.append(_NODE.format(number=index + 1, connections=0 if last else 1, identifier=identifier, timeout=timeout).strip())
+    lines.append(rf'nodelist\size={len(identifiers)}')
+
+    os.makedirs(directory)
+    with open(os.path.join(directory, DEFAULT_WORKFLOW_PROJECT_FILENAME), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    for identifier, setting in settings.items():
+        with open(os.path.join(directory, f'{identifier}.conf'), 'w') as f:
+            json.dump({'setting': setting}, f)
+
+
+def _read(file_name):
+    with open(file_name) as f:
+        return f.read()
+
+
+@unittest.skipIf(_APPLICATION_ERROR is not None, f'The application cannot be imported: {_APPLICATION_ERROR}')
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._root = self._directory.name
+        self._workflow = os.path.join(self._root, 'workflow')
+        self._settings = os.path.join(self._root, 'settings')
+        self._sweep_dir = os.path.join(self._root, 'sweep')
+        self._results_file = os.path.join(self._root, 'results.csv')
+        os.makedirs(self._settings)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _add_settings(self, name, settings):
+        exported = os.path.join(self._root, 'exported', name)
+        _write_workflow(exported, settings)
+        with zipfile.ZipFile(os.path.join(self._settings, f'{name}.zip'), 'w') as archive:
+            for file_name in os.listdir(exported):
+                archive.write(os.path.join(exported, file_name), file_name)
+
+    def _batch(self, processes=1):
+        environment = dict(os.environ, PYTHONPATH=_SOURCE_DIR)
+        environment[APPLICATION_ENVIRONMENT_CONFIG_DIR_VARIABLE] = os.path.join(self._root, 'config')
+        result = subprocess.run([sys.executable, '-c', _BATCH_RUN, self._workflow, self._settings, self._results_file,
+                                 self._sweep_dir, str(processes)], env=environment, capture_output=True, timeout=120)
+        with open(self._results_file, newline='') as f:
+            return result.returncode, list(csv.DictReader(f))
+
+    def _check_runs(self, processes):
+        _write_workflow(self._workflow, {'a': 'default', 'b': 'default'})
+        self._add_settings('first', {'a': 'first', 'b': 'default'})
+        self._add_settings('second', {'a': 'second', 'b': 'changed'})
+
+        exit_code, results = self._batch(processes)
+
+        self.assertEqual(APP_SUCCESS, exit_code)
+        self.assertEqual(['success', 'success'], [result['status'] for result in results])
+        outputs = [result['output'] for result in results]
+        self.assertEqual(2, len(set(outputs)))
+        self.assertEqual(['first', 'default'], [_read(os.path.join(outputs[0], f'{step}.out')) for step in 'ab'])
+        self.assertEqual(['second', 'changed'], [_read(os.path.join(outputs[1], f'{step}.out')) for step in 'ab'])
+        # The workflow itself is not changed by the runs.
+        self.assertFalse(os.path.exists(os.path.join(self._workflow, 'a.out')))
+        self.assertEqual({'setting': 'default'}, json.loads(_read(os.path.join(self._workflow, 'a.conf'))))
+
+    def test_runs_one_at_a_time(self):
+        self._check_runs(1)
+
+    def test_runs_at_the_same_time(self):
+        self._check_runs(2)
+
+    def test_settings_for_other_steps_skipped(self):
+        _write_workflow(self._workflow, {'a': 'default', 'b': 'default'})
+        self._add_settings('first', {'a': 'first', 'b': 'default'})
+        self._add_settings('other', {'a': 'first', 'c': 'default'})
+
+        exit_code, results = self._batch()
+
+        self.assertEqual(BATCH_MODE_RUN_FAILED, exit_code)
+        self.assertEqual(['success', 'skipped'], [result['status'] for result in results])
+
+    def test_timed_out_run_abandons_batch(self):
+        _write_workflow(self._workflow, {'a': 'default', 'b': 'default'}, timeout=0.5)
+        self._add_settings('first', {'a': 'slow', 'b': 'default'})
+        self._add_settings('second', {'a': 'second', 'b': 'default'})
+
+        exit_code, results = self._batch()
+
+        self.assertEqual(HEADLESS_MODE_TIMED_OUT, exit_code)
+        self.assertEqual(['timed out', 'skipped'], [result['status'] for result in results])
+
+
+if __name__ == '__main__':
+    unittest.main()